@@ -0,0 +1,179 @@
+"""
+File that implements admission control for the recipient.
+Setups are expensive (node compile calls and signatures) and a burst of them must not starve the payments of the
+ channels that are already open. Therefore, setups are limited in concurrency and in rate per sender, and most of them
+ only start when no payment is being processed. A reserved share of setups starts anyway, so that steady payments
+ cannot starve setups either. Requests over the limits are answered with RETRY_LATER.
+"""
+import time
+from asyncio import Condition
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import wait_for
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from algorandsmc.errors import SMCRetryLater
+
+# Setups that can be processed at the same time.
+MAX_CONCURRENT_SETUPS = 4
+# Setups that can be processed at the same time as payments.
+RESERVED_SETUPS = 1
+# Setups that can wait for their turn. Further ones are answered with RETRY_LATER right away.
+MAX_WAITING_SETUPS = 16
+# Seconds that a setup can wait for its turn.
+SETUP_WAIT = 5.0
+# Sustained setups per second and burst of setups for each sender.
+SETUP_RATE = 0.5
+SETUP_BURST = 4
+# Payments that can be processed at the same time across all channels.
+MAX_CONCURRENT_PAYMENTS = 256
+# Seconds that a rejected request should wait before being sent again.
+RETRY_AFTER = 1.0
+# Above this number of tracked senders, the ones that are not being limited are forgotten.
+MAX_TRACKED_SENDERS = 10_000
+
+
+class TokenBucket:
+    """Rate limiter that allows bursts up to its capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Adds the tokens accrued since the last refill"""
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def take(self) -> bool:
+        """
+        Takes a token if there is one.
+
+        :return: Whether the request is within the rate
+        """
+        self.refill(time.monotonic())
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available"""
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+# pylint: disable-next=too-many-instance-attributes
+class AdmissionControl:
+    """Limits shared by all the connections of a recipient"""
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        max_setups: int = MAX_CONCURRENT_SETUPS,
+        max_waiting_setups: int = MAX_WAITING_SETUPS,
+        setup_wait: float = SETUP_WAIT,
+        setup_rate: float = SETUP_RATE,
+        setup_burst: int = SETUP_BURST,
+        max_payments: int = MAX_CONCURRENT_PAYMENTS,
+        reserved_setups: int = RESERVED_SETUPS,
+    ):
+        """
+        :param max_setups: Setups that can be processed at the same time
+        :param max_waiting_setups: Setups that can wait for their turn
+        :param setup_wait: Seconds that a setup can wait for its turn
+        :param setup_rate: Sustained setups per second for each sender
+        :param setup_burst: Burst of setups for each sender
+        :param max_payments: Payments that can be processed at the same time across all channels
+        :param reserved_setups: Setups that can be processed at the same time as payments
+        """
+        self.max_setups = max_setups
+        self.max_waiting_setups = max_waiting_setups
+        self.setup_wait = setup_wait
+        self.setup_rate = setup_rate
+        self.setup_burst = setup_burst
+        self.max_payments = max_payments
+        self.reserved_setups = min(reserved_setups, max_setups)
+
+        self.setups = 0
+        self.waiting_setups = 0
+        self.payments = 0
+        self._senders: dict[str, TokenBucket] = {}
+        self._changed = Condition()
+
+    def _setup_can_start(self) -> bool:
+        # Payments have priority over setups, except for the reserved share of setups.
+        if self.setups < self.reserved_setups:
+            return True
+        return self.setups < self.max_setups and self.payments == 0
+
+    def _take_setup_token(self, sender: str) -> None:
+        """Raises SMCRetryLater if the sender is over its rate of setups"""
+        if len(self._senders) > MAX_TRACKED_SENDERS:
+            now = time.monotonic()
+            for bucket in self._senders.values():
+                bucket.refill(now)
+            self._senders = {
+                address: bucket
+                for address, bucket in self._senders.items()
+                if bucket.tokens < bucket.capacity
+            }
+        bucket = self._senders.setdefault(
+            sender, TokenBucket(self.setup_rate, self.setup_burst)
+        )
+        if not bucket.take():
+            raise SMCRetryLater(
+                bucket.wait_time(), "Sender is over its rate of setups."
+            )
+
+    @asynccontextmanager
+    async def setup(self, sender: str) -> AsyncIterator[None]:
+        """
+        Admits a setup for the duration of the context.
+        It waits until the setup can start and raises SMCRetryLater if it would wait too long.
+
+        :param sender: Address of the sender that proposed the channel
+        """
+        self._take_setup_token(sender)
+        if self.waiting_setups >= self.max_waiting_setups:
+            raise SMCRetryLater(RETRY_AFTER, "Too many setups are waiting.")
+
+        self.waiting_setups += 1
+        try:
+            async with self._changed:
+                await wait_for(
+                    self._changed.wait_for(self._setup_can_start), self.setup_wait
+                )
+                self.setups += 1
+        except AsyncTimeoutError as err:
+            raise SMCRetryLater(RETRY_AFTER, "Setup waited too long.") from err
+        finally:
+            self.waiting_setups -= 1
+
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.setups -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def payment(self) -> AsyncIterator[None]:
+        """
+        Admits a payment for the duration of the context.
+        Payments never wait. Over the limit, it raises SMCRetryLater right away.
+        """
+        if self.payments >= self.max_payments:
+            raise SMCRetryLater(RETRY_AFTER, "Too many payments are being processed.")
+
+        self.payments += 1
+        try:
+            yield
+        finally:
+            self.payments -= 1
+            if self.payments == 0:
+                async with self._changed:
+                    self._changed.notify_all()
@@ -0,0 +1,246 @@
+"""
+File that implements a pool of channels that the sender sets up and funds ahead of time.
+Opening a channel takes a setup round trip and a funding transaction on Layer-1. With a pool, a new payment
+ relationship starts on a channel that is already waiting while the pool prepares its replacement in the background.
+"""
+import logging
+import time
+from asyncio import Event, Queue, Task
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import create_task, gather, get_running_loop, sleep, wait_for
+from itertools import count
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+from algorandsmc import sender
+from algorandsmc.errors import SMCCannotBeRefunded
+from algorandsmc.nodes import NodePool, default_node_pool
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import setupProposal, setupResponse
+
+# Ready channels kept for each recipient.
+POOL_SIZE = 4
+# Rounds between the setup of a channel and its refund condition.
+CHANNEL_LIFETIME = 5_000
+# Rounds in which the refund condition is online.
+REFUND_WINDOW = 500
+# Channels with fewer rounds left before the refund condition are not handed out anymore.
+MIN_REMAINING_LIFETIME = 1_000
+# Seconds between two checks of the pool if nothing wakes it up earlier.
+MAINTENANCE_INTERVAL = 5.0
+# Seconds to wait before preparing a channel again after a failure.
+RETRY_DELAY = 5.0
+
+# Nonces start from the wall clock in microseconds. This way, they don't collide with the ones of a previous run
+#  of the sender unless it opened more than one channel per microsecond.
+_NONCES = count(time.time_ns() // 1_000)
+
+
+def allocate_nonce() -> int:
+    """Returns a nonce that was never used by this sender"""
+    return next(_NONCES)
+
+
+# pylint: disable-next=too-many-instance-attributes
+class ChannelPool:
+    """
+    Keeps a number of set up and funded channels ready for each recipient.
+    Channels are taken with acquire and the pool refills itself in the background.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        connect: Callable[[str], Awaitable[Any]],
+        funding: int,
+        size: int = POOL_SIZE,
+        lifetime: int = CHANNEL_LIFETIME,
+        refund_window: int = REFUND_WINDOW,
+        min_remaining_lifetime: int = MIN_REMAINING_LIFETIME,
+        node_pool: Optional[NodePool] = None,
+    ):
+        """
+        :param connect: Opens a websocket to a recipient given its URI (e.g. websockets.connect)
+        :param funding: microalgos to fund each channel with
+        :param size: Ready channels kept for each recipient
+        :param lifetime: Rounds between the setup of a channel and its refund condition
+        :param refund_window: Rounds in which the refund condition is online
+        :param min_remaining_lifetime: Channels closer than this to the refund condition are refunded instead of used
+        :param node_pool: Nodes to use. The default pool if not given
+        """
+        if size <= 0:
+            raise ValueError("The pool must keep at least one channel ready.")
+        if lifetime <= min_remaining_lifetime:
+            raise ValueError("Channels would be too old to be used as soon as ready.")
+
+        self.connect = connect
+        self.funding = funding
+        self.size = size
+        self.lifetime = lifetime
+        self.refund_window = refund_window
+        self.min_remaining_lifetime = min_remaining_lifetime
+        self.node_pool = node_pool or default_node_pool()
+
+        self.ready: dict[str, Queue[sender.SenderChannel]] = {}
+        self.warming: dict[str, int] = {}
+        self.last_round = 0
+
+        self._wakeup = Event()
+        self._maintainer: Optional[Task] = None
+        self._warmups: set[Task] = set()
+        self._refunds: set[Task] = set()
+
+    def add_recipient(self, uri: str) -> None:
+        """
+        Starts keeping channels ready for a recipient.
+
+        :param uri: Address of the websocket of the recipient
+        """
+        if uri in self.ready:
+            return
+        self.ready[uri] = Queue()
+        self.warming[uri] = 0
+        if self._maintainer is None:
+            self._maintainer = create_task(self._maintain())
+        self._wakeup.set()
+
+    async def acquire(self, uri: str) -> sender.SenderChannel:
+        """
+        Takes a ready channel for a recipient. It only waits if the pool ran dry.
+        Recipients that are not in the pool yet are added.
+
+        :param uri: Address of the websocket of the recipient
+        :return: Established and funded channel
+        """
+        self.add_recipient(uri)
+        ready = self.ready[uri]
+        while True:
+            channel = await ready.get()
+            # Taking a channel is what triggers a refill.
+            self._wakeup.set()
+            if self._fresh(channel):
+                logging.info("Channel %s acquired.", channel.setup_proposal.nonce)
+                return channel
+            self._spawn(self._refunds, self._retire(channel))
+
+    async def close(self) -> None:
+        """
+        Stops refilling the pool and retires the ready channels.
+        It returns when all the retired channels are refunded, i.e. after their refund condition came online.
+        """
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            self._maintainer = None
+        await gather(*self._warmups, return_exceptions=True)
+
+        for ready in self.ready.values():
+            while not ready.empty():
+                self._spawn(self._refunds, self._retire(ready.get_nowait()))
+        await gather(*self._refunds, return_exceptions=True)
+
+    def _fresh(self, channel: sender.SenderChannel) -> bool:
+        """Whether a channel has enough rounds left to be used"""
+        return (
+            channel.setup_proposal.minRefundBlock - self.last_round
+            >= self.min_remaining_lifetime
+        )
+
+    @staticmethod
+    def _spawn(tasks: set[Task], coroutine: Coroutine) -> None:
+        """Runs a coroutine in the background and keeps a reference to it until it's done"""
+        task = create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def _maintain(self) -> None:
+        """Retires channels that got too old and starts preparing the missing ones"""
+        loop = get_running_loop()
+        while True:
+            self._wakeup.clear()
+            try:
+                # Clients are blocking.
+                status = await loop.run_in_executor(None, self.node_pool.algod.status)
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                # Refund blocks can't be chosen without knowing the current round.
+                logging.warning("Could not refresh the channel pool: %s", err)
+            else:
+                self.last_round = status["last-round"]
+                sender.KNOWN_CHANNELS.evict(self.last_round)
+                for uri, ready in self.ready.items():
+                    for _ in range(ready.qsize()):
+                        channel = ready.get_nowait()
+                        if self._fresh(channel):
+                            ready.put_nowait(channel)
+                        else:
+                            self._spawn(self._refunds, self._retire(channel))
+                    for _ in range(self.size - ready.qsize() - self.warming[uri]):
+                        self.warming[uri] += 1
+                        self._spawn(self._warmups, self._warm(uri))
+
+            try:
+                await wait_for(self._wakeup.wait(), MAINTENANCE_INTERVAL)
+            except AsyncTimeoutError:
+                pass
+
+    async def _warm(self, uri: str) -> None:
+        """
+        Sets up and funds a new channel for a recipient and adds it to the ready ones.
+
+        :param uri: Address of the websocket of the recipient
+        """
+        websocket = None
+        setup_proposal = setupProposal(
+            sender=sender.SENDER_ADDR,
+            nonce=allocate_nonce(),
+            minRefundBlock=self.last_round + self.lifetime,
+            maxRefundBlock=self.last_round + self.lifetime + self.refund_window,
+        )
+        setup_response: Optional[setupResponse] = None
+        try:
+            websocket = await self.connect(uri)
+            setup_proposal, setup_response = await sender.setup_channel(
+                websocket, setup_proposal, self.node_pool
+            )
+            await sender.fund(
+                setup_proposal, setup_response, self.funding, self.node_pool
+            )
+            # The channel derives its programs once, which takes node calls.
+            channel = await get_running_loop().run_in_executor(
+                None,
+                sender.SenderChannel,
+                websocket,
+                setup_proposal,
+                setup_response,
+                self.node_pool,
+            )
+        # pylint: disable-next=broad-except
+        except Exception as err:
+            logging.error("Could not prepare a channel for %s: %s", uri, err)
+            if websocket is not None:
+                await websocket.close()
+            if setup_response is not None:
+                # The funding transaction could have gone through before the failure.
+                self._spawn(self._refunds, self._refund(setup_proposal, setup_response))
+            # The slot stays taken in the meantime, so a recipient that is down is not flooded with attempts.
+            await sleep(RETRY_DELAY)
+        else:
+            self.ready[uri].put_nowait(channel)
+            logging.info("Channel %s ready for %s.", setup_proposal.nonce, uri)
+        finally:
+            self.warming[uri] -= 1
+            self._wakeup.set()
+
+    async def _retire(self, channel: sender.SenderChannel) -> None:
+        """Closes the connection of a channel that will not be used and takes its funds back"""
+        await channel.websocket.close()
+        await self._refund(channel.setup_proposal, channel.setup_response)
+
+    async def _refund(
+        self, setup_proposal: setupProposal, setup_response: setupResponse
+    ) -> None:
+        """Waits for the refund condition of a channel and executes it"""
+        try:
+            await sender.refund_channel(setup_proposal, setup_response, self.node_pool)
+        except SMCCannotBeRefunded:
+            logging.info("Channel %s holds no funds.", setup_proposal.nonce)
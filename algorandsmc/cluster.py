@@ -0,0 +1,523 @@
+"""
+File that implements a cluster of recipient nodes that serve the same recipient address.
+Channels are partitioned among the nodes by consistent hashing of their msig address, so that each node only holds
+ the channels it owns. The known channels and the membership of the cluster live in a shared registry, and a router
+ in front of the nodes sends each sender to the owner of its channel.
+When a node joins or leaves, the channels that change owner are handed off through the registry: the previous owner
+ stores their state and drops the connection, and the new owner adopts them when the sender resumes through the router.
+"""
+import bisect
+import hashlib
+import logging
+import sqlite3
+import time
+from asyncio import FIRST_COMPLETED, create_task, get_running_loop, sleep, wait
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional
+
+from websockets.exceptions import ConnectionClosed
+
+from algorandsmc import recipient
+from algorandsmc.nodes import NodePool
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import Payment, SMCMethod, resumeRequest, setupProposal
+from algorandsmc.templates import smc_msig
+
+# Points of each node on the ring. More points spread the channels more evenly.
+VIRTUAL_NODES = 128
+# Seconds after the last heartbeat for which a node is considered part of the cluster.
+MEMBER_TTL = 15.0
+# Seconds between two heartbeats of a node, which also refresh its view of the cluster.
+HEARTBEAT_INTERVAL = 5.0
+# Seconds that a process waits for another one to release the registry.
+REGISTRY_TIMEOUT = 5.0
+# Rounds between two evictions from the registry, so that setups don't write to it one by one.
+# Setups too close to the current round are rejected anyway (see recipient.MIN_ACCEPTED_LIFETIME).
+EVICT_ROUNDS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    address TEXT PRIMARY KEY,
+    max_refund_block INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channels_by_expiry ON channels (max_refund_block);
+CREATE TABLE IF NOT EXISTS horizon (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    round INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO horizon VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS members (
+    node_id TEXT PRIMARY KEY,
+    uri TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS handoffs (
+    address TEXT PRIMARY KEY,
+    setup BLOB NOT NULL,
+    last_payment BLOB,
+    resume_counter INTEGER NOT NULL
+);
+"""
+
+
+def _ring_hash(key: str) -> int:
+    """Position of a key on the ring"""
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of msig addresses to nodes.
+    Adding or removing a node only moves the channels of the ranges next to its points.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = VIRTUAL_NODES):
+        self.replicas = replicas
+        self._points: list[tuple[int, str]] = []
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node: str) -> bool:
+        return any(point_node == node for _, point_node in self._points)
+
+    def __len__(self) -> int:
+        return len(self._points) // self.replicas
+
+    def add(self, node: str) -> None:
+        """Adds a node to the ring"""
+        if node in self:
+            return
+        for replica in range(self.replicas):
+            bisect.insort(self._points, (_ring_hash(f"{node}#{replica}"), node))
+
+    def remove(self, node: str) -> None:
+        """Removes a node from the ring"""
+        self._points = [point for point in self._points if point[1] != node]
+
+    def owner(self, msig_address: str) -> Optional[str]:
+        """
+        Returns the node that owns a channel.
+
+        :param msig_address: Address of the msig of the channel
+        :return: Node id. None if the ring is empty
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, (_ring_hash(msig_address), ""))
+        return self._points[index % len(self._points)][1]
+
+
+class SQLiteRegistry:
+    """
+    Registry of a cluster in an SQLite database shared by its nodes (i.e. on the same host or on a shared volume).
+    It holds the known channels with the same semantics as KnownChannels, the members of the cluster and the
+     channels that are being handed off between nodes.
+    """
+
+    def __init__(self, path: Path | str, member_ttl: float = MEMBER_TTL):
+        """
+        :param path: Database file. It is created if missing
+        :param member_ttl: Seconds after the last heartbeat for which a node is a member
+        """
+        self.member_ttl = member_ttl
+        self._connection = sqlite3.connect(
+            path,
+            timeout=REGISTRY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        # Nodes on the same host read while another one writes.
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        # Setups can be checked in different threads (see recipient.accept_setup).
+        self._lock = Lock()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Runs statements atomically with respect to the other nodes"""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def __contains__(self, msig_address: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM channels WHERE address = ?", (msig_address,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM channels"
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        """Closes the database"""
+        self._connection.close()
+
+    def claim(self, msig_address: str, max_refund_block: int) -> bool:
+        """
+        Adds a channel unless any node of the cluster knows it.
+
+        :param msig_address: Address of the msig of the channel
+        :param max_refund_block: Last round of the refund window of the channel
+        :return: Whether the channel was new
+        """
+        with self._transaction() as connection:
+            (horizon,) = connection.execute("SELECT round FROM horizon").fetchone()
+            if max_refund_block < horizon:
+                return False
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO channels VALUES (?, ?)",
+                (msig_address, max_refund_block),
+            )
+            return cursor.rowcount == 1
+
+    def evict(self, current_round: int) -> int:
+        """
+        Forgets all channels whose refund window closed before a round.
+
+        :param current_round: Last round of the chain
+        :return: Number of evicted channels
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE horizon SET round = MAX(round, ?)", (current_round,)
+            )
+            connection.execute(
+                "DELETE FROM handoffs WHERE address IN (SELECT address FROM channels"
+                " WHERE max_refund_block < (SELECT round FROM horizon))"
+            )
+            cursor = connection.execute(
+                "DELETE FROM channels"
+                " WHERE max_refund_block < (SELECT round FROM horizon)"
+            )
+            return cursor.rowcount
+
+    def heartbeat(self, node_id: str, uri: str) -> None:
+        """
+        Adds a node to the cluster or keeps it there.
+
+        :param node_id: Name of the node, unique in the cluster
+        :param uri: Address of the websocket of the node
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO members VALUES (?, ?, ?)",
+                (node_id, uri, time.time()),
+            )
+
+    def leave(self, node_id: str) -> None:
+        """Removes a node from the cluster"""
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM members WHERE node_id = ?", (node_id,))
+
+    def members(self) -> dict[str, str]:
+        """Returns the address of each node that sent a heartbeat recently"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT node_id, uri FROM members WHERE last_seen >= ?",
+                (time.time() - self.member_ttl,),
+            ).fetchall()
+        return dict(rows)
+
+    def store_channel(self, channel: recipient.RecipientChannel) -> None:
+        """
+        Stores the state of a channel for the node that will own it.
+
+        :param channel: State of the channel
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO handoffs VALUES (?, ?, ?, ?)",
+                (
+                    channel.msig_address,
+                    channel.accepted_setup.SerializeToString(),
+                    (
+                        channel.last_payment.SerializeToString()
+                        if channel.last_payment
+                        else None
+                    ),
+                    channel.resume_counter,
+                ),
+            )
+
+    def take_channel(
+        self, msig_address: str
+    ) -> Optional[tuple[setupProposal, Optional[Payment], int]]:
+        """
+        Removes the state of a handed off channel, so that only one node adopts it.
+
+        :param msig_address: Address of the msig of the channel
+        :return: Accepted setup, last payment and resume counter. None if the channel was not handed off
+        """
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT setup, last_payment, resume_counter FROM handoffs"
+                " WHERE address = ?",
+                (msig_address,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "DELETE FROM handoffs WHERE address = ?", (msig_address,)
+            )
+        setup, last_payment, resume_counter = row
+        return (
+            setupProposal.FromString(setup),
+            Payment.FromString(last_payment) if last_payment is not None else None,
+            resume_counter,
+        )
+
+
+# pylint: disable-next=too-many-instance-attributes
+class ClusterNode:
+    """
+    A recipient node of a cluster.
+    It is the ChannelRegistry to give to recipient.setup_channel, so that a node only accepts the channels it owns and
+     that no node of the cluster knows yet.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        node_id: str,
+        uri: str,
+        registry: SQLiteRegistry,
+        node_pool: Optional[NodePool] = None,
+        on_adopt: Optional[Callable[[recipient.RecipientChannel], None]] = None,
+    ):
+        """
+        :param node_id: Name of the node, unique in the cluster
+        :param uri: Address of the websocket of the node, as the router reaches it
+        :param registry: Registry shared by the cluster
+        :param node_pool: Nodes to use. The default pool if not given
+        :param on_adopt: Called with each channel handed off to this node (e.g. to schedule its settlement)
+        """
+        self.node_id = node_id
+        self.uri = uri
+        self.registry = registry
+        self.node_pool = node_pool
+        self.on_adopt = on_adopt
+        # Empty until the node joins, so that it doesn't accept channels meanwhile.
+        self.ring = HashRing()
+        # Channels that this node handed off. It must not settle them.
+        self.handed_off: set[str] = set()
+        # Round of the last eviction from the registry.
+        self.evicted_round = 0
+
+    def owns(self, msig_address: str) -> bool:
+        """Whether this node owns a channel according to its last view of the cluster"""
+        return self.ring.owner(msig_address) == self.node_id
+
+    def claim(self, msig_address: str, max_refund_block: int) -> bool:
+        """Claims a channel in the registry if this node owns it (see ChannelRegistry)"""
+        if not self.owns(msig_address):
+            logging.warning("Channel %s belongs to another node.", msig_address)
+            return False
+        return self.registry.claim(msig_address, max_refund_block)
+
+    def evict(self, current_round: int) -> int:
+        """Evicts expired channels from the registry once every EVICT_ROUNDS rounds (see ChannelRegistry)"""
+        if current_round < self.evicted_round + EVICT_ROUNDS:
+            return 0
+        self.evicted_round = current_round
+        return self.registry.evict(current_round)
+
+    async def join(self) -> None:
+        """Adds this node to the cluster"""
+        await self.refresh()
+
+    async def leave(self) -> None:
+        """Removes this node from the cluster and hands off all of its channels"""
+        loop = get_running_loop()
+        # Registry calls are blocking.
+        await loop.run_in_executor(None, self.registry.leave, self.node_id)
+        for channel in list(recipient.OPEN_CHANNELS.values()):
+            await self.hand_off(channel)
+
+    async def refresh(self) -> None:
+        """Sends a heartbeat, updates the view of the cluster and hands off the channels that moved"""
+        loop = get_running_loop()
+        # Registry calls are blocking.
+        await loop.run_in_executor(
+            None, self.registry.heartbeat, self.node_id, self.uri
+        )
+        members = await loop.run_in_executor(None, self.registry.members)
+        self.ring = HashRing(members)
+
+        for channel in list(recipient.OPEN_CHANNELS.values()):
+            if not self.owns(channel.msig_address):
+                await self.hand_off(channel)
+
+    async def monitor(self, interval: float = HEARTBEAT_INTERVAL) -> None:
+        """Keeps this node in the cluster until cancelled"""
+        while True:
+            try:
+                await self.refresh()
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                logging.error("Could not refresh the cluster: %s", err)
+            await sleep(interval)
+
+    async def hand_off(self, channel: recipient.RecipientChannel) -> None:
+        """
+        Stores the state of a channel in the registry and drops it, so that the sender resumes it on the new owner.
+
+        :param channel: State of the channel
+        """
+        # Removed first so that no payment is accepted on this node after its state was stored.
+        recipient.close_channel(channel)
+        self.handed_off.add(channel.msig_address)
+        # Registry calls are blocking.
+        await get_running_loop().run_in_executor(
+            None, self.registry.store_channel, channel
+        )
+        if channel.websocket is not None:
+            await channel.websocket.close()
+        logging.info("Channel %s handed off.", channel.msig_address)
+
+    async def adopt(self, msig_address: str) -> Optional[recipient.RecipientChannel]:
+        """
+        Opens a channel that another node handed off (see recipient.resume_channel).
+
+        :param msig_address: Address of the msig of the channel
+        :return: State of the channel. None if this node doesn't own it or it was not handed off
+        """
+        if not self.owns(msig_address):
+            return None
+        # Registry calls are blocking.
+        state = await get_running_loop().run_in_executor(
+            None, self.registry.take_channel, msig_address
+        )
+        if state is None:
+            return None
+
+        accepted_setup, last_payment, resume_counter = state
+        channel = recipient.open_channel(None, accepted_setup, self.node_pool)
+        channel.last_payment = last_payment
+        channel.resume_counter = resume_counter
+        self.handed_off.discard(msig_address)
+        logging.info("Channel %s adopted.", msig_address)
+        if self.on_adopt is not None:
+            self.on_adopt(channel)
+        return channel
+
+
+class ClusterRouter:
+    """
+    Front of a cluster. It reads the first request of a sender, finds the node that owns the channel and relays
+     the connection to it.
+    """
+
+    def __init__(
+        self,
+        registry: SQLiteRegistry,
+        connect: Callable[[str], Awaitable[Any]],
+        node_pool: Optional[NodePool] = None,
+    ):
+        """
+        :param registry: Registry shared by the cluster
+        :param connect: Opens a websocket to a node given its URI (e.g. websockets.connect)
+        :param node_pool: Nodes to use. The default pool if not given
+        """
+        self.registry = registry
+        self.connect = connect
+        self.node_pool = node_pool
+        self.ring = HashRing()
+        self.members: dict[str, str] = {}
+
+    async def refresh(self) -> None:
+        """Updates the view of the cluster"""
+        # Registry calls are blocking.
+        self.members = await get_running_loop().run_in_executor(
+            None, self.registry.members
+        )
+        self.ring = HashRing(self.members)
+
+    async def monitor(self, interval: float = HEARTBEAT_INTERVAL) -> None:
+        """Keeps the view of the cluster up to date until cancelled"""
+        while True:
+            try:
+                await self.refresh()
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                logging.error("Could not refresh the cluster: %s", err)
+            await sleep(interval)
+
+    async def msig_address(self, method: SMCMethod, request: bytes) -> Optional[str]:
+        """
+        Returns the msig address of the channel that a request is about.
+
+        :param method: First message of the sender
+        :param request: Second message of the sender
+        :return: Address of the msig. None if the request is neither a setup nor a resume
+        """
+        if method.method == SMCMethod.RESUME_CHANNEL:
+            return resumeRequest.FromString(request).msigAddress
+        if method.method == SMCMethod.SETUP_CHANNEL:
+            setup_proposal = setupProposal.FromString(request)
+            # Compiling C is a node call.
+            derived_msig = await get_running_loop().run_in_executor(
+                None,
+                smc_msig,
+                setup_proposal.sender,
+                recipient.RECIPIENT_ADDR,
+                setup_proposal.nonce,
+                setup_proposal.minRefundBlock,
+                setup_proposal.maxRefundBlock,
+                self.node_pool,
+            )
+            return derived_msig.address()
+        return None
+
+    async def route(self, websocket) -> None:
+        """
+        Relays a sender to the node that owns its channel until either side closes the connection.
+
+        :param websocket: Connection of the sender
+        """
+        method_message = await websocket.recv()
+        request = await websocket.recv()
+        msig_address = await self.msig_address(
+            SMCMethod.FromString(method_message), request
+        )
+        owner = self.ring.owner(msig_address) if msig_address else None
+        if owner is None:
+            logging.error("No node can serve channel %s.", msig_address)
+            await websocket.close()
+            return
+
+        upstream = await self.connect(self.members[owner])
+        try:
+            await upstream.send(method_message)
+            await upstream.send(request)
+            relays = [
+                create_task(_relay(websocket, upstream)),
+                create_task(_relay(upstream, websocket)),
+            ]
+            _, pending = await wait(relays, return_when=FIRST_COMPLETED)
+            for relay in pending:
+                relay.cancel()
+        finally:
+            await upstream.close()
+            await websocket.close()
+
+
+async def _relay(source, destination) -> None:
+    """Forwards the messages of a connection to another one until either closes"""
+    try:
+        async for message in source:
+            await destination.send(message)
+    except ConnectionClosed:
+        pass
@@ -12,6 +12,10 @@ class SMCBadSetup(SMCBase):
     """Exception raised if setup fails"""
 
 
+class SMCBadResume(SMCBase):
+    """Exception raised if a channel cannot be resumed on a new connection"""
+
+
 class SMCBadSignature(SMCBase):
     """Exceptions raised if a signature cannot be apposed to the related Layer-1 primitive"""
 
@@ -20,8 +24,29 @@ class SMCBadFunding(SMCBase):
     """Exception raised if the msig cannot uphold the payment assumption"""
 
 
+class SMCBadPayment(SMCBase):
+    """Exception raised if a payment does not follow the protocol"""
+
+
+class SMCLsigRejected(SMCBase):
+    """Exception raised if a transaction does not satisfy the conditions of a logic signature"""
+
+
+class SMCRetryLater(SMCBase):
+    """Exception raised if the recipient is overloaded and the request can be sent again later"""
+
+    def __init__(self, retry_after: float, *args):
+        super().__init__(*args)
+        # Seconds to wait before retrying.
+        self.retry_after = retry_after
+
+
 class SMCCannotBeRefunded(SMCBase):
     """
     Exception raised if the msig was correctly settled before the refund condition
      became online.
     """
+
+
+class SMCNotConfirmed(SMCBase):
+    """Exception raised if a transaction could not be confirmed before its deadline"""
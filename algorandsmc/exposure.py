@@ -0,0 +1,228 @@
+"""
+File that implements a recipient-wide view of the risk held in the open channels.
+Each channel only knows about itself, so nothing tells how much value is accepted but not settled yet, how much of it
+ is not covered by the balance of the msigs, or which channels are the closest to their refund condition.
+ExposureBook keeps the channels in columns and sweeps all of them in a few vectorized passes on every new round.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Channels with fewer rounds than this before the refund condition are at risk.
+SETTLE_MARGIN = 50
+# Channels ranked by each sweep.
+SETTLE_FIRST = 32
+INITIAL_CAPACITY = 1_024
+# Urgency of channels without accepted payments, which have nothing to settle and are ranked last.
+NOTHING_TO_SETTLE = np.iinfo(np.int64).max
+
+
+class ExposureReport:
+    """Outcome of a sweep"""
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        last_round: int,
+        total_exposure: int,
+        uncovered_exposure: int,
+        undercollateralized: int,
+        at_risk: int,
+        min_blocks_to_deadline: Optional[int],
+        settle_first: list[tuple[str, int, int]],
+    ):
+        self.last_round = last_round
+        # microalgos accepted on all the channels and not settled yet.
+        self.total_exposure = total_exposure
+        # microalgos accepted over the last known balance of their msig.
+        self.uncovered_exposure = uncovered_exposure
+        # Channels whose accepted amount is over the last known balance of their msig.
+        self.undercollateralized = undercollateralized
+        # Channels with accepted payments within the settle margin of their refund condition.
+        self.at_risk = at_risk
+        self.min_blocks_to_deadline = min_blocks_to_deadline
+        # Msig address, blocks to deadline and accepted amount of the channels to settle first, most urgent first.
+        self.settle_first = settle_first
+
+    def __repr__(self) -> str:
+        return (
+            f"ExposureReport(round={self.last_round}, total={self.total_exposure}, "
+            f"uncovered={self.uncovered_exposure}, "
+            f"undercollateralized={self.undercollateralized}, at_risk={self.at_risk}, "
+            f"min_blocks_to_deadline={self.min_blocks_to_deadline})"
+        )
+
+
+# pylint: disable-next=too-many-instance-attributes
+class ExposureBook:
+    """
+    Deadline, accepted amount and cached msig balance of each open channel, stored as columns.
+    Channels occupy the first len(self) rows. Removing one moves the last row in its place.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._addresses: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._min_refund_block = np.zeros(capacity, dtype=np.int64)
+        self._accepted = np.zeros(capacity, dtype=np.int64)
+        self._balance = np.zeros(capacity, dtype=np.int64)
+        # Round by which the channel has to be settled, or NOTHING_TO_SETTLE without accepted payments.
+        # It does not depend on the round, so it is kept up to date by track, update and untrack.
+        self._urgency = np.full(capacity, NOTHING_TO_SETTLE, dtype=np.int64)
+        # Channels with accepted payments.
+        self._pending = 0
+        # Preallocated results of a sweep.
+        self._uncovered = np.zeros(capacity, dtype=np.int64)
+        self._selected = np.zeros(capacity, dtype=np.bool_)
+
+    def __contains__(self, msig_address: str) -> bool:
+        return msig_address in self._rows
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def _grow(self) -> None:
+        """Doubles the capacity of the columns"""
+        for name in (
+            "_min_refund_block",
+            "_accepted",
+            "_balance",
+            "_urgency",
+            "_uncovered",
+            "_selected",
+        ):
+            column = getattr(self, name)
+            grown = np.zeros(2 * len(column), dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def _set_accepted(self, row: int, accepted: int) -> None:
+        """Records the accepted amount of a row and its urgency"""
+        self._pending += int(accepted > 0) - int(self._accepted[row] > 0)
+        self._accepted[row] = accepted
+        self._urgency[row] = (
+            self._min_refund_block[row] if accepted > 0 else NOTHING_TO_SETTLE
+        )
+
+    def track(self, msig_address: str, min_refund_block: int) -> None:
+        """
+        Starts tracking an open channel.
+
+        :param msig_address: Address of the msig of the channel
+        :param min_refund_block: Round in which the refund condition comes online
+        """
+        if msig_address in self._rows:
+            return
+        if len(self._addresses) == len(self._accepted):
+            self._grow()
+        row = len(self._addresses)
+        self._addresses.append(msig_address)
+        self._rows[msig_address] = row
+        self._min_refund_block[row] = min_refund_block
+        self._accepted[row] = 0
+        self._urgency[row] = NOTHING_TO_SETTLE
+        self._balance[row] = 0
+
+    def update(
+        self,
+        msig_address: str,
+        accepted: Optional[int] = None,
+        balance: Optional[int] = None,
+    ) -> None:
+        """
+        Records the last accepted amount and/or the last known balance of the msig of a channel.
+
+        :param msig_address: Address of the msig of the channel
+        :param accepted: Cumulative amount of the last accepted payment
+        :param balance: Balance of the msig in microalgos
+        """
+        row = self._rows.get(msig_address)
+        if row is None:
+            return
+        if accepted is not None:
+            self._set_accepted(row, accepted)
+        if balance is not None:
+            self._balance[row] = balance
+
+    def untrack(self, msig_address: str) -> None:
+        """
+        Stops tracking a channel, e.g. once it is settled.
+
+        :param msig_address: Address of the msig of the channel
+        """
+        row = self._rows.pop(msig_address, None)
+        if row is None:
+            return
+        self._set_accepted(row, 0)
+        last = len(self._addresses) - 1
+        last_address = self._addresses.pop()
+        if row != last:
+            self._addresses[row] = last_address
+            self._rows[last_address] = row
+            for column in (
+                self._min_refund_block,
+                self._accepted,
+                self._balance,
+                self._urgency,
+            ):
+                column[row] = column[last]
+
+    def sweep(
+        self, last_round: int, margin: int = SETTLE_MARGIN, top: int = SETTLE_FIRST
+    ) -> ExposureReport:
+        """
+        Computes the exposure of all channels at a round.
+
+        :param last_round: Last round of the chain
+        :param margin: Channels with fewer rounds than this before the refund condition are at risk
+        :param top: Channels in the ranked list
+        :return: Aggregate gauges and the channels to settle first
+        """
+        count = len(self._addresses)
+        if not count:
+            return ExposureReport(last_round, 0, 0, 0, 0, None, [])
+
+        accepted = self._accepted[:count]
+        urgency = self._urgency[:count]
+        uncovered = self._uncovered[:count]
+        selected = self._selected[:count]
+        np.subtract(accepted, self._balance[:count], out=uncovered)
+        np.maximum(uncovered, 0, out=uncovered)
+
+        threshold = last_round + margin
+        np.less(urgency, threshold, out=selected)
+        at_risk = int(np.count_nonzero(selected))
+
+        # Partitioning all the channels is the slowest pass, so only the ones due within a window of rounds are
+        #  ranked. The window starts at the margin and doubles until it holds enough channels to settle.
+        top = min(top, self._pending)
+        window = max(margin, 1)
+        candidates = at_risk
+        while candidates < top:
+            threshold = min(threshold + window, NOTHING_TO_SETTLE)
+            window *= 2
+            np.less(urgency, threshold, out=selected)
+            candidates = int(np.count_nonzero(selected))
+        rows = np.flatnonzero(selected)
+        if top < len(rows):
+            rows = rows[np.argpartition(urgency[rows], top - 1)[:top]]
+        # Among channels with the same deadline, larger amounts first.
+        ranked = rows[np.lexsort((-accepted[rows], urgency[rows]))][:top].tolist()
+
+        return ExposureReport(
+            last_round=last_round,
+            total_exposure=int(accepted.sum()),
+            uncovered_exposure=int(uncovered.sum()),
+            undercollateralized=int(np.count_nonzero(uncovered)),
+            at_risk=at_risk,
+            min_blocks_to_deadline=int(self._min_refund_block[:count].min())
+            - last_round,
+            settle_first=[
+                (
+                    self._addresses[row],
+                    int(self._min_refund_block[row]) - last_round,
+                    int(accepted[row]),
+                )
+                for row in ranked
+            ],
+        )
@@ -0,0 +1,189 @@
+"""
+File that implements the submission of settlements and refunds in fee-pooled atomic groups.
+The lsigs fix the fee of their transaction to the minimum, so a settlement or a refund sent alone cannot outbid other
+ transactions when the network is congested. In a fee-pooled group, the lsig transaction pays no fee and a payment
+ of the submitter to itself pays for both. No program constrains that fee, so bids are raised as the deadline nears.
+Bids are short-lived and a new one is only sent when the last one expired. Anyway, the lsig transaction closes the
+ msig, so no more than one group could ever be confirmed.
+"""
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+import base64
+import logging
+from copy import copy
+from typing import TYPE_CHECKING, Optional
+
+from algorandsmc.errors import SMCNotConfirmed
+from algorandsmc.nodes import NodePool, default_node_pool
+
+if TYPE_CHECKING:
+    from algosdk.transaction import LogicSigTransaction, SuggestedParams
+
+# The lsig transaction and the payment of the fee.
+GROUP_SIZE = 2
+# Factor of the fee from one bid to the next.
+FEE_ESCALATION = 2
+# Highest fee paid for a group in microalgos.
+MAX_POOLED_FEE = 1_000_000
+# Rounds in which a bid can be confirmed before it is replaced by a higher one.
+BID_ROUNDS = 2
+# Rounds before the deadline in which bids are sent at the highest fee.
+FINAL_ROUNDS = 2
+# First version of the programs that accepts a zero fee (see channel_artifacts_version).
+FEE_POOLING_VERSION = 2
+
+
+def pooled_fee(
+    base_fee: int, bids: int, blocks_left: int, max_fee: int = MAX_POOLED_FEE
+) -> int:
+    """
+    Returns the fee of the next bid. It grows geometrically with the bids that were not confirmed and it is the highest
+     in the last rounds before the deadline.
+
+    :param base_fee: Fee of the first bid
+    :param bids: Bids already sent
+    :param blocks_left: Rounds in which the group can still be confirmed
+    :param max_fee: Highest fee to pay. The first bid is sent anyway
+    :return: Fee of the whole group in microalgos
+    """
+    max_fee = max(base_fee, max_fee)
+    if blocks_left <= FINAL_ROUNDS:
+        return max_fee
+    return min(max_fee, base_fee * FEE_ESCALATION**bids)
+
+
+def suggested_fee(
+    lsig_txn: "LogicSigTransaction", sugg_params: "SuggestedParams"
+) -> int:
+    """
+    Returns the fee that the node suggests for a fee-pooled group.
+    Both transactions are priced as the lsig transaction, which is the largest.
+
+    :param lsig_txn: Signed settlement or refund
+    :param sugg_params: Suggested parameters of the node
+    :return: Fee of the whole group in microalgos
+    """
+    from algosdk.encoding import msgpack_encode
+
+    size = len(base64.b64decode(msgpack_encode(lsig_txn)))
+    return GROUP_SIZE * max(sugg_params.min_fee, sugg_params.fee * size)
+
+
+def fee_pooled_group(
+    lsig_txn: "LogicSigTransaction",
+    payer: str,
+    payer_private_key: str,
+    fee: int,
+    last_valid: int,
+) -> list:
+    """
+    Returns the atomic group of an lsig transaction without fee and of a payment of the payer that pays for both.
+    The lsig signs the program rather than the transaction, so any number of groups can be made from the same one.
+
+    :param lsig_txn: Signed settlement or refund. It is not modified
+    :param payer: Algorand address that pays the fee
+    :param payer_private_key: Private key of the payer
+    :param fee: Fee of the whole group in microalgos
+    :param last_valid: Last round in which the group can be confirmed
+    :return: Signed transactions of the group, ready to be sent
+    """
+    from algosdk.transaction import (
+        LogicSigTransaction,
+        PaymentTxn,
+        SuggestedParams,
+        assign_group_id,
+    )
+
+    txn = copy(lsig_txn.transaction)
+    txn.fee = 0
+    txn.group = None
+    fee_txn = PaymentTxn(
+        payer,
+        SuggestedParams(
+            fee,
+            txn.first_valid_round,
+            last_valid,
+            txn.genesis_hash,
+            txn.genesis_id,
+            flat_fee=True,
+        ),
+        payer,
+        0,
+    )
+    assign_group_id([txn, fee_txn])
+
+    return [LogicSigTransaction(txn, lsig_txn.lsig), fee_txn.sign(payer_private_key)]
+
+
+def _confirmed(node_algod, txid: Optional[str]) -> bool:
+    """Returns whether a transaction was confirmed"""
+    from algosdk.error import AlgodHTTPError
+
+    if txid is None:
+        return False
+    try:
+        return node_algod.pending_transaction_info(txid).get("confirmed-round", 0) > 0
+    except AlgodHTTPError:
+        # The node forgets transactions that expired.
+        return False
+
+
+# pylint: disable-next=too-many-arguments
+def send_fee_pooled(
+    lsig_txn: "LogicSigTransaction",
+    payer: str,
+    payer_private_key: str,
+    deadline: int,
+    max_fee: int = MAX_POOLED_FEE,
+    node_pool: Optional[NodePool] = None,
+) -> str:
+    """
+    Sends an lsig transaction in fee-pooled groups, each one with a higher fee than the last, until one is confirmed.
+    It is blocking because of the node calls.
+
+    :param lsig_txn: Signed settlement or refund
+    :param payer: Algorand address that pays the fee
+    :param payer_private_key: Private key of the payer
+    :param deadline: Last round in which the lsig transaction can be confirmed
+    :param max_fee: Highest fee to pay for a group in microalgos
+    :param node_pool: Nodes to use. The default pool if not given
+    :return: Transaction id of the confirmed lsig transaction
+    :raises SMCNotConfirmed: If no group was confirmed by the deadline
+    """
+    from algosdk.error import AlgodHTTPError
+
+    node_algod = (node_pool or default_node_pool()).algod
+    deadline = min(deadline, lsig_txn.transaction.last_valid_round)
+
+    bids = 0
+    txid = None
+    bid_last_valid = 0
+    last_round = node_algod.status()["last-round"]
+    while True:
+        if _confirmed(node_algod, txid):
+            return txid
+        if last_round >= deadline:
+            raise SMCNotConfirmed(f"No fee-pooled group confirmed by round {deadline}.")
+
+        # Bids are only replaced once they expired, so that at most one of them is live.
+        if last_round >= bid_last_valid:
+            fee = pooled_fee(
+                suggested_fee(lsig_txn, node_algod.suggested_params()),
+                bids,
+                deadline - last_round,
+                max_fee,
+            )
+            bid_last_valid = min(deadline, last_round + BID_ROUNDS)
+            group = fee_pooled_group(
+                lsig_txn, payer, payer_private_key, fee, bid_last_valid
+            )
+            bids += 1
+            try:
+                txid = node_algod.send_transactions(group)
+                logging.info("Fee-pooled bid of %s microalgos sent.", fee)
+            except AlgodHTTPError as err:
+                # E.g. the pool of the node is full and the fee is too low. The next bid is higher.
+                txid = None
+                logging.warning("Fee-pooled bid of %s microalgos refused: %s", fee, err)
+
+        last_round = node_algod.status_after_block(last_round)["last-round"]
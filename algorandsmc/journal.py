@@ -0,0 +1,292 @@
+"""
+File that implements the journal of the payments accepted by the recipient.
+The journal is an append-only binary file: a header followed by records of fixed size.
+Records are made durable in batches (group commit), so many payments share one fsync. Readers map the file in memory
+ and scan or binary search it without turning the records into Python objects.
+"""
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+import mmap
+import os
+import struct
+import time
+from asyncio import Event, Future, Task
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import create_task, get_running_loop, wait_for
+from pathlib import Path
+from typing import Iterator, Optional
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import Payment
+
+JOURNAL_MAGIC = b"SMCJ"
+JOURNAL_VERSION = 1
+# Magic, version and record size.
+HEADER = struct.Struct("<4sHH8x")
+# Public key of the msig, cumulative amount, receive time in nanoseconds since the epoch and signature of the sender.
+RECORD = struct.Struct("<32sQQ64s")
+# Offset of the receive time within a record.
+RECEIVED_OFFSET = 40
+
+# Seconds that a record can wait for the others of its batch before being committed.
+COMMIT_INTERVAL = 0.005
+# Bytes of records after which a batch is committed without waiting.
+MAX_BATCH_BYTES = 1024 * RECORD.size
+
+
+def _msig_key(msig_address: str) -> bytes:
+    """Returns the public key of an msig address as stored in the journal"""
+    from algosdk.encoding import decode_address
+
+    return decode_address(msig_address)
+
+
+# pylint: disable-next=too-many-instance-attributes
+class JournalWriter:
+    """
+    Appends accepted payments to the journal.
+    Only one writer must use a journal at a time.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        commit_interval: float = COMMIT_INTERVAL,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+    ):
+        """
+        :param path: Journal file. It is created if it doesn't exist
+        :param commit_interval: Seconds that a record can wait for the others of its batch
+        :param max_batch_bytes: Bytes of records after which a batch is committed without waiting
+        """
+        self.commit_interval = commit_interval
+        self.max_batch_bytes = max_batch_bytes
+
+        self._last_received_ns = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            os.write(self._fd, HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, RECORD.size))
+            os.fsync(self._fd)
+        else:
+            _check_header(os.pread(self._fd, HEADER.size, 0))
+            # A crash during a write can leave a partial record at the end.
+            torn = (size - HEADER.size) % RECORD.size
+            if torn:
+                size -= torn
+                os.ftruncate(self._fd, size)
+            if size > HEADER.size:
+                (self._last_received_ns,) = struct.unpack(
+                    "<Q", os.pread(self._fd, 8, size - RECORD.size + RECEIVED_OFFSET)
+                )
+
+        self._pending = bytearray()
+        self._waiters: list[Future] = []
+        self._batch_full = Event()
+        self._committer: Optional[Task] = None
+
+    def add(
+        self, msig_address: str, payment: Payment, received_ns: Optional[int] = None
+    ) -> Future:
+        """
+        Adds a payment to the next batch without waiting for it to be committed.
+
+        :param msig_address: Address of the msig of the channel
+        :param payment: Accepted payment
+        :param received_ns: Receive time in nanoseconds since the epoch. Now if not given
+        :return: Future done once the payment is durable, or with the error of its write
+        """
+        # Receive times never decrease in the journal, so that readers can binary search them.
+        self._last_received_ns = max(
+            self._last_received_ns, received_ns or time.time_ns()
+        )
+        self._pending += RECORD.pack(
+            _msig_key(msig_address),
+            payment.cumulativeAmount,
+            self._last_received_ns,
+            payment.lsigSignature,
+        )
+
+        waiter = get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if len(self._pending) >= self.max_batch_bytes:
+            self._batch_full.set()
+        if self._committer is None:
+            self._committer = create_task(self._commit())
+        return waiter
+
+    async def append(
+        self, msig_address: str, payment: Payment, received_ns: Optional[int] = None
+    ) -> None:
+        """
+        Appends a payment to the journal. It returns once the payment is durable.
+
+        :param msig_address: Address of the msig of the channel
+        :param payment: Accepted payment
+        :param received_ns: Receive time in nanoseconds since the epoch. Now if not given
+        """
+        await self.add(msig_address, payment, received_ns)
+
+    async def flush(self) -> None:
+        """Commits the pending records without waiting for the batch to fill. It returns once they are durable"""
+        if self._committer is not None:
+            self._batch_full.set()
+            await self._committer
+
+    async def close(self) -> None:
+        """Commits the pending records and closes the journal"""
+        await self.flush()
+        os.close(self._fd)
+
+    async def _commit(self) -> None:
+        """Writes and syncs batches of records until none are pending"""
+        loop = get_running_loop()
+        try:
+            while self._waiters:
+                try:
+                    await wait_for(self._batch_full.wait(), self.commit_interval)
+                except AsyncTimeoutError:
+                    pass
+                self._batch_full.clear()
+
+                # Records appended while this batch is written go in the next one.
+                batch, self._pending = bytes(self._pending), bytearray()
+                waiters, self._waiters = self._waiters, []
+                try:
+                    # Writes are blocking.
+                    await loop.run_in_executor(None, self._write, batch)
+                except OSError as err:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(err)
+                else:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_result(None)
+        finally:
+            self._committer = None
+
+    def _write(self, batch: bytes) -> None:
+        """Writes a batch of records and makes it durable"""
+        view = memoryview(batch)
+        while view:
+            view = view[os.write(self._fd, view) :]
+        os.fsync(self._fd)
+
+
+def _check_header(header: bytes) -> None:
+    """Raises ValueError if a journal was not written by this version"""
+    if len(header) < HEADER.size:
+        raise ValueError("Journal is missing its header.")
+    magic, version, record_size = HEADER.unpack(header)
+    if (
+        magic != JOURNAL_MAGIC
+        or version != JOURNAL_VERSION
+        or record_size != RECORD.size
+    ):
+        raise ValueError("Journal was written in an unknown format.")
+
+
+class JournalReader:
+    """
+    Reads a journal through a memory map.
+    Records are returned as tuples of (msig public key, cumulative amount, receive time, signature).
+    The reader sees the records that were in the journal when it was opened.
+    """
+
+    def __init__(self, path: Path | str):
+        with open(path, "rb") as journal_file:
+            size = os.fstat(journal_file.fileno()).st_size
+            _check_header(journal_file.read(HEADER.size))
+            self._length = (size - HEADER.size) // RECORD.size
+            self._mmap = (
+                mmap.mmap(journal_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if self._length
+                else None
+            )
+
+    def __enter__(self) -> "JournalReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def close(self) -> None:
+        """Unmaps the journal"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def record(self, index: int) -> tuple[bytes, int, int, bytes]:
+        """
+        Returns a single record.
+
+        :param index: Position of the record in the journal
+        :return: msig public key, cumulative amount, receive time and signature
+        """
+        if not 0 <= index < self._length:
+            raise IndexError("Journal record out of range.")
+        return RECORD.unpack_from(self._mmap, HEADER.size + index * RECORD.size)
+
+    def scan(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[tuple[bytes, int, int, bytes]]:
+        """
+        Iterates over a range of records, one at a time.
+
+        :param start: Position of the first record
+        :param stop: Position after the last record. The end of the journal if not given
+        """
+        stop = self._length if stop is None else min(stop, self._length)
+        # Records are copied out one at a time, so that no view of the map outlives a step and it can be closed.
+        for offset in range(
+            HEADER.size + start * RECORD.size,
+            HEADER.size + stop * RECORD.size,
+            RECORD.size,
+        ):
+            yield RECORD.unpack_from(self._mmap, offset)
+
+    def bisect_received(self, received_ns: int) -> int:
+        """
+        Finds the first record that was received at or after a time.
+
+        :param received_ns: Time in nanoseconds since the epoch
+        :return: Position of the record. The length of the journal if there is none
+        """
+        low, high = 0, self._length
+        while low < high:
+            middle = (low + high) // 2
+            (middle_received_ns,) = struct.unpack_from(
+                "<Q", self._mmap, HEADER.size + middle * RECORD.size + RECEIVED_OFFSET
+            )
+            if middle_received_ns < received_ns:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def last_payment(
+        self, msig_address: str
+    ) -> Optional[tuple[bytes, int, int, bytes]]:
+        """
+        Finds the latest payment of a channel by searching the journal backwards.
+
+        :param msig_address: Address of the msig of the channel
+        :return: Latest record of the channel, if any
+        """
+        if self._mmap is None:
+            return None
+        msig_key = _msig_key(msig_address)
+        # The map can be longer than the records counted when the reader was opened.
+        end = HEADER.size + self._length * RECORD.size
+        while True:
+            offset = self._mmap.rfind(msig_key, HEADER.size, end)
+            if offset < 0:
+                return None
+            # The key could also appear inside another field.
+            if (offset - HEADER.size) % RECORD.size == 0:
+                return RECORD.unpack_from(self._mmap, offset)
+            end = offset + len(msig_key) - 1
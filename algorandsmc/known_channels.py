@@ -0,0 +1,76 @@
+"""
+File that implements the set of known channels with eviction by expiry.
+A channel can be forgotten once its refund window closed: the maxRefundBlock is part of the msig address, so a
+ proposal of the same channel would have to be in the past and is rejected as such.
+This keeps the memory of a long-running process bounded by the number of live channels.
+"""
+import heapq
+from threading import Lock
+from typing import Protocol
+
+
+class ChannelRegistry(Protocol):
+    """
+    Backend of the check for known channels.
+    KnownChannels keeps them in the memory of one process. A cluster of recipients shares them instead
+     (see algorandsmc.cluster).
+    """
+
+    def claim(self, msig_address: str, max_refund_block: int) -> bool:
+        """Adds a channel unless it is known and returns whether it was new"""
+
+    def evict(self, current_round: int) -> int:
+        """Forgets the channels whose refund window closed before a round"""
+
+
+class KnownChannels:
+    """
+    Addresses of the msigs of known channels, indexed by the round in which their refund window closes.
+    Channels that expire before the last eviction round count as known, whether they were seen or not.
+    """
+
+    def __init__(self):
+        self._expiries: dict[str, int] = {}
+        # Min-heap of (maxRefundBlock, msig address).
+        self._by_expiry: list[tuple[int, str]] = []
+        # Channels that expire before this round were evicted.
+        self.horizon = 0
+        # Setups can be checked in different threads (see recipient.accept_setup).
+        self._lock = Lock()
+
+    def __contains__(self, msig_address: str) -> bool:
+        return msig_address in self._expiries
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def claim(self, msig_address: str, max_refund_block: int) -> bool:
+        """
+        Adds a channel unless it is known.
+
+        :param msig_address: Address of the msig of the channel
+        :param max_refund_block: Last round of the refund window of the channel
+        :return: Whether the channel was new
+        """
+        with self._lock:
+            if max_refund_block < self.horizon or msig_address in self._expiries:
+                return False
+            self._expiries[msig_address] = max_refund_block
+            heapq.heappush(self._by_expiry, (max_refund_block, msig_address))
+            return True
+
+    def evict(self, current_round: int) -> int:
+        """
+        Forgets all channels whose refund window closed before a round.
+
+        :param current_round: Last round of the chain
+        :return: Number of evicted channels
+        """
+        evicted = 0
+        with self._lock:
+            self.horizon = max(self.horizon, current_round)
+            while self._by_expiry and self._by_expiry[0][0] < self.horizon:
+                _, msig_address = heapq.heappop(self._by_expiry)
+                del self._expiries[msig_address]
+                evicted += 1
+        return evicted
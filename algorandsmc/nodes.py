@@ -0,0 +1,238 @@
+"""
+File that implements pools of Algorand nodes with health checks, failover and latency-aware routing.
+"""
+# The SDK and json are imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from algorandsmc.utils import get_sandbox_algod, get_sandbox_indexer
+
+# Weight of the newest sample in the moving average of the latency of an endpoint.
+LATENCY_EWMA_ALPHA = 0.2
+# Seconds before an endpoint that failed can be tried again.
+RECHECK_AFTER = 5.0
+# Seconds between two rounds of health checks when monitoring a pool.
+HEALTH_CHECK_INTERVAL = 10.0
+# HTTP status codes that mean that the node, not the request, is at fault.
+RETRIABLE_HTTP_CODES = {429}
+
+
+def is_node_failure(err: Exception) -> bool:
+    """
+    Tells apart failures of a node from errors that the node returns on purpose (e.g. an unknown account).
+    Only failures of a node are worth a retry on another endpoint.
+
+    :param err: Error raised by a client
+    :return: Whether another endpoint could succeed
+    """
+    from algosdk.error import AlgodHTTPError, IndexerHTTPError
+
+    # Connection refused, DNS failures and timeouts (urllib.error.URLError is an OSError).
+    if isinstance(err, OSError):
+        return True
+    if isinstance(err, (AlgodHTTPError, IndexerHTTPError)):
+        code = getattr(err, "code", None)
+        return code is not None and (code >= 500 or code in RETRIABLE_HTTP_CODES)
+    return False
+
+
+class Endpoint:
+    """Client of one node together with what the pool has observed about it"""
+
+    def __init__(self, client: Any):
+        self.client = client
+        # Moving average of the duration of successful calls in seconds. Unmeasured endpoints are tried first.
+        self.latency = 0.0
+        self.healthy = True
+        self.failed_at = 0.0
+
+    def __repr__(self) -> str:
+        address = getattr(self.client, "algod_address", None) or getattr(
+            self.client, "indexer_address", None
+        )
+        return f"Endpoint({address})"
+
+    def observe(self, elapsed: float) -> None:
+        """Records the duration of a successful call"""
+        self.healthy = True
+        if self.latency == 0.0:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_EWMA_ALPHA * (elapsed - self.latency)
+
+    def fail(self) -> None:
+        """Records a failure of the node"""
+        self.healthy = False
+        self.failed_at = time.monotonic()
+
+    def available(self, now: float) -> bool:
+        """Whether the endpoint should receive calls"""
+        return self.healthy or now - self.failed_at >= RECHECK_AFTER
+
+
+class EndpointPool:
+    """
+    Pool of interchangeable clients (e.g. replicas of algod).
+    Every call goes to the available endpoint with the lowest latency and it is retried on the next one if
+     the node fails. The pool has the same methods as the clients it wraps, so it can be used in place of a client.
+    """
+
+    def __init__(self, clients: Sequence[Any]):
+        if not clients:
+            raise ValueError("A pool needs at least one endpoint.")
+        self.endpoints = [Endpoint(client) for client in clients]
+
+    def __getattr__(self, name: str):
+        # Only reached for what the pool itself doesn't define, i.e. the methods of the clients.
+        if name.startswith("_") or name == "endpoints":
+            raise AttributeError(name)
+        if not callable(getattr(self.endpoints[0].client, name)):
+            raise AttributeError(name)
+
+        def pooled_call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        return pooled_call
+
+    def route(self) -> list[Endpoint]:
+        """Returns the endpoints in the order they should be tried"""
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        # If all nodes look down, trying them anyway is better than failing without a call.
+        return sorted(
+            available or self.endpoints, key=lambda endpoint: endpoint.latency
+        )
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """
+        Calls a method of the clients with failover.
+
+        :param method: Name of the method of the client
+        :return: Result of the first endpoint that doesn't fail
+        """
+        last_error: Optional[Exception] = None
+        for endpoint in self.route():
+            time_start = time.perf_counter()
+            try:
+                result = getattr(endpoint.client, method)(*args, **kwargs)
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                if not is_node_failure(err):
+                    raise
+                logging.warning("%s failed on %s: %s", endpoint, method, err)
+                endpoint.fail()
+                last_error = err
+                continue
+            endpoint.observe(time.perf_counter() - time_start)
+            return result
+
+        assert last_error is not None
+        raise last_error
+
+    def check_health(self) -> None:
+        """Probes every endpoint, including the ones that are considered down"""
+        for endpoint in self.endpoints:
+            time_start = time.perf_counter()
+            try:
+                endpoint.client.health()
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                logging.warning("%s is not healthy: %s", endpoint, err)
+                endpoint.fail()
+            else:
+                endpoint.observe(time.perf_counter() - time_start)
+
+
+class NodePool:
+    """Pools of algod and indexer endpoints used by the templates and the protocol functions"""
+
+    def __init__(self, algod: EndpointPool, indexer: EndpointPool):
+        self.algod = algod
+        self.indexer = indexer
+
+    @classmethod
+    def from_endpoints(
+        cls,
+        algod_endpoints: Sequence[tuple[str, str]],
+        indexer_endpoints: Sequence[tuple[str, str]],
+    ) -> "NodePool":
+        """
+        Builds the pools from the endpoints of the nodes.
+
+        :param algod_endpoints: Address and token of each algod
+        :param indexer_endpoints: Address and token of each indexer
+        :return: Pools of algod and indexer
+        """
+        from algosdk.v2client.algod import AlgodClient
+        from algosdk.v2client.indexer import IndexerClient
+
+        return cls(
+            EndpointPool(
+                [AlgodClient(token, address) for address, token in algod_endpoints]
+            ),
+            EndpointPool(
+                [IndexerClient(token, address) for address, token in indexer_endpoints]
+            ),
+        )
+
+    @classmethod
+    def from_config(cls, path: Path | str) -> "NodePool":
+        """
+        Builds the pools from a JSON file shaped like
+         {"algod": [{"address": ..., "token": ...}], "indexer": [{"address": ..., "token": ...}]}
+
+        :param path: Configuration file
+        :return: Pools of algod and indexer
+        """
+        import json
+
+        config = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls.from_endpoints(
+            [(node["address"], node["token"]) for node in config["algod"]],
+            [(node["address"], node["token"]) for node in config["indexer"]],
+        )
+
+    def check_health(self) -> None:
+        """Probes every algod and indexer endpoint"""
+        self.algod.check_health()
+        self.indexer.check_health()
+
+    async def monitor(self, interval: float = HEALTH_CHECK_INTERVAL) -> None:
+        """
+        Keeps probing the endpoints so that nodes that come back are used again and latencies stay fresh.
+        It runs until cancelled.
+
+        :param interval: Seconds between two rounds of health checks
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            # Clients are blocking.
+            await loop.run_in_executor(None, self.check_health)
+            await asyncio.sleep(interval)
+
+
+_DEFAULT_NODE_POOL: Optional[NodePool] = None
+
+
+def default_node_pool() -> NodePool:
+    """Returns the pool used when none is given. Unless configured, this is the sandbox alone."""
+    global _DEFAULT_NODE_POOL  # pylint: disable=global-statement
+    if _DEFAULT_NODE_POOL is None:
+        _DEFAULT_NODE_POOL = NodePool(
+            EndpointPool([get_sandbox_algod()]), EndpointPool([get_sandbox_indexer()])
+        )
+    return _DEFAULT_NODE_POOL
+
+
+def set_default_node_pool(node_pool: NodePool) -> None:
+    """
+    Sets the pool used when none is given.
+
+    :param node_pool: Pools of algod and indexer
+    """
+    global _DEFAULT_NODE_POOL  # pylint: disable=global-statement
+    _DEFAULT_NODE_POOL = node_pool
@@ -1,35 +1,97 @@
 """
 File that implements all things related to the recipient side of an SMC.
 """
+# The SDK and websockets are imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+import base64
 import logging
-
-from algosdk.account import address_from_private_key
-from algosdk.encoding import is_valid_address
-from algosdk.error import IndexerHTTPError
-from algosdk.mnemonic import to_private_key
-from algosdk.transaction import LogicSigTransaction, wait_for_confirmation
-
-from algorandsmc.errors import SMCBadFunding, SMCBadSetup, SMCBadSignature
+import time
+from asyncio import Queue, Task, create_task, get_running_loop, sleep
+from contextlib import nullcontext
+from functools import cache
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from algorandsmc.admission import RETRY_AFTER, AdmissionControl
+from algorandsmc.errors import (
+    SMCBadFunding,
+    SMCBadPayment,
+    SMCBadResume,
+    SMCBadSetup,
+    SMCBadSignature,
+    SMCBase,
+    SMCRetryLater,
+)
+from algorandsmc.fee_pooling import FEE_POOLING_VERSION, MAX_POOLED_FEE, send_fee_pooled
+from algorandsmc.known_channels import ChannelRegistry, KnownChannels
+from algorandsmc.nodes import NodePool, default_node_pool
 
 # pylint: disable-next=no-name-in-module
-from algorandsmc.smc_pb2 import Payment, setupProposal, setupResponse
+from algorandsmc.smc_pb2 import (
+    AdmissionStatus,
+    Payment,
+    SMCMethod,
+    paymentResponse,
+    resumeRequest,
+    resumeResponse,
+    setupProposal,
+    setupResponse,
+)
 from algorandsmc.templates import (
+    check_settlement,
     smc_lsig_refund,
     smc_lsig_settlement,
     smc_msig,
     smc_txn_settlement,
 )
-from algorandsmc.utils import get_sandbox_algod, get_sandbox_indexer
+from algorandsmc.templates.artifacts import channel_artifacts_version
+from algorandsmc.tracing import record_span, span
+from algorandsmc.utils import resume_message
+
+if TYPE_CHECKING:
+    from algosdk.transaction import LogicSigTransaction
 
 logging.root.setLevel(logging.INFO)
 
+# Maximum number of verified payments that can wait for a consumer of a PaymentStream.
+PAYMENT_QUEUE_SIZE = 64
+
 RECIPIENT_PRIVATE_KEY_MNEMONIC = (
     "question middle cube wire breeze choose rival accident disorder wood "
     "park erosion uphold shine picnic industry diagram attack magnet park "
     "evoke music auto above gas"
 )
-RECIPIENT_PRIVATE_KEY = to_private_key(RECIPIENT_PRIVATE_KEY_MNEMONIC)
-RECIPIENT_ADDR = address_from_private_key(RECIPIENT_PRIVATE_KEY)
+
+
+@cache
+def _recipient_private_key() -> str:
+    """Derives the private key of the recipient the first time it is needed"""
+    from algosdk.mnemonic import to_private_key
+
+    return to_private_key(RECIPIENT_PRIVATE_KEY_MNEMONIC)
+
+
+@cache
+def _recipient_addr() -> str:
+    """Derives the address of the recipient the first time it is needed"""
+    from algosdk.account import address_from_private_key
+
+    return address_from_private_key(_recipient_private_key())
+
+
+def __getattr__(name: str):
+    """Keeps RECIPIENT_PRIVATE_KEY and RECIPIENT_ADDR available as module attributes without deriving them at import time"""
+    if name == "RECIPIENT_PRIVATE_KEY":
+        return _recipient_private_key()
+    if name == "RECIPIENT_ADDR":
+        return _recipient_addr()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if TYPE_CHECKING:
+    # Resolved by __getattr__, declared for linters and type checkers.
+    RECIPIENT_PRIVATE_KEY: str
+    RECIPIENT_ADDR: str
+
 
 # This is the minimum lifetime of a channel that the recipient is willing to accept.
 # The channel should last at least 2_000 blocks starting from the current one.
@@ -51,65 +113,186 @@ MIN_ACCEPTED_LIFETIME = 2_000
 #
 # For these two reasons (honesty and safety), we choose to take the conservative approach of never re-opening
 #  a known channel. Even though it is not strictly needed for safety.
-KNOWN_CHANNELS = set()
+# Channels whose refund window closed are forgotten because the lifetime check would reject them anyway.
+KNOWN_CHANNELS = KnownChannels()
 
 # Margin note: It is easy to decide if we know a channel because exactly all the arguments that uniquely determine
 #  an SMC, are also embedded in the address of the shared msig (more details in the docstring of smc_msig).
 #  It is therefore sufficient to remember all addresses of the msigs to check if we know a channel.
 
 
-async def setup_channel(websocket) -> setupProposal:
+# pylint: disable-next=too-many-instance-attributes
+class RecipientChannel:
     """
-    Handles the setup of the channel on the recipient side.
+    Recipient's state of an accepted channel.
+    It outlives the websocket of the setup so that the sender can resume the channel on a new connection.
+    """
+
+    def __init__(
+        self, accepted_setup: setupProposal, node_pool: Optional[NodePool] = None
+    ):
+        self.accepted_setup = accepted_setup
+        self.msig_address = smc_msig(
+            accepted_setup.sender,
+            _recipient_addr(),
+            accepted_setup.nonce,
+            accepted_setup.minRefundBlock,
+            accepted_setup.maxRefundBlock,
+            node_pool,
+        ).address()
+        self.node_pool = node_pool
+        self.last_payment: Optional[Payment] = None
+        # Connection that is currently serving this channel, if any.
+        self.websocket = None
+        # Counter of the last resume request. Requests with a lower or equal counter are replays.
+        self.resume_counter = 0
+        # Fully signed settlement of a recent payment and its amount.
+        self.settlement: Optional["LogicSigTransaction"] = None
+        self.settlement_amount = 0
+        self._preparing: Optional[Task] = None
+        # Balance of the msig seen by the last verification of a payment.
+        self.msig_balance = 0
+
+    def prepare_settlement(self) -> None:
+        """
+        Starts building the settlement of the last payment in the background, so that settling at the deadline
+         only takes a send. Payments that arrive in the meantime are coalesced: only the latest one is built.
+        """
+        if self._preparing is None or self._preparing.done():
+            self._preparing = create_task(self._prepare_settlement())
+
+    async def _prepare_settlement(self) -> None:
+        loop = get_running_loop()
+        while (
+            self.last_payment
+            and self.last_payment.cumulativeAmount > self.settlement_amount
+        ):
+            payment = self.last_payment
+            try:
+                # Node calls run in a thread so that payments keep flowing meanwhile.
+                settlement = await loop.run_in_executor(
+                    None,
+                    build_settlement,
+                    self.accepted_setup,
+                    payment,
+                    self.node_pool,
+                    True,
+                )
+            # pylint: disable-next=broad-except
+            except Exception as err:
+                # settle builds the settlement itself if none is ready.
+                logging.warning("Could not prepare the settlement: %s", err)
+                return
+            self.settlement = settlement
+            self.settlement_amount = payment.cumulativeAmount
+
+    def prepared_settlement(self) -> Optional["LogicSigTransaction"]:
+        """Returns the prepared settlement if it settles the last payment"""
+        if self.last_payment and (
+            self.settlement_amount == self.last_payment.cumulativeAmount
+        ):
+            return self.settlement
+        return None
+
+
+# Channels that can still be resumed, by msig address.
+OPEN_CHANNELS: dict[str, RecipientChannel] = {}
+
+
+def open_channel(
+    websocket, accepted_setup: setupProposal, node_pool: Optional[NodePool] = None
+) -> RecipientChannel:
+    """
+    Keeps track of an accepted channel so that it can be resumed if the connection drops.
+
+    :param websocket: Connection of the setup
+    :param accepted_setup: Sender's side of arguments for this channel
+    :param node_pool: Nodes to use. The default pool if not given
+    :return: State of the channel
+    """
+    channel = RecipientChannel(accepted_setup, node_pool)
+    channel.websocket = websocket
+    OPEN_CHANNELS[channel.msig_address] = channel
+    return channel
+
+
+def close_channel(channel: RecipientChannel) -> None:
+    """
+    Forbids any further resumption of the channel. This should happen before settlement.
+
+    :param channel: State of the channel
+    """
+    OPEN_CHANNELS.pop(channel.msig_address, None)
+
+
+def accept_setup(
+    setup_proposal: setupProposal,
+    node_pool: Optional[NodePool] = None,
+    known_channels: Optional[ChannelRegistry] = None,
+) -> setupResponse:
+    """
+    Checks a channel proposal and signs the refund lsig if the recipient accepts it.
     This should include all reasonable checks that the recipient would want to do even if
      commented out.
+    It is blocking because of the node calls.
 
-    :param websocket:
-    :return: Sender's side of arguments for this channel
+    :param setup_proposal: Sender's side of arguments for this channel
+    :param node_pool: Nodes to use. The default pool if not given
+    :param known_channels: Channels known to the recipient. KNOWN_CHANNELS if not given
+    :return: Recipient's side of arguments for this channel
     """
-    node_algod = get_sandbox_algod()
+    from algosdk.encoding import is_valid_address
+
+    node_algod = (node_pool or default_node_pool()).algod
+    if known_channels is None:
+        known_channels = KNOWN_CHANNELS
 
-    setup_proposal: setupProposal = setupProposal.FromString(await websocket.recv())
     # Protobuf doesn't know what constitutes a valid Algorand address.
     if not is_valid_address(setup_proposal.sender):
         raise SMCBadSetup("Sender address is not a valid Algorand address.")
     # Refund condition should be sound.
     if not setup_proposal.minRefundBlock <= setup_proposal.maxRefundBlock:
         raise SMCBadSetup("Refund condition can never happen.")
+    try:
+        version = channel_artifacts_version(setup_proposal)
+    except ValueError as err:
+        raise SMCBadSetup("Programs of the channel are not known.") from err
 
-    node_algod.status()
+    chain_status = node_algod.status()
     # Should be at the very most 5 seconds per block. More than that and we can say that we are out of sync.
     # if not chain_status["time-since-last-round"] < 6 * 10**9:
     #     raise Exception("Recipient knowledge of the chain is not synchronized.")
     # Channel lifetime should be enough.
-    # if (
-    #     not setup_proposal.minRefundBlock
-    #     >= chain_status["last-round"] + MIN_ACCEPTED_LIFETIME
-    # ):
-    #     raise SMCBadSetup("Channel lifetime is not reasonable.")
+    if (
+        not setup_proposal.minRefundBlock
+        >= chain_status["last-round"] + MIN_ACCEPTED_LIFETIME
+    ):
+        raise SMCBadSetup("Channel lifetime is not reasonable.")
+    known_channels.evict(chain_status["last-round"])
 
     logging.info("setup_proposal = %s", setup_proposal)
 
     # Compiling msig template on the recipient side.
     proposed_msig = smc_msig(
         setup_proposal.sender,
-        RECIPIENT_ADDR,
+        _recipient_addr(),
         setup_proposal.nonce,
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
     )
     logging.info("proposed_msig.address() = %s", proposed_msig.address())
-    if proposed_msig.address() in KNOWN_CHANNELS:
+    # Recipient accepts this channel if it's new.
+    if not known_channels.claim(proposed_msig.address(), setup_proposal.maxRefundBlock):
         raise SMCBadSetup("This channel is known.")
 
-    # Recipient accepts this channel.
-    KNOWN_CHANNELS.add(proposed_msig.address())
-
     # Compiling lsig template on the recipient side.
     proposed_refund_lsig = smc_lsig_refund(
         setup_proposal.sender,
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
+        version,
     )
     # Signing the lsig with the msig only on the recipient side.
     # Crucially, the lsig MUST NOT be signed using the recipient secret key directly.
@@ -121,109 +304,642 @@ async def setup_channel(websocket) -> setupProposal:
     #  https://github.com/algorand/go-algorand/issues/3953#issuecomment-1197423517
     #  Instead, the sandbox correctly refuses to process a transaction with lsig where
     #  the lsig was not signed by the msig.
-    proposed_refund_lsig.sign_multisig(proposed_msig, RECIPIENT_PRIVATE_KEY)
+    proposed_refund_lsig.sign_multisig(proposed_msig, _recipient_private_key())
     refund_lsig_signature = proposed_refund_lsig.lsig.msig.subsigs[1].signature
 
     logging.info("Channel accepted.")
-    await websocket.send(
-        setupResponse(
-            recipient=RECIPIENT_ADDR,
-            lsigSignature=refund_lsig_signature,
-        ).SerializeToString()
+
+    return setupResponse(
+        recipient=_recipient_addr(),
+        lsigSignature=refund_lsig_signature,
     )
+
+
+async def setup_channel(
+    websocket,
+    node_pool: Optional[NodePool] = None,
+    admission: Optional[AdmissionControl] = None,
+    known_channels: Optional[ChannelRegistry] = None,
+) -> setupProposal:
+    """
+    Handles the setup of the channel on the recipient side.
+    The sender is answered even if the proposal is rejected or has to be sent again later.
+
+    :param websocket:
+    :param node_pool: Nodes to use. The default pool if not given
+    :param admission: Limits of the recipient. None if not given
+    :param known_channels: Channels known to the recipient. KNOWN_CHANNELS if not given
+    :return: Sender's side of arguments for this channel
+    """
+    setup_proposal: setupProposal = setupProposal.FromString(await websocket.recv())
+
+    try:
+        async with (
+            admission.setup(setup_proposal.sender) if admission else nullcontext()
+        ):
+            # Node calls run in a thread so that payments of open channels keep flowing meanwhile.
+            setup_response = await get_running_loop().run_in_executor(
+                None, accept_setup, setup_proposal, node_pool, known_channels
+            )
+    except SMCRetryLater as err:
+        await websocket.send(
+            setupResponse(
+                status=AdmissionStatus.RETRY_LATER,
+                retryAfterMs=round(err.retry_after * 1000),
+            ).SerializeToString()
+        )
+        raise
+    except SMCBadSetup:
+        await websocket.send(
+            setupResponse(status=AdmissionStatus.REJECTED).SerializeToString()
+        )
+        raise
+
+    await websocket.send(setup_response.SerializeToString())
     # At this point, the recipient does not own a correctly signed lsig because it's missing sender's signature.
 
     return setup_proposal
 
 
-async def receive_payment(websocket, accepted_setup: setupProposal) -> Payment:
+async def resume_channel(
+    websocket,
+    adopt: Optional[Callable[[str], Awaitable[Optional[RecipientChannel]]]] = None,
+) -> RecipientChannel:
+    """
+    Handles the resumption of an open channel on a new connection.
+    The new connection takes over the channel from any connection that was still serving it.
+
+    :param websocket: New connection of the sender
+    :param adopt: Opens a channel that this process doesn't know given its msig address, if possible (e.g.
+     ClusterNode.adopt). None if not given
+    :return: State of the resumed channel
+    """
+    from algosdk.util import verify_bytes
+
+    resume_request = resumeRequest.FromString(await websocket.recv())
+
+    logging.info("resume_request.msigAddress = %s", resume_request.msigAddress)
+
+    channel = OPEN_CHANNELS.get(resume_request.msigAddress)
+    if channel is None and adopt is not None:
+        channel = await adopt(resume_request.msigAddress)
+    if channel is None:
+        raise SMCBadResume("This channel is not open.")
+    if not resume_request.resumeCounter > channel.resume_counter:
+        raise SMCBadResume("Resume request is a replay.")
+    if not verify_bytes(
+        resume_message(channel.msig_address, resume_request.resumeCounter),
+        base64.b64encode(resume_request.senderSignature).decode(),
+        channel.accepted_setup.sender,
+    ):
+        raise SMCBadResume("Sender signature of the resume request is not valid.")
+
+    last_amount = channel.last_payment.cumulativeAmount if channel.last_payment else 0
+    if resume_request.acknowledgedAmount > last_amount:
+        logging.warning("Sender claims acknowledgements that were never sent.")
+
+    channel.resume_counter = resume_request.resumeCounter
+    previous_websocket, channel.websocket = channel.websocket, websocket
+    if previous_websocket is not None:
+        # The sender cannot be on the other connection anymore.
+        await previous_websocket.close()
+
+    await websocket.send(
+        resumeResponse(cumulativeAmount=last_amount).SerializeToString()
+    )
+    logging.info("Channel resumed.")
+
+    return channel
+
+
+def verify_payment(
+    accepted_setup: setupProposal,
+    payment_proposal: Payment,
+    received_ns: int,
+    node_pool: Optional[NodePool] = None,
+) -> None:
+    """
+    Checks that a payment is signed by the sender and covered by the balance of the msig.
+    It is blocking because of the node calls.
+
+    :param accepted_setup: Sender's side of arguments for this channel
+    :param payment_proposal: Payment received from the sender
+    :param received_ns: Receive time of the payment in nanoseconds since the epoch
+    :param node_pool: Nodes to use. The default pool if not given
+    """
+    from algosdk.error import IndexerHTTPError
+
+    node_indexer = (node_pool or default_node_pool()).indexer
+
+    # Spans join the trace of the sender if it sent one.
+    sender_trace = (
+        payment_proposal.trace if payment_proposal.HasField("trace") else None
+    )
+    with span(
+        "receive_payment",
+        trace_id=sender_trace.traceId if sender_trace else None,
+        cumulative_amount=payment_proposal.cumulativeAmount,
+    ) as payment_span:
+        if sender_trace:
+            # Clocks of sender and recipient are not synchronized. This is only as good as NTP.
+            record_span(
+                "websocket_transit",
+                sender_trace.sendTimestampNs,
+                received_ns,
+                payment_span,
+            )
+
+        with span("derive_msig", payment_span):
+            derived_msig = smc_msig(
+                accepted_setup.sender,
+                _recipient_addr(),
+                accepted_setup.nonce,
+                accepted_setup.minRefundBlock,
+                accepted_setup.maxRefundBlock,
+                node_pool,
+            )
+        with span("compile_lsig", payment_span):
+            payment_lsig = smc_lsig_settlement(
+                accepted_setup.sender,
+                _recipient_addr(),
+                payment_proposal.cumulativeAmount,
+                accepted_setup.minRefundBlock,
+                node_pool,
+                channel_artifacts_version(accepted_setup),
+            )
+        with span("verify_signature", payment_span):
+            # FIXME: This should only verify that the sender's signature is valid. Not both together.
+            #  Recipient can always correctly sign any lsig.
+            payment_lsig.sign_multisig(derived_msig, _recipient_private_key())
+            payment_lsig.lsig.msig.subsigs[0].signature = payment_proposal.lsigSignature
+            if not payment_lsig.verify():
+                raise SMCBadSignature(
+                    "Sender multisig subsig of the payment lsig is not valid."
+                )
+
+        with span("lookup_balance", payment_span):
+            try:
+                msig_balance = node_indexer.account_info(derived_msig.address())[
+                    "account"
+                ]["amount-without-pending-rewards"]
+            except IndexerHTTPError as err:
+                raise SMCBadFunding(
+                    "Could not find msig account. Must be below minimum balance."
+                ) from err
+        channel = OPEN_CHANNELS.get(derived_msig.address())
+        if channel is not None:
+            channel.msig_balance = msig_balance
+        # We are ignoring fees for the moment.
+        if msig_balance < payment_proposal.cumulativeAmount:
+            raise SMCBadFunding("Balance of msig cannot cover this payment.")
+
+
+async def receive_payment(
+    websocket,
+    accepted_setup: setupProposal,
+    node_pool: Optional[NodePool] = None,
+    admission: Optional[AdmissionControl] = None,
+) -> Payment:
     """
     Handles the protocol for receiving a payment.
+    If the recipient is overloaded, the sender is told to send the payment again later.
 
     :param websocket:
     :param accepted_setup: Sender's side of arguments for this channel
+    :param node_pool: Nodes to use. The default pool if not given
+    :param admission: Limits of the recipient. None if not given
     :return: lsig that allows recipient to settle a payment signed from both parties.
     """
-    node_indexer = get_sandbox_indexer()
-
     payment_proposal = Payment.FromString(await websocket.recv())
+    received_ns = time.time_ns()
 
-    logging.info("payment_proposal = %s", payment_proposal)
-
-    derived_msig = smc_msig(
-        accepted_setup.sender,
-        RECIPIENT_ADDR,
-        accepted_setup.nonce,
-        accepted_setup.minRefundBlock,
-        accepted_setup.maxRefundBlock,
-    )
-    payment_lsig = smc_lsig_settlement(
-        accepted_setup.sender,
-        RECIPIENT_ADDR,
-        payment_proposal.cumulativeAmount,
-        accepted_setup.minRefundBlock,
-    )
-    # FIXME: This should only verify that the sender's signature is valid. Not both together.
-    #  Recipient can always correctly sign any lsig.
-    payment_lsig.sign_multisig(derived_msig, RECIPIENT_PRIVATE_KEY)
-    payment_lsig.lsig.msig.subsigs[0].signature = payment_proposal.lsigSignature
-    if not payment_lsig.verify():
-        raise SMCBadSignature(
-            "Sender multisig subsig of the payment lsig is not valid."
-        )
+    logging.info("Payment of %s received.", payment_proposal.cumulativeAmount)
 
     try:
-        msig_balance = node_indexer.account_info(derived_msig.address())["account"][
-            "amount-without-pending-rewards"
-        ]
-    except IndexerHTTPError as err:
-        raise SMCBadFunding(
-            "Could not find msig account. Must be below minimum balance."
-        ) from err
-    # We are ignoring fees for the moment.
-    if msig_balance < payment_proposal.cumulativeAmount:
-        raise SMCBadFunding("Balance of msig cannot cover this payment.")
+        async with (admission.payment() if admission else nullcontext()):
+            # Node calls run in a thread so that other channels are served meanwhile.
+            await get_running_loop().run_in_executor(
+                None,
+                verify_payment,
+                accepted_setup,
+                payment_proposal,
+                received_ns,
+                node_pool,
+            )
+    except SMCRetryLater as err:
+        await reject_payment(websocket, payment_proposal, err.retry_after)
+        raise
 
     return payment_proposal
 
 
-async def settle(accepted_setup: setupProposal, last_payment: Payment) -> None:
+async def acknowledge_payment(websocket, payment: Payment) -> None:
+    """
+    Lets the sender know that a payment was accepted.
+
+    :param websocket:
+    :param payment: Accepted payment
+    """
+    await websocket.send(
+        paymentResponse(cumulativeAmount=payment.cumulativeAmount).SerializeToString()
+    )
+
+
+async def reject_payment(websocket, payment: Payment, retry_after: float) -> None:
     """
-    Compiles and submits payment transaction to the Layer-1
+    Lets the sender know that a payment was not processed and can be sent again later.
+
+    :param websocket:
+    :param payment: Payment that was not processed
+    :param retry_after: Seconds that the sender should wait
+    """
+    await websocket.send(
+        paymentResponse(
+            cumulativeAmount=payment.cumulativeAmount,
+            status=AdmissionStatus.RETRY_LATER,
+            retryAfterMs=round(retry_after * 1000),
+        ).SerializeToString()
+    )
+
+
+# pylint: disable-next=too-many-instance-attributes
+class PaymentStream:
+    """
+    Async iterator over the payments accepted on a channel.
+    Payments are verified as soon as they arrive and wait in a bounded queue until they are consumed.
+    A payment is acknowledged only when it is consumed. Therefore, a slow consumer fills the queue and,
+     in turn, the window of the sender (see sender.stream) instead of letting payments pile up.
+    Payments that arrive while the queue is full are not verified and the sender is told to send them again later.
+    With a risk budget, payments that exceed the last verified one by at most the budget are accepted right away
+     and verified in the background. Verification is coalesced: a valid payment covers all the previous ones.
+     If it fails, the stream rolls back to the last verified payment and ends with the error.
+    Iteration ends when the sender closes the websocket or when the stream is closed.
+    A payment that does not follow the protocol is raised as an error from the iteration.
+    """
+
+    # Marks the end of the stream in the queue.
+    _END = object()
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        websocket,
+        accepted_setup: setupProposal,
+        maxsize: int = PAYMENT_QUEUE_SIZE,
+        node_pool: Optional[NodePool] = None,
+        admission: Optional[AdmissionControl] = None,
+        risk_budget: int = 0,
+    ):
+        """
+        :param websocket:
+        :param accepted_setup: Sender's side of arguments for this channel
+        :param maxsize: Verified payments that can wait for the consumer
+        :param node_pool: Nodes to use. The default pool if not given
+        :param admission: Limits of the recipient. None if not given
+        :param risk_budget: microalgos that accepted payments can exceed the last verified payment by. Every payment
+         is verified before being accepted if zero
+        """
+        self.websocket = websocket
+        self.accepted_setup = accepted_setup
+        self.node_pool = node_pool
+        self.admission = admission
+        self.risk_budget = risk_budget
+        # Last payment whose signature and funding were checked.
+        self.verified_payment: Optional[Payment] = None
+        # Last payment that was consumed and acknowledged.
+        self._consumed: Optional[Payment] = None
+        self._queue: Queue = Queue(maxsize)
+        self._reader: Optional[Task] = None
+        self._closed = False
+        # Latest accepted payment that waits for verification, with its receive time.
+        self._pending: Optional[tuple[Payment, int]] = None
+        self._verifier: Optional[Task] = None
+        self._failure: Optional[SMCBase] = None
+
+    @property
+    def last_payment(self) -> Optional[Payment]:
+        """Last consumed payment that is verified, i.e. the one to settle"""
+        if self._consumed is None or self.verified_payment is None:
+            return None
+        if self._consumed.cumulativeAmount <= self.verified_payment.cumulativeAmount:
+            return self._consumed
+        return self.verified_payment
+
+    def __aiter__(self) -> "PaymentStream":
+        if self._reader is None:
+            self._reader = create_task(self._read_payments())
+        return self
+
+    async def __anext__(self) -> Payment:
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
+        if self._closed:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if self._failure is not None:
+            # A payment failed verification in the meantime. Nothing else is acknowledged.
+            return await self.__anext__()
+        if item is self._END:
+            self._closed = True
+            raise StopAsyncIteration
+        if isinstance(item, SMCBase):
+            self._closed = True
+            raise item
+
+        await acknowledge_payment(self.websocket, item)
+        self._consumed = item
+        return item
+
+    async def wait_verified(self) -> None:
+        """Waits until the accepted payments are verified, e.g. before settling last_payment"""
+        if self._verifier is not None:
+            await self._verifier
+
+    async def _verify(self, payment: Payment, received_ns: int) -> None:
+        """Verifies a payment within the limits of the recipient"""
+        async with (self.admission.payment() if self.admission else nullcontext()):
+            # Node calls run in a thread so that other channels are served meanwhile.
+            await get_running_loop().run_in_executor(
+                None,
+                verify_payment,
+                self.accepted_setup,
+                payment,
+                received_ns,
+                self.node_pool,
+            )
+
+    async def _verify_pending(self) -> None:
+        """Verifies the latest accepted payment until none is left"""
+        while self._pending is not None:
+            payment, received_ns = self._pending
+            self._pending = None
+            try:
+                await self._verify(payment, received_ns)
+            except SMCRetryLater as err:
+                if self._pending is None:
+                    self._pending = (payment, received_ns)
+                await sleep(err.retry_after)
+                continue
+            except SMCBase as err:
+                logging.error("Optimistic payment failed verification. %s", err)
+                self._fail(err)
+                return
+            if (
+                self.verified_payment is None
+                or payment.cumulativeAmount > self.verified_payment.cumulativeAmount
+            ):
+                self.verified_payment = payment
+
+    def _fail(self, err: SMCBase) -> None:
+        """Ends the stream with an error. last_payment rolls back to the last verified payment."""
+        self._failure = err
+        self._pending = None
+        if self._reader is not None:
+            self._reader.cancel()
+        # Wakes up a consumer waiting on an empty queue.
+        if not self._queue.full():
+            self._queue.put_nowait(self._END)
+
+    def _exposure(self, payment: Payment) -> int:
+        """microalgos of a payment that are not covered by a verified payment"""
+        verified_amount = (
+            self.verified_payment.cumulativeAmount if self.verified_payment else 0
+        )
+        return payment.cumulativeAmount - verified_amount
+
+    async def _receive_optimistically(
+        self, last_received: Optional[Payment]
+    ) -> Payment:
+        """Receives a payment and accepts it before verification if it fits the risk budget"""
+        payment = Payment.FromString(await self.websocket.recv())
+        received_ns = time.time_ns()
+        logging.info("Payment of %s received.", payment.cumulativeAmount)
+        if (
+            last_received
+            and not payment.cumulativeAmount > last_received.cumulativeAmount
+        ):
+            # Checked before any verification because the budget is measured on increasing payments.
+            raise SMCBadPayment("Expected increasing payments.")
+
+        if self._exposure(payment) > self.risk_budget:
+            # Verifications in flight could cover most of it.
+            await self.wait_verified()
+            if self._failure is not None:
+                raise SMCBadPayment("Channel failed verification.")
+        if self._exposure(payment) > self.risk_budget:
+            try:
+                await self._verify(payment, received_ns)
+            except SMCRetryLater as err:
+                await reject_payment(self.websocket, payment, err.retry_after)
+                raise
+            self.verified_payment = payment
+            return payment
+
+        self._pending = (payment, received_ns)
+        if self._verifier is None or self._verifier.done():
+            self._verifier = create_task(self._verify_pending())
+        return payment
+
+    async def _read_payments(self) -> None:
+        from websockets.exceptions import ConnectionClosed
+
+        last_received: Optional[Payment] = None
+        try:
+            while True:
+                method = SMCMethod.FromString(await self.websocket.recv())
+                if not method.method == SMCMethod.PAY:
+                    raise SMCBadPayment("Expected payment method.")
+
+                if self._queue.full():
+                    # Verifying a payment that cannot be queued would be wasted work.
+                    payment = Payment.FromString(await self.websocket.recv())
+                    await reject_payment(self.websocket, payment, RETRY_AFTER)
+                    continue
+                try:
+                    if self.risk_budget > 0:
+                        payment = await self._receive_optimistically(last_received)
+                    else:
+                        payment = await receive_payment(
+                            self.websocket,
+                            self.accepted_setup,
+                            self.node_pool,
+                            self.admission,
+                        )
+                        self.verified_payment = payment
+                except SMCRetryLater:
+                    continue
+                if (
+                    last_received
+                    and not payment.cumulativeAmount > last_received.cumulativeAmount
+                ):
+                    # Sender misbehaved.
+                    raise SMCBadPayment("Expected increasing payments.")
+                last_received = payment
+                await self._queue.put(payment)
+        except ConnectionClosed:
+            logging.error("Sender has closed the websocket.")
+            await self._queue.put(self._END)
+        except SMCBase as err:
+            await self._queue.put(err)
+
+    def close(self) -> None:
+        """Stops the stream. Verified payments that were not consumed yet are dropped."""
+        self._closed = True
+        if self._reader is not None:
+            self._reader.cancel()
+        # Wakes up a consumer waiting on an empty queue.
+        if not self._queue.full():
+            self._queue.put_nowait(self._END)
+
+
+def build_settlement(
+    accepted_setup: setupProposal,
+    payment: Payment,
+    node_pool: Optional[NodePool] = None,
+    until_deadline: bool = False,
+) -> "LogicSigTransaction":
+    """
+    Builds the fully signed settlement transaction of a payment.
+    It is blocking because of the node calls.
 
     :param accepted_setup: Sender's side of arguments for this channel
-    :param last_payment: Last accepted Payment
+    :param payment: Accepted payment to be settled
+    :param node_pool: Nodes to use. The default pool if not given
+    :param until_deadline: Whether the transaction should be valid until the deadline rather than from now (see
+     smc_txn_settlement)
+    :return: Settlement transaction ready to be sent
     """
-    node_algod = get_sandbox_algod()
+    from algosdk.transaction import LogicSigTransaction
 
     derived_msig = smc_msig(
         accepted_setup.sender,
-        RECIPIENT_ADDR,
+        _recipient_addr(),
         accepted_setup.nonce,
         accepted_setup.minRefundBlock,
         accepted_setup.maxRefundBlock,
+        node_pool,
     )
+    version = channel_artifacts_version(accepted_setup)
     derived_pay_lsig = smc_lsig_settlement(
         accepted_setup.sender,
-        RECIPIENT_ADDR,
-        last_payment.cumulativeAmount,
+        _recipient_addr(),
+        payment.cumulativeAmount,
         accepted_setup.minRefundBlock,
+        node_pool,
+        version,
     )
-    derived_pay_lsig.sign_multisig(derived_msig, RECIPIENT_PRIVATE_KEY)
-    derived_pay_lsig.lsig.msig.subsigs[0].signature = last_payment.lsigSignature
+    derived_pay_lsig.sign_multisig(derived_msig, _recipient_private_key())
+    derived_pay_lsig.lsig.msig.subsigs[0].signature = payment.lsigSignature
     pay_txn = smc_txn_settlement(
         derived_msig.address(),
         accepted_setup.sender,
-        RECIPIENT_ADDR,
-        last_payment.cumulativeAmount,
+        _recipient_addr(),
+        payment.cumulativeAmount,
         accepted_setup.minRefundBlock,
+        node_pool,
+        until_deadline,
     )
 
     assert pay_txn.fee <= 1_000_000
+    # A transaction that the lsig would reject is not worth a round trip to the node.
+    check_settlement(
+        pay_txn,
+        accepted_setup.sender,
+        _recipient_addr(),
+        payment.cumulativeAmount,
+        accepted_setup.minRefundBlock,
+        version,
+    )
+
+    return LogicSigTransaction(pay_txn, derived_pay_lsig)
 
-    pay_txn_signed = LogicSigTransaction(pay_txn, derived_pay_lsig)
 
-    txid = node_algod.send_transaction(pay_txn_signed)
+def _send_settlement(
+    accepted_setup: setupProposal,
+    last_payment: Payment,
+    node_pool: Optional[NodePool],
+    settlement: Optional["LogicSigTransaction"],
+) -> str:
+    """
+    Sends a settlement alone and waits for its confirmation. A prepared settlement that the node refuses is built again.
+    It is blocking because of the node calls.
+
+    :param accepted_setup: Sender's side of arguments for this channel
+    :param last_payment: Last accepted Payment
+    :param node_pool: Nodes to use. The default pool if not given
+    :param settlement: Settlement of last_payment prepared ahead of time, if any
+    :return: Transaction id of the confirmed settlement
+    """
+    from algosdk.error import AlgodHTTPError
+    from algosdk.transaction import wait_for_confirmation
+
+    node_algod = (node_pool or default_node_pool()).algod
+
+    txid = None
+    if settlement is not None:
+        try:
+            txid = node_algod.send_transaction(settlement)
+        except AlgodHTTPError as err:
+            logging.warning("Prepared settlement was refused: %s", err)
+    if txid is None:
+        txid = node_algod.send_transaction(
+            build_settlement(accepted_setup, last_payment, node_pool)
+        )
     wait_for_confirmation(node_algod, txid)
 
+    return txid
+
+
+async def settle(
+    accepted_setup: setupProposal,
+    last_payment: Payment,
+    node_pool: Optional[NodePool] = None,
+    settlement: Optional["LogicSigTransaction"] = None,
+    fee_pooled: bool = False,
+) -> None:
+    """
+    Compiles and submits payment transaction to the Layer-1.
+    If the settlement was prepared ahead of time, this is a single send. It is only built here if there is no
+     prepared settlement or the node refuses it (e.g. it's not valid yet).
+    A fee_pooled settlement is sent in atomic groups where the recipient pays the fee, raised until the refund
+     condition comes online (see fee_pooling). The recipient never pays more than the settlement is worth.
+    Channels whose programs don't accept a zero fee are settled alone anyway.
+
+    :param accepted_setup: Sender's side of arguments for this channel
+    :param last_payment: Last accepted Payment
+    :param node_pool: Nodes to use. The default pool if not given
+    :param settlement: Settlement of last_payment prepared ahead of time (see RecipientChannel.prepare_settlement)
+    :param fee_pooled: Whether the recipient should pay the fee in a group rather than the msig
+    """
+    loop = get_running_loop()
+
+    if fee_pooled and channel_artifacts_version(accepted_setup) < FEE_POOLING_VERSION:
+        logging.info("The programs of the channel don't allow fee pooling.")
+        fee_pooled = False
+    if fee_pooled:
+        # Clients are blocking.
+        if settlement is None:
+            # The settlement must stay valid while the fee is raised.
+            settlement = await loop.run_in_executor(
+                None, build_settlement, accepted_setup, last_payment, node_pool, True
+            )
+        txid = await loop.run_in_executor(
+            None,
+            send_fee_pooled,
+            settlement,
+            _recipient_addr(),
+            _recipient_private_key(),
+            accepted_setup.minRefundBlock - 1,
+            min(MAX_POOLED_FEE, last_payment.cumulativeAmount),
+            node_pool,
+        )
+        logging.info("Settlement executed\nTxID = %s", txid)
+        return
+
+    # Clients are blocking.
+    txid = await loop.run_in_executor(
+        None, _send_settlement, accepted_setup, last_payment, node_pool, settlement
+    )
+
     logging.info("Settlement executed\nTxID = %s", txid)
@@ -1,36 +1,99 @@
 """
 File that implements all things related to the sender side of an SMC.
 """
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+import base64
 import logging
-from asyncio import sleep
-
-from algosdk.account import address_from_private_key
-from algosdk.encoding import is_valid_address
-from algosdk.error import IndexerHTTPError, AlgodHTTPError
-from algosdk.mnemonic import to_private_key
-from algosdk.transaction import LogicSigTransaction, PaymentTxn, wait_for_confirmation
-
-from algorandsmc.errors import SMCBadSetup, SMCCannotBeRefunded
+import time
+from asyncio import Semaphore
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import create_task, get_running_loop, sleep, wait_for
+from functools import cache
+from typing import TYPE_CHECKING, Optional
+
+from algorandsmc.errors import (
+    SMCBadPayment,
+    SMCBadSetup,
+    SMCCannotBeRefunded,
+    SMCRetryLater,
+)
+from algorandsmc.fee_pooling import FEE_POOLING_VERSION, MAX_POOLED_FEE, send_fee_pooled
+from algorandsmc.known_channels import KnownChannels
+from algorandsmc.nodes import NodePool, default_node_pool
 
 # pylint: disable-next=no-name-in-module
-from algorandsmc.smc_pb2 import Payment, SMCMethod, setupProposal, setupResponse
+from algorandsmc.smc_pb2 import (
+    AdmissionStatus,
+    Payment,
+    SMCMethod,
+    paymentResponse,
+    resumeRequest,
+    resumeResponse,
+    setupProposal,
+    setupResponse,
+)
 from algorandsmc.templates import (
+    SettlementTemplate,
+    check_refund,
     smc_lsig_refund,
     smc_lsig_settlement,
     smc_msig,
     smc_txn_refund,
 )
-from algorandsmc.utils import get_sandbox_algod, get_sandbox_indexer
+from algorandsmc.templates.artifacts import ARTIFACTS_VERSION, channel_artifacts_version
+from algorandsmc.tracing import Span, span
+from algorandsmc.utils import resume_message
+
+if TYPE_CHECKING:
+    from algosdk.transaction import LogicSigAccount, LogicSigTransaction, Multisig
 
 logging.root.setLevel(logging.INFO)
 
+# Maximum number of streamed payments that can wait for an acknowledgement.
+STREAM_WINDOW = 64
+# Seconds that a stream waits for the acknowledgements of the payments in flight once it stops.
+STREAM_DRAIN_TIMEOUT = 10.0
+# Every payment is announced by the same message.
+PAY_METHOD = SMCMethod(method=SMCMethod.MethodEnum.PAY).SerializeToString()
+
 SENDER_PRIVATE_KEY_MNEMONIC = (
     "people disagree couch mind bean tortoise project gorilla suffer "
     "become table issue used cage satisfy umbrella live wealth square "
     "offer spy derive labor ability margin"
 )
-SENDER_PRIVATE_KEY = to_private_key(SENDER_PRIVATE_KEY_MNEMONIC)
-SENDER_ADDR = address_from_private_key(SENDER_PRIVATE_KEY)
+
+
+@cache
+def _sender_private_key() -> str:
+    """Derives the private key of the sender the first time it is needed"""
+    from algosdk.mnemonic import to_private_key
+
+    return to_private_key(SENDER_PRIVATE_KEY_MNEMONIC)
+
+
+@cache
+def _sender_addr() -> str:
+    """Derives the address of the sender the first time it is needed"""
+    from algosdk.account import address_from_private_key
+
+    return address_from_private_key(_sender_private_key())
+
+
+def __getattr__(name: str):
+    """Keeps SENDER_PRIVATE_KEY and SENDER_ADDR available as module attributes without deriving them at import time"""
+    if name == "SENDER_PRIVATE_KEY":
+        return _sender_private_key()
+    if name == "SENDER_ADDR":
+        return _sender_addr()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if TYPE_CHECKING:
+    # Resolved by __getattr__, declared for linters and type checkers.
+    SENDER_PRIVATE_KEY: str
+    SENDER_ADDR: str
+
 
 # Sender signs payment lsigs with closeout to itself. This way, it's impossible to replay a settlement multiple
 #  times because the shared msig will not hold any funds.
@@ -40,27 +103,49 @@ SENDER_ADDR = address_from_private_key(SENDER_PRIVATE_KEY)
 # As a proxy for remembering past signed payment lsigs, we will use all known channels.
 # It could indeed be the case that for a specific channel, no payment was signed, and therefore it is safe to re-open.
 # In this implementation, we will be conservative and just never re-open a known channel.
-KNOWN_CHANNELS = set()
+# Channels whose refund window closed are forgotten because the recipient would reject them for their lifetime.
+# Long-running senders should call KNOWN_CHANNELS.evict as the chain advances (refund_channel does).
+KNOWN_CHANNELS = KnownChannels()
 
 # Margin note: It is easy to decide if we know a channel because exactly all the arguments that uniquely determine
 #  an SMC, are also embedded in the address of the shared msig (more details in the docstring of smc_msig).
 #  It is therefore sufficient to remember all addresses of the msigs to check if we know a channel.
 
 
-async def setup_channel(websocket, setup_proposal: setupProposal) -> setupResponse:
+async def setup_channel(
+    websocket, setup_proposal: setupProposal, node_pool: Optional[NodePool] = None
+) -> tuple[setupProposal, setupResponse]:
     """
     Handles the setup of the channel on the sender side.
 
     :param websocket:
-    :param setup_proposal: Channel arguments to be sent as a proposal
-    :return: Recipient's side of arguments for this channel
+    :param setup_proposal: Channel arguments to be sent as a proposal. It is not modified
+    :param node_pool: Nodes to use. The default pool if not given
+    :return: Proposal as sent, which is the sender's side of arguments for this channel, and recipient's side of
+     arguments for this channel. Without an artifactsVersion, the sent proposal has the current one
     """
+    from algosdk.encoding import is_valid_address
+
+    # The version is part of the proposal, so that both parties use the same programs for the whole channel.
+    proposal = setupProposal()
+    proposal.CopyFrom(setup_proposal)
+    if not proposal.artifactsVersion:
+        proposal.artifactsVersion = ARTIFACTS_VERSION
+    setup_proposal = proposal
+    version = channel_artifacts_version(setup_proposal)
+
     await websocket.send(
         SMCMethod(method=SMCMethod.MethodEnum.SETUP_CHANNEL).SerializeToString()
     )
     await websocket.send(setup_proposal.SerializeToString())
 
     setup_response = setupResponse.FromString(await websocket.recv())
+    if setup_response.status == AdmissionStatus.RETRY_LATER:
+        raise SMCRetryLater(
+            setup_response.retryAfterMs / 1000, "Recipient is busy. Retry later."
+        )
+    if setup_response.status == AdmissionStatus.REJECTED:
+        raise SMCBadSetup("Recipient rejected the channel.")
     # Protobuf doesn't know what constitutes a valid Algorand address.
     if not is_valid_address(setup_response.recipient):
         raise SMCBadSetup("Recipient address is not a valid Algorand address.")
@@ -69,25 +154,28 @@ async def setup_channel(websocket, setup_proposal: setupProposal) -> setupRespon
 
     # Compiling msig template on the sender side.
     proposed_msig = smc_msig(
-        SENDER_ADDR,
+        _sender_addr(),
         setup_response.recipient,
         setup_proposal.nonce,
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
     )
-    if proposed_msig.address() in KNOWN_CHANNELS:
+    if not KNOWN_CHANNELS.claim(proposed_msig.address(), setup_proposal.maxRefundBlock):
         raise SMCBadSetup("This channel is known.")
-
-    KNOWN_CHANNELS.add(proposed_msig.address())
     logging.info("accepted_msig.address() = %s", proposed_msig.address())
 
     # Compiling lsig template on the sender side.
     accepted_refund_lsig = smc_lsig_refund(
-        SENDER_ADDR, setup_proposal.minRefundBlock, setup_proposal.maxRefundBlock
+        _sender_addr(),
+        setup_proposal.minRefundBlock,
+        setup_proposal.maxRefundBlock,
+        node_pool,
+        version,
     )
 
     # Merging signatures for the lsig
-    accepted_refund_lsig.sign_multisig(proposed_msig, SENDER_PRIVATE_KEY)
+    accepted_refund_lsig.sign_multisig(proposed_msig, _sender_private_key())
     accepted_refund_lsig.lsig.msig.subsigs[1].signature = setup_response.lsigSignature
     if not accepted_refund_lsig.verify():
         # Least incomprehensible sentence in this code.
@@ -95,11 +183,70 @@ async def setup_channel(websocket, setup_proposal: setupProposal) -> setupRespon
 
     logging.info("Channel accepted.")
 
-    return setup_response
+    return setup_proposal, setup_response
+
+
+async def resume_channel(
+    websocket,
+    setup_proposal: setupProposal,
+    setup_response: setupResponse,
+    acknowledged_amount: int,
+    node_pool: Optional[NodePool] = None,
+) -> int:
+    """
+    Handles the resumption of an established channel on a new connection without a new setup.
+    The sender proves its identity by signing the msig address together with a counter that always increases.
+
+    :param websocket: New connection to the recipient
+    :param setup_proposal: Sender's side of arguments for this channel
+    :param setup_response: Recipient's side of arguments for this channel
+    :param acknowledged_amount: Highest cumulative amount acknowledged by the recipient before the connection dropped
+    :param node_pool: Nodes to use. The default pool if not given
+    :return: Cumulative amount that the next payment must exceed
+    """
+    from algosdk.util import sign_bytes
+
+    derived_msig = smc_msig(
+        _sender_addr(),
+        setup_response.recipient,
+        setup_proposal.nonce,
+        setup_proposal.minRefundBlock,
+        setup_proposal.maxRefundBlock,
+        node_pool,
+    )
+    # Wall clock in nanoseconds keeps increasing across reconnections and restarts of the sender.
+    resume_counter = time.time_ns()
+    signature = sign_bytes(
+        resume_message(derived_msig.address(), resume_counter), _sender_private_key()
+    )
+
+    await websocket.send(
+        SMCMethod(method=SMCMethod.MethodEnum.RESUME_CHANNEL).SerializeToString()
+    )
+    await websocket.send(
+        resumeRequest(
+            msigAddress=derived_msig.address(),
+            acknowledgedAmount=acknowledged_amount,
+            resumeCounter=resume_counter,
+            senderSignature=base64.b64decode(signature),
+        ).SerializeToString()
+    )
+
+    resume_response = resumeResponse.FromString(await websocket.recv())
+    if resume_response.cumulativeAmount < acknowledged_amount:
+        # This can only hurt the recipient. The sender has nothing to fear.
+        logging.warning("Recipient forgot payments that it acknowledged.")
+
+    logging.info("Channel resumed at %s.", resume_response.cumulativeAmount)
+
+    return max(resume_response.cumulativeAmount, acknowledged_amount)
 
 
 async def fund(
-    setup_proposal: setupProposal, setup_response: setupResponse, amount: int
+    setup_proposal: setupProposal,
+    setup_response: setupResponse,
+    amount: int,
+    node_pool: Optional[NodePool] = None,
 ) -> None:
     """
     Funds the msig associated with the established channel by amount.
@@ -108,22 +255,28 @@ async def fund(
     :param setup_proposal: Sender's side of arguments for this channel
     :param setup_response: Recipient's side of arguments for this channel
     :param amount: microalgos to send
+    :param node_pool: Nodes to use. The default pool if not given
     """
-    node_algod = get_sandbox_algod()
-    node_indexer = get_sandbox_indexer()
+    from algosdk.error import IndexerHTTPError
+    from algosdk.transaction import PaymentTxn, wait_for_confirmation
+
+    node_pool = node_pool or default_node_pool()
+    node_algod = node_pool.algod
+    node_indexer = node_pool.indexer
 
     derived_msig = smc_msig(
-        SENDER_ADDR,
+        _sender_addr(),
         setup_response.recipient,
         setup_proposal.nonce,
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
     )
 
     sugg_params = node_algod.suggested_params()
     txid = node_algod.send_transaction(
-        PaymentTxn(SENDER_ADDR, sugg_params, derived_msig.address(), amount).sign(
-            SENDER_PRIVATE_KEY
+        PaymentTxn(_sender_addr(), sugg_params, derived_msig.address(), amount).sign(
+            _sender_private_key()
         )
     )
     wait_for_confirmation(node_algod, txid)
@@ -149,11 +302,94 @@ async def fund(
     logging.info("Funding TxID = %s", txid)
 
 
+# pylint: disable-next=too-many-arguments
+async def send_payment(
+    websocket,
+    setup_proposal: setupProposal,
+    setup_response: setupResponse,
+    cumulative_amount: int,
+    parent_span: Optional[Span] = None,
+    node_pool: Optional[NodePool] = None,
+) -> None:
+    """
+    Signs and sends a payment without waiting for the recipient to acknowledge it.
+
+    :param websocket:
+    :param setup_proposal: Sender's side of arguments for this channel
+    :param setup_response: Recipient's side of arguments for this channel
+    :param cumulative_amount: Sum of all payments from sender to recipient
+    :param parent_span: Span of the caller if tracing is enabled
+    :param node_pool: Nodes to use. The default pool if not given
+    """
+    with span(
+        "send_payment", parent_span, cumulative_amount=cumulative_amount
+    ) as payment_span:
+        with span("derive_msig", payment_span):
+            derived_msig = smc_msig(
+                _sender_addr(),
+                setup_response.recipient,
+                setup_proposal.nonce,
+                setup_proposal.minRefundBlock,
+                setup_proposal.maxRefundBlock,
+                node_pool,
+            )
+        with span("compile_lsig", payment_span):
+            payment_lsig_proposal = smc_lsig_settlement(
+                _sender_addr(),
+                setup_response.recipient,
+                cumulative_amount,
+                setup_proposal.minRefundBlock,
+                node_pool,
+                channel_artifacts_version(setup_proposal),
+            )
+        await _sign_and_send(
+            websocket,
+            derived_msig,
+            payment_lsig_proposal,
+            cumulative_amount,
+            payment_span,
+        )
+
+
+async def _sign_and_send(
+    websocket,
+    derived_msig: "Multisig",
+    payment_lsig: "LogicSigAccount",
+    cumulative_amount: int,
+    payment_span: Optional[Span],
+) -> None:
+    """Signs the settlement lsig of a payment and sends the payment"""
+    with span("sign_lsig", payment_span):
+        payment_lsig.sign_multisig(derived_msig, _sender_private_key())
+
+    payment = Payment(
+        cumulativeAmount=cumulative_amount,
+        lsigSignature=payment_lsig.lsig.msig.subsigs[0].signature,
+    )
+    with span("websocket_send", payment_span):
+        if payment_span is not None:
+            payment.trace.traceId = payment_span.trace_id
+            payment.trace.sendTimestampNs = time.time_ns()
+        await websocket.send(PAY_METHOD)
+        await websocket.send(payment.SerializeToString())
+
+
+async def receive_payment_response(websocket) -> paymentResponse:
+    """
+    Waits for the recipient to acknowledge a payment.
+
+    :param websocket:
+    :return: Recipient's acknowledgement of the payment
+    """
+    return paymentResponse.FromString(await websocket.recv())
+
+
 async def pay(
     websocket,
     setup_proposal: setupProposal,
     setup_response: setupResponse,
     cumulative_amount: int,
+    node_pool: Optional[NodePool] = None,
 ) -> None:
     """
     Handles the protocol for sending a payment.
@@ -162,52 +398,314 @@ async def pay(
     :param setup_proposal: Sender's side of arguments for this channel
     :param setup_response: Recipient's side of arguments for this channel
     :param cumulative_amount: Sum of all payments from sender to recipient
+    :param node_pool: Nodes to use. The default pool if not given
     """
-    await websocket.send(SMCMethod(method=SMCMethod.MethodEnum.PAY).SerializeToString())
+    with span("pay", cumulative_amount=cumulative_amount) as pay_span:
+        await send_payment(
+            websocket,
+            setup_proposal,
+            setup_response,
+            cumulative_amount,
+            pay_span,
+            node_pool,
+        )
 
-    derived_msig = smc_msig(
-        SENDER_ADDR,
-        setup_response.recipient,
-        setup_proposal.nonce,
+        with span("wait_payment_response", pay_span):
+            payment_response = await receive_payment_response(websocket)
+        if payment_response.status == AdmissionStatus.RETRY_LATER:
+            # Payments are cumulative, so the same payment can be sent again.
+            raise SMCRetryLater(
+                payment_response.retryAfterMs / 1000, "Recipient is busy. Retry later."
+            )
+        if not payment_response.cumulativeAmount == cumulative_amount:
+            raise SMCBadPayment("Recipient acknowledged a different payment.")
+
+    logging.info("Payment accepted.")
+
+
+class SenderChannel:
+    """
+    Sender's handle on an established channel.
+    It bundles everything that is needed to keep paying on the channel.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        setup_proposal: setupProposal,
+        setup_response: setupResponse,
+        node_pool: Optional[NodePool] = None,
+    ):
+        """
+        It is blocking because of the node calls.
+
+        :param websocket: Connection to the recipient
+        :param setup_proposal: Sender's side of arguments for this channel
+        :param setup_response: Recipient's side of arguments for this channel
+        :param node_pool: Nodes to use. The default pool if not given
+        """
+        self.websocket = websocket
+        self.setup_proposal = setup_proposal
+        self.setup_response = setup_response
+        # Highest cumulative amount sent and highest cumulative amount acknowledged by the recipient.
+        self.sent_amount = 0
+        self.acknowledged_amount = 0
+        # Derived once, so that a payment on the channel is only signed.
+        # Signing stores the signature in the msig, which is read right after.
+        self.msig = smc_msig(
+            _sender_addr(),
+            setup_response.recipient,
+            setup_proposal.nonce,
+            setup_proposal.minRefundBlock,
+            setup_proposal.maxRefundBlock,
+            node_pool,
+        )
+        self.settlement = SettlementTemplate(
+            _sender_addr(),
+            setup_response.recipient,
+            setup_proposal.minRefundBlock,
+            node_pool,
+            channel_artifacts_version(setup_proposal),
+        )
+
+
+async def send_channel_payment(
+    channel: SenderChannel, cumulative_amount: int, parent_span: Optional[Span] = None
+) -> None:
+    """
+    Signs and sends a payment on an established channel without waiting for the recipient to acknowledge it.
+    Unlike send_payment, it makes no node call.
+
+    :param channel: Established channel
+    :param cumulative_amount: Sum of all payments from sender to recipient
+    :param parent_span: Span of the caller if tracing is enabled
+    """
+    with span(
+        "send_payment", parent_span, cumulative_amount=cumulative_amount
+    ) as payment_span:
+        with span("fill_lsig", payment_span):
+            payment_lsig = channel.settlement.lsig(cumulative_amount)
+        await _sign_and_send(
+            channel.websocket,
+            channel.msig,
+            payment_lsig,
+            cumulative_amount,
+            payment_span,
+        )
+
+
+class _StreamWindow:
+    """Payments of a stream that wait for a response of the recipient"""
+
+    def __init__(self, size: int):
+        """
+        :param size: Maximum number of payments in flight
+        """
+        self.slots = Semaphore(size)
+        # Amounts of the payments waiting for a response, in increasing order.
+        self.in_flight: list[int] = []
+        self.paused_until = 0.0
+        self.stopping = False
+
+    async def read_responses(self, channel: SenderChannel) -> None:
+        """
+        Reads the responses to the payments in flight until the stream stops and none is left.
+
+        :param channel: Channel of the stream
+        """
+        loop = get_running_loop()
+        try:
+            while not (self.stopping and not self.in_flight):
+                payment_response = await receive_payment_response(channel.websocket)
+                if payment_response.cumulativeAmount not in self.in_flight:
+                    raise SMCBadPayment("Recipient answered an unknown payment.")
+                self.in_flight.remove(payment_response.cumulativeAmount)
+
+                if payment_response.status == AdmissionStatus.RETRY_LATER:
+                    # The next payment must only exceed what the recipient may still accept.
+                    channel.sent_amount = max(
+                        self.in_flight[-1] if self.in_flight else 0,
+                        channel.acknowledged_amount,
+                    )
+                    self.paused_until = max(
+                        self.paused_until,
+                        loop.time() + payment_response.retryAfterMs / 1000,
+                    )
+                elif payment_response.status == AdmissionStatus.ACCEPTED:
+                    if not (
+                        channel.acknowledged_amount < payment_response.cumulativeAmount
+                    ):
+                        raise SMCBadPayment("Recipient acknowledged an old payment.")
+                    channel.acknowledged_amount = payment_response.cumulativeAmount
+                else:
+                    raise SMCBadPayment("Recipient rejected a payment.")
+                self.slots.release()
+        finally:
+            # Never leave the sending side waiting for a slot that will not come.
+            self.slots.release()
+
+
+# pylint: disable-next=too-many-arguments
+async def stream(
+    channel: SenderChannel,
+    rate: float,
+    increment: int,
+    max_amount: Optional[int] = None,
+    window: int = STREAM_WINDOW,
+    drain_timeout: float = STREAM_DRAIN_TIMEOUT,
+) -> int:
+    """
+    Streams payments on a channel until max_amount is reached or the calling task is cancelled.
+    The cumulative amount grows by increment for each tick at the target rate.
+    At most window payments wait for an acknowledgement at any time. If the recipient consumes payments slower
+     than the target rate, the ticks that were due in the meantime are coalesced in the next payment.
+    This way, the rate of messages adapts to the recipient while the paid amount still follows the target rate.
+    If the recipient asks to retry later, the stream pauses for the requested time and the rejected amount is
+     paid again by the next payment. A stream that ends with rejected payments can be resumed by calling it again.
+    Once it stops, the stream waits at most drain_timeout for the payments in flight. Those that were not acknowledged
+     by then are left out of the returned amount.
+
+    :param channel: Established channel
+    :param rate: Target ticks per second
+    :param increment: microalgos added to the cumulative amount at each tick
+    :param max_amount: Highest cumulative amount to be paid (e.g. the funding of the channel)
+    :param window: Maximum number of payments in flight
+    :param drain_timeout: Seconds to wait for the acknowledgements of the payments in flight once the stream stops
+    :return: Highest cumulative amount acknowledged by the recipient
+    """
+    if not rate > 0 or not increment > 0:
+        raise ValueError("Rate and increment must be positive.")
+
+    loop = get_running_loop()
+    payments = _StreamWindow(window)
+    reader = create_task(payments.read_responses(channel))
+    start_amount = channel.sent_amount
+    time_start = loop.time()
+    ticks = 0
+    try:
+        while max_amount is None or channel.sent_amount < max_amount:
+            await payments.slots.acquire()
+            if reader.done():
+                # Surfaces the error that stopped the acknowledgements.
+                reader.result()
+                raise SMCBadPayment("Recipient stopped acknowledging payments.")
+            if loop.time() < payments.paused_until:
+                await sleep(payments.paused_until - loop.time())
+
+            next_tick = time_start + ticks / rate
+            if loop.time() < next_tick:
+                await sleep(next_tick - loop.time())
+            # All ticks that are due by now are paid in one message.
+            ticks = max(ticks + 1, int((loop.time() - time_start) * rate) + 1)
+
+            amount = start_amount + ticks * increment
+            if max_amount is not None:
+                amount = min(amount, max_amount)
+            # Recorded before sending because the response can arrive before send_payment returns.
+            payments.in_flight.append(amount)
+            channel.sent_amount = amount
+            await send_channel_payment(channel, amount)
+    finally:
+        # Payments in flight must be acknowledged before the websocket can be used again.
+        payments.stopping = True
+        if not payments.in_flight or reader.done():
+            reader.cancel()
+        else:
+            try:
+                # The reader is cancelled when the time is up or when the stream itself is cancelled.
+                await wait_for(reader, drain_timeout)
+            except AsyncTimeoutError:
+                logging.warning(
+                    "%s payments in flight were not acknowledged.",
+                    len(payments.in_flight),
+                )
+
+    logging.info("Stream ended at %s.", channel.acknowledged_amount)
+
+    return channel.acknowledged_amount
+
+
+def build_refund(
+    setup_proposal: setupProposal,
+    setup_response: setupResponse,
+    derived_msig: "Multisig",
+    node_pool: Optional[NodePool] = None,
+) -> "LogicSigTransaction":
+    """
+    Builds the fully signed refund transaction of a channel.
+    It is blocking because of the node calls.
+
+    :param setup_proposal: Sender's side of arguments for this channel
+    :param setup_response: Recipient's side of arguments for this channel
+    :param derived_msig: Msig of the channel
+    :param node_pool: Nodes to use. The default pool if not given
+    :return: Refund transaction ready to be sent
+    """
+    from algosdk.transaction import LogicSigTransaction
+
+    refund_txn = smc_txn_refund(
+        derived_msig.address(),
+        _sender_addr(),
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
     )
-    payment_lsig_proposal = smc_lsig_settlement(
-        SENDER_ADDR,
-        setup_response.recipient,
-        cumulative_amount,
+
+    assert refund_txn.fee <= 1_000_000
+    version = channel_artifacts_version(setup_proposal)
+    # A transaction that the lsig would reject is not worth a round trip to the node.
+    check_refund(
+        refund_txn,
+        _sender_addr(),
         setup_proposal.minRefundBlock,
+        setup_proposal.maxRefundBlock,
+        version,
     )
-    payment_lsig_proposal.sign_multisig(derived_msig, SENDER_PRIVATE_KEY)
-    await websocket.send(
-        Payment(
-            cumulativeAmount=cumulative_amount,
-            lsigSignature=payment_lsig_proposal.lsig.msig.subsigs[0].signature,
-        ).SerializeToString()
+
+    derived_refund_lsig = smc_lsig_refund(
+        _sender_addr(),
+        setup_proposal.minRefundBlock,
+        setup_proposal.maxRefundBlock,
+        node_pool,
+        version,
     )
+    derived_refund_lsig.sign_multisig(derived_msig, _sender_private_key())
+    derived_refund_lsig.lsig.msig.subsigs[1].signature = setup_response.lsigSignature
 
-    logging.info("Payment accepted.")
+    return LogicSigTransaction(refund_txn, derived_refund_lsig)
 
 
 async def refund_channel(
-    setup_proposal: setupProposal, setup_response: setupResponse
+    setup_proposal: setupProposal,
+    setup_response: setupResponse,
+    node_pool: Optional[NodePool] = None,
+    fee_pooled: bool = False,
 ) -> None:
     """
     Handles the end of a channel lifetime. It submits refund transaction OR detect channel settlement
      from the recipient side.
+    A fee_pooled refund is sent in atomic groups where the sender pays the fee, raised until the refund window
+     closes (see fee_pooling). Channels whose programs don't accept a zero fee are refunded alone anyway.
 
     :param setup_proposal: Sender's side of arguments for this channel
     :param setup_response: Recipient's side of arguments for this channel
+    :param node_pool: Nodes to use. The default pool if not given
+    :param fee_pooled: Whether the sender should pay the fee in a group rather than the msig
     """
-    node_algod = get_sandbox_algod()
-    node_indexer = get_sandbox_indexer()
+    from algosdk.error import AlgodHTTPError, IndexerHTTPError
+    from algosdk.transaction import wait_for_confirmation
+
+    node_pool = node_pool or default_node_pool()
+    node_algod = node_pool.algod
+    node_indexer = node_pool.indexer
 
     derived_msig = smc_msig(
-        SENDER_ADDR,
+        _sender_addr(),
         setup_response.recipient,
         setup_proposal.nonce,
         setup_proposal.minRefundBlock,
         setup_proposal.maxRefundBlock,
+        node_pool,
     )
 
     while True:
@@ -235,34 +733,42 @@ async def refund_channel(
             raise SMCCannotBeRefunded
 
         last_round = node_algod.status()["last-round"]
+        KNOWN_CHANNELS.evict(last_round)
         if last_round >= setup_proposal.minRefundBlock:
             # Refund condition is online.
             break
 
         await sleep(2.0)
 
-    refund_txn = smc_txn_refund(
-        derived_msig.address(),
-        SENDER_ADDR,
-        setup_proposal.minRefundBlock,
-        setup_proposal.maxRefundBlock,
+    refund_txn_signed = build_refund(
+        setup_proposal, setup_response, derived_msig, node_pool
     )
 
-    assert refund_txn.fee <= 1_000_000
-
-    derived_refund_lsig = smc_lsig_refund(
-        SENDER_ADDR, setup_proposal.minRefundBlock, setup_proposal.maxRefundBlock
-    )
-    derived_refund_lsig.sign_multisig(derived_msig, SENDER_PRIVATE_KEY)
-    derived_refund_lsig.lsig.msig.subsigs[1].signature = setup_response.lsigSignature
-
-    refund_txn_signed = LogicSigTransaction(refund_txn, derived_refund_lsig)
+    if fee_pooled and channel_artifacts_version(setup_proposal) < FEE_POOLING_VERSION:
+        logging.info("The programs of the channel don't allow fee pooling.")
+        fee_pooled = False
+    if fee_pooled:
+        # Clients are blocking.
+        txid = await get_running_loop().run_in_executor(
+            None,
+            send_fee_pooled,
+            refund_txn_signed,
+            _sender_addr(),
+            _sender_private_key(),
+            setup_proposal.maxRefundBlock,
+            min(MAX_POOLED_FEE, msig_balance),
+            node_pool,
+        )
+        logging.info("Refund executed. TxID = %s", txid)
+        return
 
     try:
         txid = node_algod.send_transaction(refund_txn_signed)
     except AlgodHTTPError as err:
-        logging.error("Could not execute refund condition. This is probably because we had old indexer data and we"
-                      "thought that recipient didn't settle.")
+        logging.error(
+            "Could not execute refund condition. This is probably because we had old indexer data and we"
+            "thought that recipient didn't settle."
+        )
         raise err
     wait_for_confirmation(node_algod, txid)
 
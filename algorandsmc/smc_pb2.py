@@ -13,21 +13,31 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\tsmc.proto\"\\\n\tSMCMethod\x12%\n\x06method\x18\x01 \x01(\x0e\x32\x15.SMCMethod.MethodEnum\"(\n\nMethodEnum\x12\x11\n\rSETUP_CHANNEL\x10\x00\x12\x07\n\x03PAY\x10\x01\"^\n\rsetupProposal\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\r\n\x05nonce\x18\x02 \x01(\x04\x12\x16\n\x0eminRefundBlock\x18\x03 \x01(\x04\x12\x16\n\x0emaxRefundBlock\x18\x04 \x01(\x04\"9\n\rsetupResponse\x12\x11\n\trecipient\x18\x01 \x01(\t\x12\x15\n\rlsigSignature\x18\x02 \x01(\x0c\":\n\x07Payment\x12\x18\n\x10\x63umulativeAmount\x18\x01 \x01(\x04\x12\x15\n\rlsigSignature\x18\x02 \x01(\x0c\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\tsmc.proto\"p\n\tSMCMethod\x12%\n\x06method\x18\x01 \x01(\x0e\x32\x15.SMCMethod.MethodEnum\"<\n\nMethodEnum\x12\x11\n\rSETUP_CHANNEL\x10\x00\x12\x07\n\x03PAY\x10\x01\x12\x12\n\x0eRESUME_CHANNEL\x10\x02\"x\n\rsetupProposal\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\r\n\x05nonce\x18\x02 \x01(\x04\x12\x16\n\x0eminRefundBlock\x18\x03 \x01(\x04\x12\x16\n\x0emaxRefundBlock\x18\x04 \x01(\x04\x12\x18\n\x10\x61rtifactsVersion\x18\x05 \x01(\r\"q\n\rsetupResponse\x12\x11\n\trecipient\x18\x01 \x01(\t\x12\x15\n\rlsigSignature\x18\x02 \x01(\x0c\x12 \n\x06status\x18\x03 \x01(\x0e\x32\x10.AdmissionStatus\x12\x14\n\x0cretryAfterMs\x18\x04 \x01(\r\"8\n\x0ctraceContext\x12\x0f\n\x07traceId\x18\x01 \x01(\x0c\x12\x17\n\x0fsendTimestampNs\x18\x02 \x01(\x04\"X\n\x07Payment\x12\x18\n\x10\x63umulativeAmount\x18\x01 \x01(\x04\x12\x15\n\rlsigSignature\x18\x02 \x01(\x0c\x12\x1c\n\x05trace\x18\x03 \x01(\x0b\x32\r.traceContext\"c\n\x0fpaymentResponse\x12\x18\n\x10\x63umulativeAmount\x18\x01 \x01(\x04\x12 \n\x06status\x18\x02 \x01(\x0e\x32\x10.AdmissionStatus\x12\x14\n\x0cretryAfterMs\x18\x03 \x01(\r\"p\n\rresumeRequest\x12\x13\n\x0bmsigAddress\x18\x01 \x01(\t\x12\x1a\n\x12\x61\x63knowledgedAmount\x18\x02 \x01(\x04\x12\x15\n\rresumeCounter\x18\x03 \x01(\x04\x12\x17\n\x0fsenderSignature\x18\x04 \x01(\x0c\"*\n\x0eresumeResponse\x12\x18\n\x10\x63umulativeAmount\x18\x01 \x01(\x04*>\n\x0f\x41\x64missionStatus\x12\x0c\n\x08\x41\x43\x43\x45PTED\x10\x00\x12\x0f\n\x0bRETRY_LATER\x10\x01\x12\x0c\n\x08REJECTED\x10\x02\x62\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'smc_pb2', globals())
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
+  _ADMISSIONSTATUS._serialized_start=771
+  _ADMISSIONSTATUS._serialized_end=833
   _SMCMETHOD._serialized_start=13
-  _SMCMETHOD._serialized_end=105
+  _SMCMETHOD._serialized_end=125
   _SMCMETHOD_METHODENUM._serialized_start=65
-  _SMCMETHOD_METHODENUM._serialized_end=105
-  _SETUPPROPOSAL._serialized_start=107
-  _SETUPPROPOSAL._serialized_end=201
-  _SETUPRESPONSE._serialized_start=203
-  _SETUPRESPONSE._serialized_end=260
-  _PAYMENT._serialized_start=262
-  _PAYMENT._serialized_end=320
+  _SMCMETHOD_METHODENUM._serialized_end=125
+  _SETUPPROPOSAL._serialized_start=127
+  _SETUPPROPOSAL._serialized_end=247
+  _SETUPRESPONSE._serialized_start=249
+  _SETUPRESPONSE._serialized_end=362
+  _TRACECONTEXT._serialized_start=364
+  _TRACECONTEXT._serialized_end=420
+  _PAYMENT._serialized_start=422
+  _PAYMENT._serialized_end=510
+  _PAYMENTRESPONSE._serialized_start=512
+  _PAYMENTRESPONSE._serialized_end=611
+  _RESUMEREQUEST._serialized_start=613
+  _RESUMEREQUEST._serialized_end=725
+  _RESUMERESPONSE._serialized_start=727
+  _RESUMERESPONSE._serialized_end=769
 # @@protoc_insertion_point(module_scope)
@@ -1,17 +1,22 @@
 from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
+from typing import ClassVar as _ClassVar, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
+ACCEPTED: AdmissionStatus
 DESCRIPTOR: _descriptor.FileDescriptor
+REJECTED: AdmissionStatus
+RETRY_LATER: AdmissionStatus
 
 class Payment(_message.Message):
-    __slots__ = ["cumulativeAmount", "lsigSignature"]
+    __slots__ = ["cumulativeAmount", "lsigSignature", "trace"]
     CUMULATIVEAMOUNT_FIELD_NUMBER: _ClassVar[int]
     LSIGSIGNATURE_FIELD_NUMBER: _ClassVar[int]
+    TRACE_FIELD_NUMBER: _ClassVar[int]
     cumulativeAmount: int
     lsigSignature: bytes
-    def __init__(self, cumulativeAmount: _Optional[int] = ..., lsigSignature: _Optional[bytes] = ...) -> None: ...
+    trace: traceContext
+    def __init__(self, cumulativeAmount: _Optional[int] = ..., lsigSignature: _Optional[bytes] = ..., trace: _Optional[_Union[traceContext, _Mapping]] = ...) -> None: ...
 
 class SMCMethod(_message.Message):
     __slots__ = ["method"]
@@ -19,26 +24,72 @@ class SMCMethod(_message.Message):
         __slots__ = []
     METHOD_FIELD_NUMBER: _ClassVar[int]
     PAY: SMCMethod.MethodEnum
+    RESUME_CHANNEL: SMCMethod.MethodEnum
     SETUP_CHANNEL: SMCMethod.MethodEnum
     method: SMCMethod.MethodEnum
     def __init__(self, method: _Optional[_Union[SMCMethod.MethodEnum, str]] = ...) -> None: ...
 
+class paymentResponse(_message.Message):
+    __slots__ = ["cumulativeAmount", "retryAfterMs", "status"]
+    CUMULATIVEAMOUNT_FIELD_NUMBER: _ClassVar[int]
+    RETRYAFTERMS_FIELD_NUMBER: _ClassVar[int]
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    cumulativeAmount: int
+    retryAfterMs: int
+    status: AdmissionStatus
+    def __init__(self, cumulativeAmount: _Optional[int] = ..., status: _Optional[_Union[AdmissionStatus, str]] = ..., retryAfterMs: _Optional[int] = ...) -> None: ...
+
+class resumeRequest(_message.Message):
+    __slots__ = ["acknowledgedAmount", "msigAddress", "resumeCounter", "senderSignature"]
+    ACKNOWLEDGEDAMOUNT_FIELD_NUMBER: _ClassVar[int]
+    MSIGADDRESS_FIELD_NUMBER: _ClassVar[int]
+    RESUMECOUNTER_FIELD_NUMBER: _ClassVar[int]
+    SENDERSIGNATURE_FIELD_NUMBER: _ClassVar[int]
+    acknowledgedAmount: int
+    msigAddress: str
+    resumeCounter: int
+    senderSignature: bytes
+    def __init__(self, msigAddress: _Optional[str] = ..., acknowledgedAmount: _Optional[int] = ..., resumeCounter: _Optional[int] = ..., senderSignature: _Optional[bytes] = ...) -> None: ...
+
+class resumeResponse(_message.Message):
+    __slots__ = ["cumulativeAmount"]
+    CUMULATIVEAMOUNT_FIELD_NUMBER: _ClassVar[int]
+    cumulativeAmount: int
+    def __init__(self, cumulativeAmount: _Optional[int] = ...) -> None: ...
+
 class setupProposal(_message.Message):
-    __slots__ = ["maxRefundBlock", "minRefundBlock", "nonce", "sender"]
+    __slots__ = ["artifactsVersion", "maxRefundBlock", "minRefundBlock", "nonce", "sender"]
+    ARTIFACTSVERSION_FIELD_NUMBER: _ClassVar[int]
     MAXREFUNDBLOCK_FIELD_NUMBER: _ClassVar[int]
     MINREFUNDBLOCK_FIELD_NUMBER: _ClassVar[int]
     NONCE_FIELD_NUMBER: _ClassVar[int]
     SENDER_FIELD_NUMBER: _ClassVar[int]
+    artifactsVersion: int
     maxRefundBlock: int
     minRefundBlock: int
     nonce: int
     sender: str
-    def __init__(self, sender: _Optional[str] = ..., nonce: _Optional[int] = ..., minRefundBlock: _Optional[int] = ..., maxRefundBlock: _Optional[int] = ...) -> None: ...
+    def __init__(self, sender: _Optional[str] = ..., nonce: _Optional[int] = ..., minRefundBlock: _Optional[int] = ..., maxRefundBlock: _Optional[int] = ..., artifactsVersion: _Optional[int] = ...) -> None: ...
 
 class setupResponse(_message.Message):
-    __slots__ = ["lsigSignature", "recipient"]
+    __slots__ = ["lsigSignature", "recipient", "retryAfterMs", "status"]
     LSIGSIGNATURE_FIELD_NUMBER: _ClassVar[int]
     RECIPIENT_FIELD_NUMBER: _ClassVar[int]
+    RETRYAFTERMS_FIELD_NUMBER: _ClassVar[int]
+    STATUS_FIELD_NUMBER: _ClassVar[int]
     lsigSignature: bytes
     recipient: str
-    def __init__(self, recipient: _Optional[str] = ..., lsigSignature: _Optional[bytes] = ...) -> None: ...
+    retryAfterMs: int
+    status: AdmissionStatus
+    def __init__(self, recipient: _Optional[str] = ..., lsigSignature: _Optional[bytes] = ..., status: _Optional[_Union[AdmissionStatus, str]] = ..., retryAfterMs: _Optional[int] = ...) -> None: ...
+
+class traceContext(_message.Message):
+    __slots__ = ["sendTimestampNs", "traceId"]
+    SENDTIMESTAMPNS_FIELD_NUMBER: _ClassVar[int]
+    TRACEID_FIELD_NUMBER: _ClassVar[int]
+    sendTimestampNs: int
+    traceId: bytes
+    def __init__(self, traceId: _Optional[bytes] = ..., sendTimestampNs: _Optional[int] = ...) -> None: ...
+
+class AdmissionStatus(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = []
@@ -1,14 +1,18 @@
 """
 Flatten template import structure.
 """
-from .lsig import smc_lsig_refund, smc_lsig_settlement
+from .evaluator import check_refund, check_settlement
+from .lsig import SettlementTemplate, smc_lsig_refund, smc_lsig_settlement
 from .msig import smc_msig
 from .txn import smc_txn_refund, smc_txn_settlement
 
 __all__ = [
     "smc_lsig_settlement",
     "smc_lsig_refund",
+    "SettlementTemplate",
     "smc_msig",
     "smc_txn_settlement",
     "smc_txn_refund",
+    "check_settlement",
+    "check_refund",
 ]
@@ -0,0 +1,79 @@
+"""
+File that loads the TEAL artifacts emitted at build time by `algorandsmc.templates.build`.
+"""
+import re
+from functools import cache
+from pathlib import Path
+
+# Add a version every time the programs change. Both parties of a channel must use the same version because the
+#  bytecode of the programs determines the signatures that they exchange.
+# Versions are never removed: a channel keeps the programs it was set up with until it is settled or refunded.
+ARTIFACTS_VERSIONS = (1, 2)
+# Version of the channels that are set up now.
+ARTIFACTS_VERSION = ARTIFACTS_VERSIONS[-1]
+# Version of the channels set up before the programs were versioned.
+LEGACY_ARTIFACTS_VERSION = 1
+ARTIFACTS_DIR = Path(__file__).parent / "teal"
+
+TEMPLATE_VARIABLE = re.compile(r"TMPL_[A-Z_]+")
+
+
+def artifact_name(name: str, version: int = ARTIFACTS_VERSION) -> str:
+    """Returns the file name of the artifact for a version"""
+    return f"{name}.v{version}.teal"
+
+
+def channel_artifacts_version(setup_proposal) -> int:
+    """
+    Returns the version of the programs of a channel.
+
+    :param setup_proposal: Sender's side of arguments for the channel
+    :return: One of ARTIFACTS_VERSIONS
+    :raises ValueError: If the version is not known
+    """
+    version = setup_proposal.artifactsVersion or LEGACY_ARTIFACTS_VERSION
+    if version not in ARTIFACTS_VERSIONS:
+        raise ValueError(f"Unknown artifacts version {version}.")
+    return version
+
+
+@cache
+def load_artifact(name: str, version: int = ARTIFACTS_VERSION) -> str:
+    """
+    Returns the TEAL template of an artifact.
+    The file is read only once per process.
+
+    :param name: Name of the artifact without version and extension
+    :param version: Version of the artifact
+    :return: TEAL code with template variables
+    """
+    path = ARTIFACTS_DIR / artifact_name(name, version)
+    if not path.is_file():
+        raise FileNotFoundError(
+            f"Missing TEAL artifact {path}. Run `make compile-teal` to build it."
+        )
+    return path.read_text(encoding="utf-8")
+
+
+def render_artifact(
+    name: str, version: int = ARTIFACTS_VERSION, **variables: int | str
+) -> str:
+    """
+    Returns the TEAL code of an artifact with all template variables replaced.
+
+    :param name: Name of the artifact without version and extension
+    :param version: Version of the artifact
+    :param variables: Value of each template variable without the TMPL_ prefix (e.g. sender="...")
+    :return: TEAL code ready to be compiled
+    """
+    values = {f"TMPL_{key.upper()}": str(value) for key, value in variables.items()}
+
+    def substitute(match: re.Match) -> str:
+        try:
+            return values[match.group(0)]
+        except KeyError as err:
+            raise ValueError(
+                f"Missing value for {match.group(0)} in artifact {name}."
+            ) from err
+
+    return TEMPLATE_VARIABLE.sub(substitute, load_artifact(name, version))
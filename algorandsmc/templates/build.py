@@ -0,0 +1,134 @@
+"""
+File that emits the TEAL artifacts of the SMC programs.
+This is the only module that needs PyTeal and it is meant to be run at build time (see `make compile-teal`).
+"""
+from pathlib import Path
+
+from pyteal import (
+    Approve,
+    Assert,
+    Expr,
+    Global,
+    Int,
+    Mode,
+    Or,
+    Seq,
+    Tmpl,
+    Txn,
+    TxnType,
+    compileTeal,
+)
+
+from algorandsmc.templates.artifacts import (
+    ARTIFACTS_DIR,
+    ARTIFACTS_VERSION,
+    ARTIFACTS_VERSIONS,
+    artifact_name,
+)
+
+# Version of the AVM for the logic signatures.
+TEAL_VERSION = 2
+
+
+def fee_condition(version: int) -> Expr:
+    """
+    Returns the condition on the fee of the lsig transactions.
+    From version 2, a fee of zero is accepted too. The ledger only accepts it in a group where another transaction
+     pays for both (see fee_pooling).
+
+    :param version: Version of the artifacts
+    """
+    if version < 2:
+        return Txn.fee() == Global.min_txn_fee()
+    return Or(Txn.fee() == Global.min_txn_fee(), Txn.fee() == Int(0))
+
+
+def smc_lsig_settlement_pyteal(version: int = ARTIFACTS_VERSION) -> Expr:
+    """
+    Returns the PyTeal expression of the settlement logic signature.
+    All channel arguments are left as template variables to be filled in at runtime.
+
+    :param version: Version of the artifacts
+    """
+    # As per Algorand guidelines. All lsigs should contain an end block.
+    # It's dangerous to sign lsigs that last for eternity.
+    return Seq(
+        Assert(
+            Txn.type_enum() == TxnType.Payment,
+            Txn.amount() == Tmpl.Int("TMPL_CUMULATIVE_AMOUNT"),
+            fee_condition(version),
+            Txn.receiver() == Tmpl.Addr("TMPL_RECIPIENT"),
+            Txn.close_remainder_to() == Tmpl.Addr("TMPL_SENDER"),
+            Txn.rekey_to() == Global.zero_address(),
+            Txn.last_valid() < Tmpl.Int("TMPL_MIN_REFUND_BLOCK"),
+        ),
+        Approve(),
+    )
+
+
+def smc_lsig_refund_pyteal(version: int = ARTIFACTS_VERSION) -> Expr:
+    """
+    Returns the PyTeal expression of the refund logic signature.
+    All channel arguments are left as template variables to be filled in at runtime.
+
+    :param version: Version of the artifacts
+    """
+    # As per Algorand guidelines. All lsigs should contain an end block.
+    # It's dangerous to sign lsigs that last for eternity.
+    return Seq(
+        Assert(
+            Txn.type_enum() == TxnType.Payment,
+            Txn.amount() == Int(0),
+            fee_condition(version),
+            Txn.close_remainder_to() == Tmpl.Addr("TMPL_SENDER"),
+            Txn.rekey_to() == Global.zero_address(),
+            Txn.first_valid() >= Tmpl.Int("TMPL_MIN_REFUND_BLOCK"),
+            Txn.last_valid() <= Tmpl.Int("TMPL_MAX_REFUND_BLOCK"),
+        ),
+        Approve(),
+    )
+
+
+def smc_parameter_teal() -> str:
+    """
+    Returns the TEAL code of the parameter contract account (C).
+    This is not written in PyTeal because it must stay exactly as it is: its hash is the address of C and therefore
+     part of the address of every shared msig.
+    """
+    # fmt: off
+    return "\n".join([
+        "int TMPL_NONCE",
+        "int TMPL_MIN_REFUND_BLOCK",
+        "int TMPL_MAX_REFUND_BLOCK",
+    ])
+    # fmt: on
+
+
+def build(artifacts_dir: Path = ARTIFACTS_DIR) -> None:
+    """
+    Writes the TEAL artifacts of all ARTIFACTS_VERSIONS.
+
+    :param artifacts_dir: Destination folder for the artifacts
+    """
+    artifacts_dir.mkdir(parents=True, exist_ok=True)
+    for version in ARTIFACTS_VERSIONS:
+        artifacts = {
+            "smc_lsig_settlement": compileTeal(
+                smc_lsig_settlement_pyteal(version),
+                Mode.Signature,
+                version=TEAL_VERSION,
+            ),
+            "smc_lsig_refund": compileTeal(
+                smc_lsig_refund_pyteal(version), Mode.Signature, version=TEAL_VERSION
+            ),
+            "smc_parameter": smc_parameter_teal(),
+        }
+        for name, teal in artifacts.items():
+            (artifacts_dir / artifact_name(name, version)).write_text(
+                teal + "\n", encoding="utf-8"
+            )
+
+
+if __name__ == "__main__":
+    build()
+    print(f"TEAL artifacts v{ARTIFACTS_VERSIONS} written to {ARTIFACTS_DIR}")
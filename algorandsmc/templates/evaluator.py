@@ -0,0 +1,207 @@
+"""
+File that implements an in-process evaluator for the TEAL programs of the SMC logic signatures.
+It only knows the opcodes that the artifacts use, which is enough to tell if a transaction would be approved
+ by an lsig before paying for a round trip to the node.
+"""
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+from typing import TYPE_CHECKING, Union
+
+from algorandsmc.errors import SMCLsigRejected
+from algorandsmc.templates.artifacts import ARTIFACTS_VERSION
+from algorandsmc.templates.lsig import smc_refund_teal, smc_settlement_teal
+
+if TYPE_CHECKING:
+    from algosdk.transaction import PaymentTxn
+
+StackValue = Union[int, bytes]
+
+# Named constants of the TypeEnum field.
+TYPE_ENUMS = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+MIN_TXN_FEE = 1_000
+ZERO_ADDRESS = bytes(32)
+
+# Opcodes that push a value without taking any from the stack (see _operand).
+OPERANDS = ("txn", "global", "int", "addr")
+BRANCHES = ("bz", "bnz", "b")
+COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "&&": lambda a, b: bool(a) and bool(b),
+    "||": lambda a, b: bool(a) or bool(b),
+}
+
+
+def _decode_address(address: str) -> bytes:
+    """Returns the public key behind an Algorand address"""
+    from algosdk.encoding import decode_address
+
+    return decode_address(address)
+
+
+def txn_fields(txn: "PaymentTxn") -> dict[str, StackValue]:
+    """
+    Returns the fields of a payment transaction as the AVM sees them.
+
+    :param txn: Payment transaction
+    :return: Value of each field by TEAL name
+    """
+    return {
+        "TypeEnum": TYPE_ENUMS[txn.type],
+        "Sender": _decode_address(txn.sender),
+        "Receiver": _decode_address(txn.receiver) if txn.receiver else ZERO_ADDRESS,
+        "Amount": txn.amt,
+        "Fee": txn.fee,
+        "FirstValid": txn.first_valid_round,
+        "LastValid": txn.last_valid_round,
+        "CloseRemainderTo": (
+            _decode_address(txn.close_remainder_to)
+            if txn.close_remainder_to
+            else ZERO_ADDRESS
+        ),
+        "RekeyTo": _decode_address(txn.rekey_to) if txn.rekey_to else ZERO_ADDRESS,
+    }
+
+
+def _parse(teal: str) -> tuple[list[str], dict[str, int]]:
+    """Returns the instructions of a TEAL program and the position of each label among them"""
+    lines = []
+    labels = {}
+    for line in teal.splitlines():
+        line = line.split("//", 1)[0].strip()
+        if not line or line.startswith("#pragma"):
+            continue
+        if line.endswith(":"):
+            labels[line[:-1]] = len(lines)
+            continue
+        lines.append(line)
+    return lines, labels
+
+
+def _operand(
+    opcode: str,
+    argument: str,
+    fields: dict[str, StackValue],
+    global_fields: dict[str, StackValue],
+) -> StackValue:
+    """Returns the value pushed by an instruction that takes nothing from the stack"""
+    if opcode == "txn":
+        if argument not in fields:
+            raise ValueError(f"Unknown transaction field {argument}.")
+        return fields[argument]
+    if opcode == "global":
+        if argument not in global_fields:
+            raise ValueError(f"Unknown global field {argument}.")
+        return global_fields[argument]
+    if opcode == "int":
+        return TYPE_ENUMS[argument] if argument in TYPE_ENUMS else int(argument)
+    return _decode_address(argument)
+
+
+def evaluate(
+    teal: str, fields: dict[str, StackValue], min_txn_fee: int = MIN_TXN_FEE
+) -> None:
+    """
+    Runs a TEAL program against the fields of a transaction.
+
+    :param teal: TEAL code without template variables
+    :param fields: Value of each transaction field by TEAL name (see txn_fields)
+    :param min_txn_fee: Value of global MinTxnFee
+    :raises SMCLsigRejected: If the program does not approve the transaction
+    :raises ValueError: If the program uses something that the evaluator doesn't know
+    """
+    global_fields: dict[str, StackValue] = {
+        "MinTxnFee": min_txn_fee,
+        "ZeroAddress": ZERO_ADDRESS,
+    }
+    lines, labels = _parse(teal)
+
+    stack: list[StackValue] = []
+    # Instructions since the last branch, i.e. the condition being checked, and the one checked by that branch.
+    condition: list[str] = []
+    checked: list[str] = []
+    counter = 0
+    while counter < len(lines):
+        line = lines[counter]
+        counter += 1
+        opcode, _, argument = line.partition(" ")
+        if opcode in OPERANDS:
+            stack.append(_operand(opcode, argument, fields, global_fields))
+        elif opcode in COMPARISONS:
+            right, left = stack.pop(), stack.pop()
+            stack.append(int(COMPARISONS[opcode](left, right)))
+        elif opcode == "!":
+            stack.append(int(not stack.pop()))
+        elif opcode in BRANCHES:
+            if opcode == "b" or bool(stack.pop()) == (opcode == "bnz"):
+                counter = labels[argument]
+            # Whether the branch is taken or not, the next condition starts here.
+            checked, condition = condition, []
+            continue
+        elif opcode == "return":
+            if not stack.pop():
+                raise SMCLsigRejected("Program returned zero.")
+            return
+        elif opcode == "err":
+            raise SMCLsigRejected(f"Condition failed: {' '.join(checked)}")
+        else:
+            raise ValueError(f"Opcode {opcode} is not supported by the evaluator.")
+        condition.append(line)
+
+    if not (len(stack) == 1 and stack[0]):
+        raise SMCLsigRejected("Program did not end with a single non-zero value.")
+
+
+# pylint: disable-next=too-many-arguments
+def check_settlement(
+    txn: "PaymentTxn",
+    sender: str,
+    recipient: str,
+    cumulative_amount: int,
+    min_block_refund: int,
+    version: int = ARTIFACTS_VERSION,
+) -> None:
+    """
+    Checks a settlement transaction against the settlement lsig (see smc_lsig_settlement).
+
+    :param txn: Candidate settlement transaction
+    :param sender: Algorand address of Alice
+    :param recipient: Algorand address of Bob
+    :param cumulative_amount: Sum of all payments from Alice to Bob
+    :param min_block_refund: Last block (not included) for which it is safe to settle a payment.
+    :param version: Version of the programs of the channel (see channel_artifacts_version)
+    :raises SMCLsigRejected: If the lsig would not approve the transaction
+    """
+    evaluate(
+        smc_settlement_teal(
+            sender, recipient, cumulative_amount, min_block_refund, version
+        ),
+        txn_fields(txn),
+    )
+
+
+def check_refund(
+    txn: "PaymentTxn",
+    sender: str,
+    min_block_refund: int,
+    max_block_refund: int,
+    version: int = ARTIFACTS_VERSION,
+) -> None:
+    """
+    Checks a refund transaction against the refund lsig (see smc_lsig_refund).
+
+    :param txn: Candidate refund transaction
+    :param sender: Algorand address of Alice
+    :param min_block_refund: Minimum block for Alice's refund transaction to be valid
+    :param max_block_refund: Last block for Alice's refund transaction to be valid
+    :param version: Version of the programs of the channel (see channel_artifacts_version)
+    :raises SMCLsigRejected: If the lsig would not approve the transaction
+    """
+    evaluate(
+        smc_refund_teal(sender, min_block_refund, max_block_refund, version),
+        txn_fields(txn),
+    )
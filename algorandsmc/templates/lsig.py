@@ -1,29 +1,68 @@
 """
 File that implements the Logic Signature with the msig as the delegating account.
 """
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
 import base64
+from functools import partial
+from typing import TYPE_CHECKING, Optional
 
-from algosdk.encoding import decode_address
-from algosdk.transaction import LogicSigAccount
-from pyteal import (
-    Approve,
-    Assert,
-    Bytes,
-    Global,
-    Int,
-    Mode,
-    Seq,
-    Txn,
-    TxnType,
-    compileTeal,
-)
+from algorandsmc.nodes import NodePool, default_node_pool
+from algorandsmc.templates.artifacts import ARTIFACTS_VERSION, render_artifact
+from algorandsmc.utils import decode_varuint, encode_varuint
 
-from algorandsmc.utils import get_sandbox_algod
+if TYPE_CHECKING:
+    from algosdk.transaction import LogicSigAccount
 
+# Cumulative amount with which the settlement lsig of a channel is compiled once (see SettlementTemplate).
+PLACEHOLDER_AMOUNT = 2**64 - 1
+# Opcode that declares the integer constants at the start of the bytecode.
+INTCBLOCK = 0x20
 
+
+def smc_settlement_teal(
+    sender: str,
+    recipient: str,
+    cumulative_amount: int,
+    min_block_refund: int,
+    version: int = ARTIFACTS_VERSION,
+) -> str:
+    """Returns the TEAL code of the settlement lsig (see smc_lsig_settlement)"""
+    return render_artifact(
+        "smc_lsig_settlement",
+        version,
+        sender=sender,
+        recipient=recipient,
+        cumulative_amount=cumulative_amount,
+        min_refund_block=min_block_refund,
+    )
+
+
+def smc_refund_teal(
+    sender: str,
+    min_block_refund: int,
+    max_block_refund: int,
+    version: int = ARTIFACTS_VERSION,
+) -> str:
+    """Returns the TEAL code of the refund lsig (see smc_lsig_refund)"""
+    return render_artifact(
+        "smc_lsig_refund",
+        version,
+        sender=sender,
+        min_refund_block=min_block_refund,
+        max_refund_block=max_block_refund,
+    )
+
+
+# pylint: disable-next=too-many-arguments
 def smc_lsig_settlement(
-    sender: str, recipient: str, cumulative_amount: int, min_block_refund: int
-) -> LogicSigAccount:
+    sender: str,
+    recipient: str,
+    cumulative_amount: int,
+    min_block_refund: int,
+    node_pool: Optional[NodePool] = None,
+    version: int = ARTIFACTS_VERSION,
+) -> "LogicSigAccount":
     """
     Returns all necessary information about the logic signature that enables the sender (Alice) to pay Bob
      using the SMC.
@@ -32,34 +71,28 @@ def smc_lsig_settlement(
     :param recipient: Algorand address of Bob
     :param cumulative_amount: Sum of all payments from Alice to Bob
     :param min_block_refund: Last block (not included) for which it is safe to settle a payment.
+    :param node_pool: Nodes to use. The default pool if not given
+    :param version: Version of the programs of the channel (see channel_artifacts_version)
     :return: SDK wrapper around the bytecode of the logic signature
     """
-    # Sandbox node
-    node_algod = get_sandbox_algod()
-
-    # As per Algorand guidelines. All lsigs should contain an end block.
-    # It's dangerous to sign lsigs that last for eternity.
-    lsig_pyteal = Seq(
-        Assert(
-            Txn.type_enum() == TxnType.Payment,
-            Txn.amount() == Int(cumulative_amount),
-            Txn.fee() == Global.min_txn_fee(),
-            Txn.receiver() == Bytes(decode_address(recipient)),
-            Txn.close_remainder_to() == Bytes(decode_address(sender)),
-            Txn.rekey_to() == Global.zero_address(),
-            Txn.last_valid() < Int(min_block_refund),
-        ),
-        Approve(),
-    )
+    from algosdk.transaction import LogicSigAccount
 
-    lsig_teal = compileTeal(lsig_pyteal, Mode.Signature, version=2)
+    node_algod = (node_pool or default_node_pool()).algod
+
+    lsig_teal = smc_settlement_teal(
+        sender, recipient, cumulative_amount, min_block_refund, version
+    )
 
     return LogicSigAccount(base64.b64decode(node_algod.compile(lsig_teal)["result"]))
 
 
 def smc_lsig_refund(
-    sender: str, min_block_refund: int, max_block_refund: int
-) -> LogicSigAccount:
+    sender: str,
+    min_block_refund: int,
+    max_block_refund: int,
+    node_pool: Optional[NodePool] = None,
+    version: int = ARTIFACTS_VERSION,
+) -> "LogicSigAccount":
     """
     Returns all necessary information about the logic signature that enables the sender (Alice) to be refunded according
      to usual constraints of an SMC.
@@ -67,26 +100,81 @@ def smc_lsig_refund(
     :param sender: Algorand address of Alice
     :param min_block_refund: Minimum block for Alice's refund transaction to be valid
     :param max_block_refund: Last block for Alice's refund transaction to be valid
+    :param node_pool: Nodes to use. The default pool if not given
+    :param version: Version of the programs of the channel (see channel_artifacts_version)
     :return: SDK wrapper around the bytecode of the logic signature
     """
-    # Sandbox node
-    node_algod = get_sandbox_algod()
-
-    # As per Algorand guidelines. All lsigs should contain an end block.
-    # It's dangerous to sign lsigs that last for eternity.
-    lsig_pyteal = Seq(
-        Assert(
-            Txn.type_enum() == TxnType.Payment,
-            Txn.amount() == Int(0),
-            Txn.fee() == Global.min_txn_fee(),
-            Txn.close_remainder_to() == Bytes(decode_address(sender)),
-            Txn.rekey_to() == Global.zero_address(),
-            Txn.first_valid() >= Int(min_block_refund),
-            Txn.last_valid() <= Int(max_block_refund),
-        ),
-        Approve(),
-    )
+    from algosdk.transaction import LogicSigAccount
 
-    lsig_teal = compileTeal(lsig_pyteal, Mode.Signature, version=2)
+    node_algod = (node_pool or default_node_pool()).algod
+
+    lsig_teal = smc_refund_teal(sender, min_block_refund, max_block_refund, version)
 
     return LogicSigAccount(base64.b64decode(node_algod.compile(lsig_teal)["result"]))
+
+
+class SettlementTemplate:
+    """
+    Settlement lsig of a channel, compiled once.
+    The cumulative amount is the only argument that changes from one payment to the next and it is an integer constant
+     of the bytecode, so the lsig of a payment is the compiled bytecode with that constant replaced.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        sender: str,
+        recipient: str,
+        min_block_refund: int,
+        node_pool: Optional[NodePool] = None,
+        version: int = ARTIFACTS_VERSION,
+    ):
+        """
+        :param sender: Algorand address of Alice
+        :param recipient: Algorand address of Bob
+        :param min_block_refund: Last block (not included) for which it is safe to settle a payment.
+        :param node_pool: Nodes to use. The default pool if not given
+        :param version: Version of the programs of the channel (see channel_artifacts_version)
+        """
+        self._compile = partial(
+            smc_lsig_settlement,
+            sender=sender,
+            recipient=recipient,
+            min_block_refund=min_block_refund,
+            node_pool=node_pool,
+            version=version,
+        )
+        program = self._compile(cumulative_amount=PLACEHOLDER_AMOUNT).lsig.logic
+
+        # Bytecode before and after the placeholder, and the other constants.
+        self._prefix: Optional[bytes] = None
+        self._suffix = b""
+        self._constants: list[int] = []
+        _, offset = decode_varuint(program, 0)
+        if program[offset] != INTCBLOCK:
+            return
+        count, offset = decode_varuint(program, offset + 1)
+        for _ in range(count):
+            value, end = decode_varuint(program, offset)
+            if value == PLACEHOLDER_AMOUNT:
+                self._prefix, self._suffix = program[:offset], program[end:]
+            else:
+                self._constants.append(value)
+            offset = end
+
+    def lsig(self, cumulative_amount: int) -> "LogicSigAccount":
+        """
+        Returns the settlement lsig of a payment without any node call, except in the rare cases explained below.
+
+        :param cumulative_amount: Sum of all payments from Alice to Bob
+        :return: SDK wrapper around the bytecode of the logic signature
+        """
+        from algosdk.transaction import LogicSigAccount
+
+        # The node stores an integer only once, so an amount equal to another constant changes the layout of the
+        #  bytecode. That bytecode and any unexpected one are compiled as usual.
+        if self._prefix is None or cumulative_amount in self._constants:
+            return self._compile(cumulative_amount=cumulative_amount)
+        return LogicSigAccount(
+            self._prefix + encode_varuint(cumulative_amount) + self._suffix
+        )
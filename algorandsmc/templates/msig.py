@@ -1,18 +1,37 @@
 """
 File that implements the Layer-1 multisignature account shared between sender and recipient.
 """
-from algosdk.transaction import Multisig
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional
 
-from algorandsmc.utils import get_sandbox_algod
+from algorandsmc.nodes import NodePool, default_node_pool
+from algorandsmc.templates.artifacts import render_artifact
 
+if TYPE_CHECKING:
+    from algosdk.transaction import Multisig
 
+# Addresses of C kept in memory. An address only depends on the channel arguments, and deriving it is otherwise a
+#  node round trip on every payment.
+CONTRACT_CACHE_SIZE = 4_096
+
+
+@lru_cache(maxsize=CONTRACT_CACHE_SIZE)
+def _contract_addr(teal: str, node_algod: Any) -> str:
+    """Returns the address of the contract account of a TEAL program"""
+    return node_algod.compile(teal)["hash"]
+
+
+# pylint: disable-next=too-many-arguments
 def smc_msig(
     sender_addr: str,
     recipient_addr: str,
     nonce: int,
     min_block_refund: int,
     max_block_refund: int,
-) -> Multisig:
+    node_pool: Optional[NodePool] = None,
+) -> "Multisig":
     """
     Returns all necessary info about a Simple Micropayment Channel given setup parameters.
     (A)lice is the sender and (B)ob the recipient. (C)ontract is the fictitious smart signature account that always
@@ -24,10 +43,12 @@ def smc_msig(
     :param nonce: Parameter to generate multiple channels given fixed sender, recipient and block contraints
     :param min_block_refund: Minimum block for A's refund transaction to be valid
     :param max_block_refund: Last block for A's refund transaction to be valid
+    :param node_pool: Nodes to use. The default pool if not given
     :return: SDK wrapper around the multisignature account shared between Alice and Bob
     """
-    # Sandbox node
-    node_algod = get_sandbox_algod()
+    from algosdk.transaction import Multisig
+
+    node_algod = (node_pool or default_node_pool()).algod
 
     # Derive C's address.
     # We could technically just parameterize this contract with nonce alone. However, both participants in the channel
@@ -39,13 +60,13 @@ def smc_msig(
     # This basically means that we can receive proposed channel arguments,
     #  derive msig address and evaluate if we already opened the channel in the past.
     # The TEAL code for C contract account always fails because it terminates with more than one element on the stack.
-    # fmt: off
-    teal = "\n".join([
-        f"int {nonce}",
-        f"int {min_block_refund}",
-        f"int {max_block_refund}"
-    ])
-    # fmt: on
-    contract_addr = node_algod.compile(teal)["hash"]
+    teal = render_artifact(
+        "smc_parameter",
+        nonce=nonce,
+        min_refund_block=min_block_refund,
+        max_refund_block=max_block_refund,
+    )
+    contract_addr = _contract_addr(teal, node_algod)
 
+    # A new Multisig every time because signing an lsig stores the signatures in it.
     return Multisig(1, 2, [sender_addr, recipient_addr, contract_addr])
@@ -1,30 +1,47 @@
 """
 File that implements the template for the SMC Layer-1 transactions.
 """
-from algosdk.transaction import PaymentTxn
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+from typing import TYPE_CHECKING, Optional
 
-from algorandsmc.utils import get_sandbox_algod
+from algorandsmc.nodes import NodePool, default_node_pool
 
+if TYPE_CHECKING:
+    from algosdk.transaction import PaymentTxn
 
+# Maximum number of rounds between the first and last valid round of a transaction.
+MAX_TXN_LIFE = 1_000
+
+
+# pylint: disable-next=too-many-arguments
 def smc_txn_settlement(
     msig: str,
     sender: str,
     recipient: str,
     cumulative_amount: int,
     min_refund_block: int,
-):
+    node_pool: Optional[NodePool] = None,
+    until_deadline: bool = False,
+) -> "PaymentTxn":
     """
     Returns all necessary information about the payment transaction that enables the recipient (Bob) to
      settle on Layer-1 the last received payment.
+    A transaction built until_deadline is valid in the last rounds before min_refund_block, even if they are further
+     away than the lifetime of a transaction. This way, it can be signed ahead of time and still be sent at the deadline.
 
     :param msig: Algorand address of the msig
     :param sender: Algorand address of the sender
     :param recipient: Algorand address of the recipient
     :param cumulative_amount: Sum of all payments from Alice to Bob
     :param min_refund_block: First valid block for the refund condition to be executable
+    :param node_pool: Nodes to use. The default pool if not given
+    :param until_deadline: Whether the validity should end right before min_refund_block rather than start now
     :return: SDK wrapper around the payment transaction
     """
-    node_algod = get_sandbox_algod()
+    from algosdk.transaction import PaymentTxn
+
+    node_algod = (node_pool or default_node_pool()).algod
 
     sugg_params = node_algod.suggested_params()
 
@@ -37,6 +54,12 @@ def smc_txn_settlement(
     # There's enough time to submit a settlement transaction but lastBlock could be > min_refund_block.
     # In this case, we want the transaction to have a block range that will be accepted by settlement lsig.
     sugg_params.last = min(sugg_params.last, min_refund_block - 1)
+    # The lsig only accepts the minimum fee, even when the node suggests more. See fee_pooling for congestion.
+    sugg_params.fee = sugg_params.min_fee
+    sugg_params.flat_fee = True
+    if until_deadline:
+        sugg_params.last = min_refund_block - 1
+        sugg_params.first = max(sugg_params.first, sugg_params.last - MAX_TXN_LIFE)
 
     return PaymentTxn(
         msig, sugg_params, recipient, cumulative_amount, close_remainder_to=sender
@@ -44,8 +67,12 @@ def smc_txn_settlement(
 
 
 def smc_txn_refund(
-    msig: str, sender: str, min_refund_block: int, max_refund_block: int
-) -> PaymentTxn:
+    msig: str,
+    sender: str,
+    min_refund_block: int,
+    max_refund_block: int,
+    node_pool: Optional[NodePool] = None,
+) -> "PaymentTxn":
     """
     Returns the compiled refund transaction that the sender (Alice) can use in case of an
     uncooperative recipient (Bob).
@@ -54,9 +81,12 @@ def smc_txn_refund(
     :param sender: Algorand address of the sender
     :param min_refund_block: First valid block for the refund condition to be executable
     :param max_refund_block: Last valid block for the refund condition to be executable
+    :param node_pool: Nodes to use. The default pool if not given
     :return: SDK wrapper around the refund transaction
     """
-    node_algod = get_sandbox_algod()
+    from algosdk.transaction import PaymentTxn
+
+    node_algod = (node_pool or default_node_pool()).algod
 
     sugg_params = node_algod.suggested_params()
 
@@ -75,5 +105,8 @@ def smc_txn_refund(
     #  old first/last block and min_refund_block/max_refund_block.
     sugg_params.first = max(sugg_params.first, min_refund_block)
     sugg_params.last = min(sugg_params.last, max_refund_block)
+    # The lsig only accepts the minimum fee, even when the node suggests more. See fee_pooling for congestion.
+    sugg_params.fee = sugg_params.min_fee
+    sugg_params.flat_fee = True
 
     return PaymentTxn(msig, sugg_params, sender, 0, close_remainder_to=sender)
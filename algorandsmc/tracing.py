@@ -0,0 +1,212 @@
+"""
+File that implements optional tracing of the payment protocol.
+Spans are kept in memory and exported to a local file in the OTLP/JSON format of OpenTelemetry, one export request
+ per line (as written by the file exporter of the OpenTelemetry collector).
+Tracing is disabled unless enable_tracing is called, in which case the protocol functions record a span for each
+ of their internal stages.
+"""
+# json is imported lazily, as spans are only exported when tracing is enabled.
+# pylint: disable=import-outside-toplevel
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+# OTLP status codes.
+STATUS_OK = 1
+STATUS_ERROR = 2
+# OTLP span kind for internal operations.
+SPAN_KIND_INTERNAL = 1
+
+
+# pylint: disable-next=too-many-instance-attributes
+class Span:
+    """Timed stage of a payment"""
+
+    __slots__ = [
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "name",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    ]
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        trace_id: bytes,
+        name: str,
+        parent_span_id: bytes = b"",
+        start_ns: int = 0,
+        attributes: Optional[dict] = None,
+    ):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    def to_otlp(self) -> dict:
+        """Returns the span in the OTLP/JSON encoding"""
+        otlp_span = {
+            "traceId": self.trace_id.hex(),
+            "spanId": self.span_id.hex(),
+            "parentSpanId": self.parent_span_id.hex(),
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            # 64-bit integers are strings in OTLP/JSON.
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(*item) for item in self.attributes.items()],
+            "status": {"code": STATUS_OK},
+        }
+        if self.error is not None:
+            otlp_span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return otlp_span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    """Returns a span attribute in the OTLP/JSON encoding"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """Collects the spans of one side of the protocol"""
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+        self.spans: list[Span] = []
+
+    def export(self, path: Path | str) -> int:
+        """
+        Appends all collected spans to a file and forgets them.
+
+        :param path: Destination file
+        :return: Number of exported spans
+        """
+        import json
+
+        spans, self.spans = self.spans, []
+        if not spans:
+            return 0
+
+        export_request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            _otlp_attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "algorandsmc"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        with open(path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(json.dumps(export_request) + "\n")
+        return len(spans)
+
+
+_TRACER: Optional[Tracer] = None
+
+
+def enable_tracing(service_name: str) -> Tracer:
+    """
+    Starts recording spans in this process.
+
+    :param service_name: Name of this side of the protocol in the exported spans (e.g. smc-sender)
+    :return: Tracer that collects the spans
+    """
+    global _TRACER  # pylint: disable=global-statement
+    _TRACER = Tracer(service_name)
+    return _TRACER
+
+
+def disable_tracing() -> None:
+    """Stops recording spans in this process"""
+    global _TRACER  # pylint: disable=global-statement
+    _TRACER = None
+
+
+def current_tracer() -> Optional[Tracer]:
+    """Returns the active tracer, if any"""
+    return _TRACER
+
+
+def new_trace_id() -> bytes:
+    """Returns a random trace id"""
+    return os.urandom(16)
+
+
+@contextmanager
+def span(
+    name: str,
+    parent: Optional[Span] = None,
+    trace_id: Optional[bytes] = None,
+    **attributes,
+) -> Iterator[Optional[Span]]:
+    """
+    Records the enclosed block as a span. It yields None and records nothing if tracing is disabled.
+    The span belongs to the trace of its parent, or to trace_id, or to a new trace, in this order.
+
+    :param name: Name of the stage
+    :param parent: Enclosing span
+    :param trace_id: Trace to join if there is no parent (e.g. the one received from the other side)
+    :param attributes: Attributes of the span
+    """
+    if _TRACER is None:
+        yield None
+        return
+
+    if parent is not None:
+        new_span = Span(parent.trace_id, name, parent.span_id, attributes=attributes)
+    else:
+        new_span = Span(trace_id or new_trace_id(), name, attributes=attributes)
+    new_span.start_ns = time.time_ns()
+    try:
+        yield new_span
+    except BaseException as err:
+        new_span.error = repr(err)
+        raise
+    finally:
+        new_span.end_ns = time.time_ns()
+        _TRACER.spans.append(new_span)
+
+
+def record_span(
+    name: str, start_ns: int, end_ns: int, parent: Optional[Span], **attributes
+) -> None:
+    """
+    Records a span whose boundaries were measured elsewhere (e.g. the wire time of a message).
+    It does nothing if tracing is disabled or there is no parent.
+
+    :param name: Name of the stage
+    :param start_ns: Start of the stage in nanoseconds since the epoch
+    :param end_ns: End of the stage in nanoseconds since the epoch
+    :param parent: Enclosing span
+    :param attributes: Attributes of the span
+    """
+    if _TRACER is None or parent is None:
+        return
+
+    new_span = Span(parent.trace_id, name, parent.span_id, start_ns, attributes)
+    new_span.end_ns = end_ns
+    _TRACER.spans.append(new_span)
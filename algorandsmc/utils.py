@@ -1,15 +1,66 @@
 """
 File with DRY utilities.
 """
-from algosdk.v2client.algod import AlgodClient
-from algosdk.v2client.indexer import IndexerClient
+# The SDK is imported lazily to keep the import of the protocol modules cheap.
+# pylint: disable=import-outside-toplevel
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from algosdk.v2client.algod import AlgodClient
+    from algosdk.v2client.indexer import IndexerClient
 
-def get_sandbox_algod() -> AlgodClient:
+
+def get_sandbox_algod() -> "AlgodClient":
     """Returns lightweight object for a sandbox's algod client"""
+    from algosdk.v2client.algod import AlgodClient
+
     return AlgodClient("a" * 64, "http://localhost:4001")
 
 
-def get_sandbox_indexer() -> IndexerClient:
+def get_sandbox_indexer() -> "IndexerClient":
     """Returns lightweight object for a sandbox's indexer client"""
+    from algosdk.v2client.indexer import IndexerClient
+
     return IndexerClient("a" * 64, "http://localhost:8980")
+
+
+# Domain separation for the bytes signed by the sender to resume a channel.
+RESUME_PREFIX = b"smc-resume"
+
+
+def resume_message(msig_address: str, resume_counter: int) -> bytes:
+    """
+    Returns the bytes that the sender signs to prove its identity when resuming a channel.
+
+    :param msig_address: Algorand address of the msig of the channel
+    :param resume_counter: Counter of the resume request
+    :return: Bytes to be signed
+    """
+    from algosdk.encoding import decode_address
+
+    return (
+        RESUME_PREFIX + decode_address(msig_address) + resume_counter.to_bytes(8, "big")
+    )
+
+
+def encode_varuint(value: int) -> bytes:
+    """Encodes an unsigned integer as in the constant blocks of TEAL"""
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varuint(program: bytes, offset: int) -> tuple[int, int]:
+    """Returns the unsigned integer encoded at an offset of a TEAL bytecode and the offset that follows it"""
+    value = 0
+    shift = 0
+    while True:
+        byte = program[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
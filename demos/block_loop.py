@@ -1,16 +1,26 @@
 """
-This file implements a script that will submit a transaction periodically.
-This is used for the sandbox in dev mode to have the blocks advance at a predictable speed.
+This file implements a driver that makes the sandbox in dev mode advance by submitting filler transactions.
+In dev mode every transaction makes a new block, so the driver decides how fast rounds go by.
+It can keep a steady pace (one block per second by default), advance a number of rounds on demand as fast as
+ possible, and take requests from other processes through a websocket control API.
+It also runs against LocalAlgod, a stand-in node in the same process, for benchmarks that only need rounds.
 """
+import argparse
 import asyncio
+import json
 import logging
-from asyncio import sleep
+import time
+from asyncio import gather, get_running_loop, sleep
+from itertools import count
+from typing import Any, Optional
 
+import websockets
 from algosdk.account import address_from_private_key
 from algosdk.mnemonic import to_private_key
 from algosdk.transaction import PaymentTxn
 
 from algorandsmc.utils import get_sandbox_algod
+from demos.local_algod import LocalAlgod
 
 logging.root.setLevel(logging.INFO)
 
@@ -23,23 +33,166 @@ LOOP_PRIVATE_KEY_MNEMONIC = (
 LOOP_PRIVATE_KEY = to_private_key(LOOP_PRIVATE_KEY_MNEMONIC)
 LOOP_ADDR = address_from_private_key(LOOP_PRIVATE_KEY)
 
+# Filler transactions submitted at the same time when advancing as fast as possible.
+BATCH_SIZE = 32
+CONTROL_PORT = 55_001
 
-async def block_loop():
-    """Sends a dummy transaction every second to generate a new block"""
 
-    node_algod = get_sandbox_algod()
+class BlockDriver:
+    """Advances the chain by submitting one filler transaction per round"""
 
-    while True:
-        sugg_params = node_algod.suggested_params()
-        node_algod.send_transaction(
-            PaymentTxn(LOOP_ADDR, sugg_params, LOOP_ADDR, 0).sign(LOOP_PRIVATE_KEY)
-        )
-        logging.info("Block advanced.")
-        await sleep(1.0)
+    def __init__(self, node_algod: Any, batch_size: int = BATCH_SIZE):
+        self.node_algod = node_algod
+        self.batch_size = batch_size
+        # Fillers would have the same id within a round without a distinct note.
+        self._notes = count()
+
+    def _filler(self, sugg_params) -> Any:
+        """Returns a signed transaction that only makes a new block"""
+        return PaymentTxn(
+            LOOP_ADDR,
+            sugg_params,
+            LOOP_ADDR,
+            0,
+            note=next(self._notes).to_bytes(8, "big"),
+        ).sign(LOOP_PRIVATE_KEY)
+
+    async def last_round(self) -> int:
+        """Returns the last round of the chain"""
+        status = await get_running_loop().run_in_executor(None, self.node_algod.status)
+        return status["last-round"]
+
+    async def advance(self, rounds: int, rate: Optional[float] = None) -> int:
+        """
+        Advances the chain by a number of rounds.
+
+        :param rounds: Rounds to be made
+        :param rate: Rounds per second. As fast as possible if not given
+        :return: Last round of the chain
+        """
+        return await self.advance_to(await self.last_round() + rounds, rate)
+
+    async def advance_to(self, target_round: int, rate: Optional[float] = None) -> int:
+        """
+        Advances the chain until a round.
+
+        :param target_round: Round to be reached
+        :param rate: Rounds per second. As fast as possible if not given
+        :return: Last round of the chain
+        """
+        loop = get_running_loop()
+        batch_size = 1 if rate else self.batch_size
+        last_round = await self.last_round()
+        while last_round < target_round:
+            time_start = loop.time()
+            # Clients are blocking, so a batch is submitted from multiple threads.
+            sugg_params = await loop.run_in_executor(
+                None, self.node_algod.suggested_params
+            )
+            batch = [
+                self._filler(sugg_params)
+                for _ in range(min(batch_size, target_round - last_round))
+            ]
+            await gather(
+                *(
+                    loop.run_in_executor(None, self.node_algod.send_transaction, txn)
+                    for txn in batch
+                )
+            )
+            last_round = await self.last_round()
+            if rate:
+                await sleep(max(0.0, time_start + 1 / rate - loop.time()))
+        return last_round
+
+    async def run(self, rate: float = 1.0) -> None:
+        """
+        Keeps advancing the chain at a steady pace until cancelled.
+
+        :param rate: Rounds per second
+        """
+        while True:
+            last_round = await self.advance(1, rate)
+            logging.info("Block advanced to %s.", last_round)
+
+    async def control(self, websocket) -> None:
+        """
+        Serves the control API. Each request is a JSON object with either
+         {"advance": rounds} or {"advance-to": round}, an optional "rate" in rounds per second,
+         or {} to only ask for the last round. The response is {"last-round": round}.
+
+        :param websocket:
+        """
+        async for message in websocket:
+            request = json.loads(message)
+            rate = request.get("rate")
+            if "advance" in request:
+                last_round = await self.advance(int(request["advance"]), rate)
+            elif "advance-to" in request:
+                last_round = await self.advance_to(int(request["advance-to"]), rate)
+            else:
+                last_round = await self.last_round()
+            await websocket.send(json.dumps({"last-round": last_round}))
+
+
+async def advance_remote(
+    rounds: int, rate: Optional[float] = None, port: int = CONTROL_PORT
+) -> int:
+    """
+    Asks a running block driver to advance the chain.
+
+    :param rounds: Rounds to be made
+    :param rate: Rounds per second. As fast as possible if not given
+    :param port: Port of the control API
+    :return: Last round of the chain
+    """
+    # pylint: disable-next=no-member
+    async with websockets.connect(f"ws://localhost:{port}") as websocket:
+        await websocket.send(json.dumps({"advance": rounds, "rate": rate}))
+        return json.loads(await websocket.recv())["last-round"]
+
+
+async def block_loop(rate: float = 1.0, port: int = CONTROL_PORT):
+    """Advances the sandbox at a steady pace and serves the control API"""
+    block_driver = BlockDriver(get_sandbox_algod())
+
+    # pylint: disable-next=no-member
+    async with websockets.serve(block_driver.control, "localhost", port):
+        if rate > 0:
+            await block_driver.run(rate)
+        else:
+            # Rounds only advance on demand.
+            await asyncio.Future()
+
+
+async def measure(rounds: int, local: bool) -> None:
+    """Measures how fast the driver can advance the chain"""
+    block_driver = BlockDriver(LocalAlgod() if local else get_sandbox_algod())
+
+    time_start = time.perf_counter()
+    last_round = await block_driver.advance(rounds)
+    elapsed = time.perf_counter() - time_start
+
+    print(f"Advanced {rounds} rounds to {last_round} in {elapsed:.2f} s")
+    print(f"{rounds / elapsed:.0f} rounds per second")
+
+
+def main() -> None:
+    """Entry point of the block driver"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=float, default=1.0, help="0 for on demand only")
+    parser.add_argument("--port", type=int, default=CONTROL_PORT)
+    parser.add_argument("--measure", type=int, metavar="ROUNDS")
+    parser.add_argument("--local", action="store_true", help="Use LocalAlgod")
+    args = parser.parse_args()
+
+    if args.measure:
+        asyncio.run(measure(args.measure, args.local))
+    else:
+        asyncio.run(block_loop(args.rate, args.port))
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(block_loop())
+        main()
     except KeyboardInterrupt:
         pass
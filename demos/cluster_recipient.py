@@ -0,0 +1,90 @@
+"""
+This file implements a demo for a cluster of honest recipients behind a router.
+Start the router and any number of nodes, each in its own process:
+    python -m demos.cluster_recipient --router
+    python -m demos.cluster_recipient --node-id a --port 55010
+    python -m demos.cluster_recipient --node-id b --port 55011
+Senders connect to the router on the usual port. Stopping a node (Ctrl+C) hands off its channels to the others,
+ and senders that reconnect (e.g. demos/reconnecting_sender.py) resume them on the new owner.
+"""
+import argparse
+import asyncio
+import logging
+
+import websockets
+
+from algorandsmc.cluster import ClusterNode, ClusterRouter, SQLiteRegistry
+from algorandsmc.journal import JournalWriter
+from algorandsmc.recipient import RECIPIENT_ADDR
+from demos import honest_recipient
+
+REGISTRY_PATH = "cluster.sqlite"
+ROUTER_PORT = 55_000
+
+
+async def node(node_id: str, port: int, registry_path: str) -> None:
+    """Serves channels as a node of the cluster until cancelled"""
+    logging.info("recipient: %s (node %s)", RECIPIENT_ADDR, node_id)
+    honest_recipient.JOURNAL = JournalWriter(f"payments.{node_id}.journal")
+    cluster_node = ClusterNode(
+        node_id,
+        f"ws://localhost:{port}",
+        SQLiteRegistry(registry_path),
+        on_adopt=honest_recipient.schedule_settlement,
+    )
+    honest_recipient.CLUSTER = cluster_node
+
+    await cluster_node.join()
+    monitor = asyncio.create_task(cluster_node.monitor())
+    sweeper = asyncio.create_task(honest_recipient.sweep_exposure())
+    try:
+        # pylint: disable-next=no-member
+        async with websockets.serve(
+            honest_recipient.honest_recipient, "localhost", port
+        ):
+            await asyncio.Future()
+    finally:
+        monitor.cancel()
+        sweeper.cancel()
+        await cluster_node.leave()
+        await honest_recipient.JOURNAL.close()
+
+
+async def router(port: int, registry_path: str) -> None:
+    """Relays senders to the nodes of the cluster until cancelled"""
+    # pylint: disable-next=no-member
+    cluster_router = ClusterRouter(SQLiteRegistry(registry_path), websockets.connect)
+
+    await cluster_router.refresh()
+    monitor = asyncio.create_task(cluster_router.monitor())
+    try:
+        # pylint: disable-next=no-member
+        async with websockets.serve(cluster_router.route, "localhost", port):
+            await asyncio.Future()
+    finally:
+        monitor.cancel()
+
+
+def main() -> None:
+    """Entry point of the demo"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--router", action="store_true")
+    parser.add_argument("--node-id")
+    parser.add_argument("--port", type=int, default=ROUTER_PORT)
+    parser.add_argument("--registry", default=REGISTRY_PATH)
+    args = parser.parse_args()
+
+    if args.router:
+        coroutine = router(args.port, args.registry)
+    elif args.node_id:
+        coroutine = node(args.node_id, args.port, args.registry)
+    else:
+        parser.error("Either --router or --node-id is required.")
+    try:
+        asyncio.run(coroutine)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
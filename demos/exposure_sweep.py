@@ -0,0 +1,62 @@
+"""
+We will measure the exposure sweep of the recipient over a large number of open channels.
+Channels get random deadlines, accepted amounts and balances (some of them undercollateralized).
+The script fails if the median sweep takes longer than the budget.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from algorandsmc.exposure import ExposureBook
+
+CHANNELS = 100_000
+RUNS = 200
+# Median seconds that a sweep can take.
+SWEEP_BUDGET_SECONDS = 0.001
+LAST_ROUND = 1_000_000
+
+
+def build_book(channels: int) -> ExposureBook:
+    """Book of channels with random state"""
+    rng = random.Random(0)
+    book = ExposureBook()
+    for index in range(channels):
+        msig_address = f"CHANNEL{index:058d}"
+        book.track(msig_address, LAST_ROUND + rng.randrange(0, 5_000))
+        balance = rng.randrange(1_000_000, 10_000_000)
+        book.update(
+            msig_address,
+            accepted=rng.randrange(0, int(balance * 1.01)),
+            balance=balance,
+        )
+    return book
+
+
+def main() -> int:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels", type=int, default=CHANNELS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    book = build_book(args.channels)
+    timings = []
+    for run in range(args.runs):
+        time_start = time.perf_counter()
+        report = book.sweep(LAST_ROUND + run % 100)
+        timings.append(time.perf_counter() - time_start)
+    median = statistics.median(timings)
+
+    print(report)
+    print(f"Settle first: {report.settle_first[:3]}")
+    print(
+        f"Sweep of {args.channels} channels: median {median * 1e6:.0f} us, "
+        f"budget {SWEEP_BUDGET_SECONDS * 1e6:.0f} us"
+    )
+    return 0 if median <= SWEEP_BUDGET_SECONDS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,91 +4,270 @@ This file implements a demo for an honest recipient.
 import asyncio
 import logging
 from asyncio import TimeoutError as AsyncTimeoutError
-from asyncio import wait_for
+from asyncio import sleep, wait_for
 from typing import Optional
 
 import websockets
 from websockets.exceptions import ConnectionClosed
 
-from algorandsmc.errors import SMCBadFunding, SMCBadSetup, SMCBadSignature
-from algorandsmc.recipient import RECIPIENT_ADDR, receive_payment, settle, setup_channel
+from algorandsmc.admission import AdmissionControl
+from algorandsmc.cluster import ClusterNode
+from algorandsmc.errors import (
+    SMCBadFunding,
+    SMCBadResume,
+    SMCBadSetup,
+    SMCBadSignature,
+    SMCRetryLater,
+)
+from algorandsmc.exposure import ExposureBook
+from algorandsmc.journal import JournalWriter
+from algorandsmc.recipient import (
+    OPEN_CHANNELS,
+    RECIPIENT_ADDR,
+    RecipientChannel,
+    acknowledge_payment,
+    close_channel,
+    open_channel,
+    receive_payment,
+    resume_channel,
+    settle,
+    setup_channel,
+)
 
 # pylint: disable-next=no-name-in-module
 from algorandsmc.smc_pb2 import Payment, SMCMethod
 from algorandsmc.utils import get_sandbox_algod
 
+# Keeps a reference to the settlement tasks while they run.
+SETTLEMENTS: set[asyncio.Task] = set()
+# Every accepted payment is recorded here. It is acknowledged without waiting for the disk, and settlements wait
+#  for the payments to be durable.
+JOURNAL_PATH = "payments.journal"
+JOURNAL: Optional[JournalWriter] = None
+# Limits shared by all connections.
+ADMISSION = AdmissionControl()
+# Node of a cluster that this recipient is part of, if any (see demos/cluster_recipient.py).
+CLUSTER: Optional[ClusterNode] = None
+# Exposure of all the open channels, swept on every new round.
+EXPOSURE = ExposureBook()
+
+
+async def settle_before_refund(channel: RecipientChannel) -> None:
+    """
+    Settles the channel when there are 5 blocks left before the refund condition comes online or as soon as it is
+     closed because the sender misbehaved.
+    Until then, the sender can resume the channel on a new connection.
+
+    :param channel: State of the channel
+    """
+    node_algod = get_sandbox_algod()
+
+    try:
+        # We want to have at least 5 blocks before sending the highest paying transaction.
+        while (
+            channel.msig_address in OPEN_CHANNELS
+            and node_algod.status()["last-round"]
+            < channel.accepted_setup.minRefundBlock - 5
+        ):
+            await sleep(2.0)
+        close_channel(channel)
+        if CLUSTER is not None and channel.msig_address in CLUSTER.handed_off:
+            # Another node of the cluster owns the channel now.
+            return
+
+        if channel.last_payment:
+            if JOURNAL is not None:
+                await JOURNAL.flush()
+            # Only a few rounds are left, so the fee is raised if the network is congested.
+            await settle(
+                channel.accepted_setup,
+                channel.last_payment,
+                settlement=channel.prepared_settlement(),
+                fee_pooled=True,
+            )
+    finally:
+        EXPOSURE.untrack(channel.msig_address)
+
+
+def log_journal_error(durable: asyncio.Future) -> None:
+    """Logs a payment that could not be made durable"""
+    if not durable.cancelled() and durable.exception() is not None:
+        logging.error("Payment not journaled. %s", durable.exception())
+
+
+def track_exposure(channel: RecipientChannel) -> None:
+    """Adds the channel to the exposure of the recipient once it is set up, resumed or adopted"""
+    EXPOSURE.track(channel.msig_address, channel.accepted_setup.minRefundBlock)
+    EXPOSURE.update(
+        channel.msig_address,
+        accepted=channel.last_payment.cumulativeAmount
+        if channel.last_payment
+        else None,
+        balance=channel.msig_balance or None,
+    )
+
+
+def schedule_settlement(channel: RecipientChannel) -> None:
+    """Settles the channel in the background (see settle_before_refund)"""
+    track_exposure(channel)
+    settlement = asyncio.create_task(settle_before_refund(channel))
+    SETTLEMENTS.add(settlement)
+    settlement.add_done_callback(SETTLEMENTS.discard)
+
+
+async def start_channel(websocket) -> Optional[RecipientChannel]:
+    """
+    Sets up a new channel or resumes a known one, as asked by the first message of a connection.
+
+    :param websocket:
+    :return: State of the channel. None if it was refused
+    """
+    method = SMCMethod.FromString(await websocket.recv())
+    if method.method == SMCMethod.SETUP_CHANNEL:
+        try:
+            accepted_setup = await setup_channel(
+                websocket, admission=ADMISSION, known_channels=CLUSTER
+            )
+        except (SMCBadSetup, SMCRetryLater) as err:
+            logging.error("%s", err)
+            return None
+        channel = open_channel(websocket, accepted_setup)
+        # Settlement does not depend on this connection because the channel can be resumed on a new one.
+        schedule_settlement(channel)
+        return channel
+    if method.method == SMCMethod.RESUME_CHANNEL:
+        try:
+            # Channels handed off by another node of the cluster are adopted here.
+            channel = await resume_channel(
+                websocket, adopt=CLUSTER.adopt if CLUSTER is not None else None
+            )
+        except SMCBadResume as err:
+            logging.error("%s", err)
+            return None
+        track_exposure(channel)
+        return channel
+    raise ValueError("Expected channel setup or resume method.")
+
+
+def record_payment(channel: RecipientChannel, payment: Payment) -> None:
+    """Keeps the state of the channel, its exposure and the journal up to date with an accepted payment"""
+    logging.info("Payment accepted.")
+    channel.last_payment = payment
+    # Keeps the settlement of the latest payment ready for the deadline.
+    channel.prepare_settlement()
+    EXPOSURE.update(
+        channel.msig_address,
+        accepted=payment.cumulativeAmount,
+        balance=channel.msig_balance,
+    )
+    if JOURNAL is not None:
+        JOURNAL.add(channel.msig_address, payment).add_done_callback(log_journal_error)
+
 
 async def honest_recipient(websocket) -> None:
     """
     Implements the time-dependent state machine for the honest recipient side.
-    This machine can handle setup, payments and settlement depending on the time related or sender related
+    This machine can handle setup, resumption, payments and settlement depending on the time related or sender related
     events/conditions.
 
     :param websocket:
     """
-    node_algod = get_sandbox_algod()
-    method = SMCMethod.FromString(await websocket.recv())
-    if not method.method == SMCMethod.SETUP_CHANNEL:
-        raise ValueError("Expected channel setup method.")
-
-    try:
-        accepted_setup = await setup_channel(websocket)
-    except SMCBadSetup as err:
-        logging.error("%s", err)
+    channel = await start_channel(websocket)
+    if channel is None:
         return
 
-    last_payment: Optional[Payment] = None
+    # The recipient wants to keep accepting payments until the channel is closed or another connection takes over.
+    try:
+        while channel.websocket is websocket and channel.msig_address in OPEN_CHANNELS:
+            try:
+                method_message = await wait_for(websocket.recv(), 2.0)
+            except AsyncTimeoutError:
+                # No new payments last time we waited.
+                continue
+            except ConnectionClosed:
+                # Sender has closed websocket.
+                logging.error(
+                    "Sender has closed the websocket. The channel can still be resumed."
+                )
+                break
 
-    # The recipient wants to keep accepting payments but also monitor the lifetime of this
-    # channel to settle it before the refund condition comes online.
-    while True:
-        try:
-            method_message = await wait_for(websocket.recv(), 2.0)
-        except AsyncTimeoutError:
-            # No new payments last time we waited.
-            pass
-        except ConnectionClosed:
-            # Sender has closed websocket.
-            logging.error("Sender has closed the websocket.")
-            break
-        else:
             method = SMCMethod.FromString(method_message)
             if not method.method == SMCMethod.PAY:
                 logging.error("Expected payment method.")
+                close_channel(channel)
                 break
 
             try:
-                payment = await receive_payment(websocket, accepted_setup)
+                payment = await receive_payment(
+                    websocket, channel.accepted_setup, admission=ADMISSION
+                )
+            except SMCRetryLater:
+                # Sender was told to send the payment again later.
+                continue
             except (SMCBadSignature, SMCBadFunding) as err:
                 logging.error("Bad payment. %s", err)
+                close_channel(channel)
                 break
-            else:
-                if (
-                    last_payment
-                    and not payment.cumulativeAmount > last_payment.cumulativeAmount
-                ):
-                    # Sender misbehaved.
-                    logging.error("Expected increasing payments.")
-                    break
-                logging.info("Payment accepted.")
-                last_payment = payment
-
-        chain_status = node_algod.status()
-        # We want to have at least 5 blocks before sending the highest paying transaction.
-        if chain_status["last-round"] >= accepted_setup.minRefundBlock - 5:
-            break
 
-    if last_payment:
-        await settle(accepted_setup, last_payment)
+            if channel.msig_address not in OPEN_CHANNELS:
+                # Settlement started in the meantime.
+                break
+            if (
+                channel.last_payment
+                and not payment.cumulativeAmount > channel.last_payment.cumulativeAmount
+            ):
+                # Sender misbehaved.
+                logging.error("Expected increasing payments.")
+                close_channel(channel)
+                break
+            record_payment(channel, payment)
+            await acknowledge_payment(websocket, payment)
+    finally:
+        if channel.websocket is websocket:
+            channel.websocket = None
+
+
+async def sweep_exposure() -> None:
+    """Reports the exposure of all the open channels on every new round until cancelled"""
+    node_algod = get_sandbox_algod()
+    loop = asyncio.get_running_loop()
+
+    # Clients are blocking.
+    last_round = (await loop.run_in_executor(None, node_algod.status))["last-round"]
+    while True:
+        status = await loop.run_in_executor(
+            None, node_algod.status_after_block, last_round
+        )
+        last_round = status["last-round"]
+        report = EXPOSURE.sweep(last_round)
+        if report.at_risk or report.undercollateralized:
+            logging.warning("%s", report)
+            for msig_address, blocks_to_deadline, accepted in report.settle_first:
+                logging.warning(
+                    "Settle %s first: %s blocks left for %s.",
+                    msig_address,
+                    blocks_to_deadline,
+                    accepted,
+                )
+        else:
+            logging.info("%s", report)
 
 
 async def main():
     """Entry point for the async flow"""
+    global JOURNAL  # pylint: disable=global-statement
     logging.info("recipient: %s", RECIPIENT_ADDR)
+    JOURNAL = JournalWriter(JOURNAL_PATH)
+    sweeper = asyncio.create_task(sweep_exposure())
 
-    # pylint: disable-next=no-member
-    async with websockets.serve(honest_recipient, "localhost", 55_000):
-        await asyncio.Future()
+    try:
+        # pylint: disable-next=no-member
+        async with websockets.serve(honest_recipient, "localhost", 55_000):
+            await asyncio.Future()
+    finally:
+        sweeper.cancel()
+        if JOURNAL is not None:
+            await JOURNAL.close()
 
 
 if __name__ == "__main__":
@@ -18,12 +18,15 @@ async def honest_sender() -> None:
     """Demo of an honest sender"""
     setup_proposal = setupProposal(
         # sender=SENDER_ADDR, nonce=1024, minRefundBlock=10_000, maxRefundBlock=10_500
-        sender=SENDER_ADDR, nonce=1024, minRefundBlock=2150, maxRefundBlock=2200
+        sender=SENDER_ADDR,
+        nonce=1024,
+        minRefundBlock=2150,
+        maxRefundBlock=2200,
     )
 
     # pylint: disable-next=no-member
     async with websockets.connect("ws://localhost:55000") as websocket:
-        setup_response = await setup_channel(websocket, setup_proposal)
+        setup_proposal, setup_response = await setup_channel(websocket, setup_proposal)
         await fund(setup_proposal, setup_response, 10_000_000)
         await pay(websocket, setup_proposal, setup_response, 1_000_000)
         await sleep(1.0)
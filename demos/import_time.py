@@ -0,0 +1,87 @@
+"""
+We will measure the cold start cost of the protocol modules by importing them in fresh interpreters.
+The script fails if the cost goes over the budget or if a heavy module is imported eagerly.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Median cost of importing the protocol modules on top of a bare interpreter.
+IMPORT_BUDGET_SECONDS = 0.1
+RUNS = 15
+
+PROTOCOL_MODULES = ["algorandsmc.sender", "algorandsmc.recipient"]
+# These must only be imported when a function actually needs them.
+LAZY_MODULES = ["pyteal", "algosdk", "numpy", "websockets", "json"]
+
+PROBE = """
+import sys, time
+time_start = time.perf_counter()
+{imports}
+time_end = time.perf_counter()
+print(time_end - time_start)
+print(",".join(name for name in {lazy_modules!r} if name in sys.modules))
+"""
+
+
+def measure_once(modules: list[str]) -> tuple[float, list[str]]:
+    """
+    Imports modules in a fresh interpreter.
+
+    :param modules: Modules to be imported
+    :return: Elapsed seconds and heavy modules that were imported along the way
+    """
+    probe = PROBE.format(
+        imports="\n".join(f"import {module}" for module in modules),
+        lazy_modules=LAZY_MODULES,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, check=True, text=True
+    ).stdout.splitlines()
+    elapsed = float(output[0])
+    eager = [name for name in output[1].split(",") if name] if len(output) > 1 else []
+    return elapsed, eager
+
+
+def import_time(runs: int = RUNS) -> tuple[float, list[str]]:
+    """
+    Median import time of the protocol modules across multiple cold starts.
+
+    :param runs: Number of fresh interpreters
+    :return: Median elapsed seconds and heavy modules that were imported eagerly
+    """
+    timings = []
+    eager: set[str] = set()
+    for _ in range(runs):
+        elapsed, eager_run = measure_once(PROTOCOL_MODULES)
+        timings.append(elapsed)
+        eager.update(eager_run)
+    return statistics.median(timings), sorted(eager)
+
+
+def main() -> int:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    median, eager = import_time(args.runs)
+
+    print(f"import {', '.join(PROTOCOL_MODULES)}")
+    print(f"{median * 1000:.1f} ms median over {args.runs} runs")
+    print(f"{args.budget * 1000:.1f} ms budget")
+
+    failed = False
+    if eager:
+        print(f"FAIL: eagerly imported {', '.join(eager)}")
+        failed = True
+    if median > args.budget:
+        print("FAIL: import time is over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
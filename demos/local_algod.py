@@ -0,0 +1,238 @@
+"""
+This file implements stand-ins for an algod in dev mode and an indexer that live in the same process.
+Every submitted transaction (or group) is accepted and makes a new round, as in the dev mode of the sandbox.
+Nothing is validated or executed, so it is only good for code that cares about rounds (e.g. the block driver and
+ schedulers that wait for refund windows), not for the outcome of transactions.
+The SMC programs can be compiled too, so that the protocol functions run end to end without a node (e.g. in the
+ memory benchmark). The bytecode is valid but it is not guaranteed to be the same that algod would produce.
+"""
+import base64
+import struct
+import threading
+from typing import Any
+
+from algosdk.encoding import checksum, decode_address, encode_address
+from algosdk.error import AlgodHTTPError, IndexerHTTPError
+from algosdk.transaction import SuggestedParams
+
+from algorandsmc.utils import encode_varuint
+
+# Rounds in which a suggested transaction is valid.
+VALIDITY_WINDOW = 1_000
+MIN_TXN_FEE = 1_000
+GENESIS_ID = "local-v1"
+GENESIS_HASH = base64.b64encode(b"local".ljust(32, b"\x00")).decode()
+# Balance of every account as seen by LocalIndexer.
+DEFAULT_BALANCE = 10**15
+
+# Subset of the TEAL v2 opcodes that the SMC artifacts use.
+OPCODES = {
+    "err": 0x00,
+    "<": 0x0C,
+    ">": 0x0D,
+    "<=": 0x0E,
+    ">=": 0x0F,
+    "&&": 0x10,
+    "||": 0x11,
+    "==": 0x12,
+    "!=": 0x13,
+    "!": 0x14,
+    "return": 0x43,
+}
+BRANCHES = {"bnz": 0x40, "bz": 0x41, "b": 0x42}
+TXN_FIELDS = {
+    "Sender": 0,
+    "Fee": 1,
+    "FirstValid": 2,
+    "LastValid": 4,
+    "Receiver": 7,
+    "Amount": 8,
+    "CloseRemainderTo": 9,
+    "TypeEnum": 16,
+    "RekeyTo": 32,
+}
+GLOBAL_FIELDS = {"MinTxnFee": 0, "ZeroAddress": 3}
+TYPE_ENUMS = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+
+
+def _constants(lines: list[str]) -> tuple[list[int], list[bytes]]:
+    """Returns the integer and byte string constants of a program, in order of appearance"""
+    ints: list[int] = []
+    byte_strings: list[bytes] = []
+    for line in lines:
+        opcode, _, argument = line.partition(" ")
+        if opcode == "int":
+            value = TYPE_ENUMS[argument] if argument in TYPE_ENUMS else int(argument)
+            if value not in ints:
+                ints.append(value)
+        elif opcode == "addr" and decode_address(argument) not in byte_strings:
+            byte_strings.append(decode_address(argument))
+    if len(ints) > 4 or len(byte_strings) > 4:
+        raise ValueError("Too many constants for the local assembler.")
+    return ints, byte_strings
+
+
+def _encode(
+    line: str,
+    offset: int,
+    labels: dict[str, int],
+    ints: list[int],
+    byte_strings: list[bytes],
+) -> bytes:
+    """Returns the bytecode of an instruction at an offset of the code"""
+    opcode, _, argument = line.partition(" ")
+    if opcode == "txn":
+        return bytes([0x31, TXN_FIELDS[argument]])
+    if opcode == "global":
+        return bytes([0x32, GLOBAL_FIELDS[argument]])
+    if opcode == "int":
+        value = TYPE_ENUMS[argument] if argument in TYPE_ENUMS else int(argument)
+        # intc_0 to intc_3.
+        return bytes([0x22 + ints.index(value)])
+    if opcode == "addr":
+        return bytes([0x28 + byte_strings.index(decode_address(argument))])
+    if opcode in BRANCHES:
+        return bytes([BRANCHES[opcode]]) + struct.pack(
+            ">h", labels[argument] - (offset + 3)
+        )
+    return bytes([OPCODES[opcode]])
+
+
+def assemble(teal: str) -> bytes:
+    """
+    Assembles the subset of TEAL v2 used by the SMC artifacts.
+
+    :param teal: TEAL code without template variables
+    :return: Bytecode
+    """
+    lines = [line.split("//", 1)[0].strip() for line in teal.splitlines()]
+    lines = [line for line in lines if line and not line.startswith("#pragma")]
+    ints, byte_strings = _constants(lines)
+
+    # Every instruction has a fixed size, so labels can be resolved before emitting.
+    labels = {}
+    instructions = []
+    offset = 0
+    for line in lines:
+        if line.endswith(":"):
+            labels[line[:-1]] = offset
+            continue
+        opcode = line.partition(" ")[0]
+        instructions.append((offset, line))
+        offset += 3 if opcode in BRANCHES else 2 if opcode in ("txn", "global") else 1
+
+    header = bytearray([2])
+    if ints:
+        header += b"\x20" + encode_varuint(len(ints))
+        header += b"".join(encode_varuint(value) for value in ints)
+    if byte_strings:
+        header += b"\x26" + encode_varuint(len(byte_strings))
+        header += b"".join(encode_varuint(len(value)) + value for value in byte_strings)
+
+    code = bytearray()
+    for offset, line in instructions:
+        code += _encode(line, offset, labels, ints, byte_strings)
+    return bytes(header + code)
+
+
+class LocalAlgod:
+    """Subset of AlgodClient used by the demos, answered from memory"""
+
+    def __init__(self, start_round: int = 1):
+        self.last_round = start_round
+        # Transaction ids by the round in which they were confirmed, to refuse duplicates like a node would.
+        self.confirmed: dict[str, int] = {}
+        self._round_advanced = threading.Condition()
+
+    def health(self) -> None:
+        """Always healthy"""
+
+    def status(self) -> dict:
+        """Returns the fields of the node status that the demos use"""
+        return {"last-round": self.last_round, "time-since-last-round": 0}
+
+    def suggested_params(self) -> SuggestedParams:
+        """Returns parameters valid from the current round"""
+        return SuggestedParams(
+            fee=0,
+            first=self.last_round,
+            last=self.last_round + VALIDITY_WINDOW,
+            gh=GENESIS_HASH,
+            gen=GENESIS_ID,
+            min_fee=MIN_TXN_FEE,
+        )
+
+    def send_transaction(self, txn: Any, **kwargs) -> str:
+        """
+        Confirms a signed transaction in a new round.
+
+        :param txn: Signed transaction
+        :return: Transaction id
+        """
+        return self.send_transactions([txn], **kwargs)
+
+    def send_transactions(self, txns: list, **_kwargs) -> str:
+        """
+        Confirms a group of signed transactions in a new round.
+
+        :param txns: Signed transactions of the group
+        :return: Transaction id of the first transaction
+        """
+        txids = [txn.get_txid() for txn in txns]
+        with self._round_advanced:
+            for txid in txids:
+                if txid in self.confirmed:
+                    raise AlgodHTTPError(f"transaction already in ledger: {txid}", 400)
+            self.last_round += 1
+            for txid in txids:
+                self.confirmed[txid] = self.last_round
+            # Forgets transactions that cannot be submitted again anyway.
+            if len(self.confirmed) > 2 * VALIDITY_WINDOW:
+                self.confirmed = {
+                    txid: confirmed_round
+                    for txid, confirmed_round in self.confirmed.items()
+                    if confirmed_round > self.last_round - VALIDITY_WINDOW
+                }
+            self._round_advanced.notify_all()
+        return txids[0]
+
+    def compile(self, source: str, **_kwargs) -> dict:
+        """Assembles a program and returns it with the address of its contract account"""
+        program = assemble(source)
+        return {
+            "hash": encode_address(checksum(b"Program" + program)),
+            "result": base64.b64encode(program).decode(),
+        }
+
+    def pending_transaction_info(self, txid: str, **_kwargs) -> dict:
+        """Returns the confirmation of a transaction"""
+        if txid not in self.confirmed:
+            raise AlgodHTTPError(f"could not find the transaction: {txid}", 404)
+        return {"confirmed-round": self.confirmed[txid], "pool-error": ""}
+
+    def status_after_block(self, block_num: int, **_kwargs) -> dict:
+        """Waits until the round after block_num and returns the status"""
+        with self._round_advanced:
+            self._round_advanced.wait_for(lambda: self.last_round > block_num)
+        return self.status()
+
+
+class LocalIndexer:
+    """Subset of IndexerClient used by the demos, answered from memory"""
+
+    def __init__(self, default_balance: int = DEFAULT_BALANCE):
+        # Every account holds the default balance unless set otherwise. None means unknown to the indexer.
+        self.default_balance = default_balance
+        self.balances: dict[str, Any] = {}
+
+    def health(self) -> None:
+        """Always healthy"""
+
+    def account_info(self, address: str, **_kwargs) -> dict:
+        """Returns the balance of an account"""
+        balance = self.balances.get(address, self.default_balance)
+        if balance is None:
+            raise IndexerHTTPError(f"no accounts found for address {address}", 404)
+        return {
+            "account": {"address": address, "amount-without-pending-rewards": balance}
+        }
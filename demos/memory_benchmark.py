@@ -0,0 +1,269 @@
+"""
+We will measure the memory taken by the payment path on both sides of a channel.
+The node and the websocket are stand-ins in the same process, so only the SMC code and the SDK are measured.
+For each side, the benchmark reports:
+ - the bytes allocated per payment, i.e. the peak of traced memory while a payment is handled,
+ - the bytes retained per payment, which should stay close to zero unless something accumulates,
+ - the bytes retained per open channel.
+Results are compared with a stored baseline, and the benchmark fails if any of them grew past the tolerance.
+Run it with --update-baseline after a change that is expected to move the numbers, and commit the baseline.
+Allocations depend on the version of Python and of the libraries, so the baseline should be recorded with the
+ locked environment.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import platform
+import statistics
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable
+
+from algorandsmc import recipient, sender
+from algorandsmc.nodes import EndpointPool, NodePool
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import setupProposal, setupResponse
+from algorandsmc.templates.artifacts import ARTIFACTS_VERSION
+from demos.local_algod import LocalAlgod, LocalIndexer
+
+BASELINE_PATH = Path(__file__).parent / "memory_baseline.json"
+# Relative growth of a metric that is tolerated before failing.
+TOLERANCE = 0.10
+# Absolute growth that is always tolerated, so that metrics close to zero don't fail on noise.
+SLACK_BYTES = 256
+
+PAYMENTS = 500
+CHANNELS = 200
+# Payments handled before measuring, so that caches and lazy imports are not counted.
+WARMUP = 20
+MIN_REFUND_BLOCK = 10_000
+MAX_REFUND_BLOCK = 10_500
+
+
+class MemoryWebsocket:
+    """Websocket stand-in that receives a given sequence of messages and drops what is sent"""
+
+    def __init__(self, messages: Iterable[bytes] = ()):
+        # Messages are not copied or removed, so that receiving them doesn't free memory during a measure.
+        self._messages = iter(messages)
+
+    async def send(self, message: bytes) -> None:
+        """Drops a message"""
+
+    async def recv(self) -> bytes:
+        """Returns the next message"""
+        return next(self._messages)
+
+    async def close(self) -> None:
+        """Nothing to close"""
+
+
+class CollectingWebsocket(MemoryWebsocket):
+    """Websocket stand-in that keeps what is sent"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent: list[bytes] = []
+
+    async def send(self, message: bytes) -> None:
+        self.sent.append(message)
+
+
+def local_node_pool() -> NodePool:
+    """Node pool made of stand-ins in the same process"""
+    return NodePool(EndpointPool([LocalAlgod()]), EndpointPool([LocalIndexer()]))
+
+
+def proposal(nonce: int) -> setupProposal:
+    """Setup proposal of the benchmark sender"""
+    return setupProposal(
+        sender=sender.SENDER_ADDR,
+        nonce=nonce,
+        minRefundBlock=MIN_REFUND_BLOCK,
+        maxRefundBlock=MAX_REFUND_BLOCK,
+        artifactsVersion=ARTIFACTS_VERSION,
+    )
+
+
+def traced() -> int:
+    """Bytes of traced memory currently allocated"""
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def measure_payments(
+    handle: Callable[[int], Awaitable[None]], payments: int
+) -> dict[str, float]:
+    """
+    Measures the memory of a payment handler.
+
+    :param handle: Handles the payment of a cumulative amount
+    :param payments: Number of measured payments
+    :return: Bytes allocated and retained per payment
+    """
+    for amount in range(1, WARMUP + 1):
+        await handle(amount)
+    gc.collect()
+
+    peaks = []
+    start = traced()
+    for amount in range(WARMUP + 1, WARMUP + payments + 1):
+        current = traced()
+        tracemalloc.reset_peak()
+        await handle(amount)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    gc.collect()
+
+    return {
+        "allocated_per_payment": statistics.median(peaks),
+        "retained_per_payment": (traced() - start) / payments,
+    }
+
+
+async def measure_sender(node_pool: NodePool, payments: int, channels: int) -> dict:
+    """Measures the sender side"""
+    setup_proposal = proposal(0)
+    setup_response = setupResponse(recipient=recipient.RECIPIENT_ADDR)
+    websocket = MemoryWebsocket()
+
+    async def handle(amount: int) -> None:
+        await sender.send_payment(
+            websocket, setup_proposal, setup_response, amount, node_pool=node_pool
+        )
+
+    results = await measure_payments(handle, payments)
+
+    # Responses of the recipient are prepared beforehand, so that only the sender is measured.
+    setup_proposals = [proposal(nonce) for nonce in range(1, channels + 1)]
+    websockets = [
+        MemoryWebsocket(
+            [recipient.accept_setup(setup_proposal, node_pool).SerializeToString()]
+        )
+        for setup_proposal in setup_proposals
+    ]
+    open_channels = []
+    gc.collect()
+    start = traced()
+    for websocket, setup_proposal in zip(websockets, setup_proposals):
+        setup_proposal, setup_response = await sender.setup_channel(
+            websocket, setup_proposal, node_pool
+        )
+        open_channels.append(
+            sender.SenderChannel(websocket, setup_proposal, setup_response, node_pool)
+        )
+    gc.collect()
+    results["retained_per_channel"] = (traced() - start) / channels
+
+    return results
+
+
+async def measure_recipient(node_pool: NodePool, payments: int, channels: int) -> dict:
+    """Measures the recipient side"""
+    setup_proposal = proposal(0)
+    # Payments are signed beforehand, so that only the recipient is measured.
+    signing_websocket = CollectingWebsocket()
+    setup_response = setupResponse(recipient=recipient.RECIPIENT_ADDR)
+    for amount in range(1, WARMUP + payments + 1):
+        await sender.send_payment(
+            signing_websocket,
+            setup_proposal,
+            setup_response,
+            amount,
+            node_pool=node_pool,
+        )
+    # Every payment is preceded by the method, which the recipient reads before receive_payment.
+    websocket = MemoryWebsocket(signing_websocket.sent[1::2])
+
+    async def handle(_amount: int) -> None:
+        payment = await recipient.receive_payment(websocket, setup_proposal, node_pool)
+        await recipient.acknowledge_payment(websocket, payment)
+
+    results = await measure_payments(handle, payments)
+
+    # Nonces of the sender measure are already known to the recipient.
+    websockets = [
+        MemoryWebsocket([proposal(nonce).SerializeToString()])
+        for nonce in range(channels + 1, 2 * channels + 1)
+    ]
+    gc.collect()
+    start = traced()
+    for websocket in websockets:
+        accepted_setup = await recipient.setup_channel(websocket, node_pool)
+        recipient.open_channel(websocket, accepted_setup, node_pool)
+    gc.collect()
+    results["retained_per_channel"] = (traced() - start) / channels
+
+    return results
+
+
+async def measure(payments: int, channels: int) -> dict:
+    """Runs all the measures"""
+    node_pool = local_node_pool()
+    tracemalloc.start()
+    try:
+        return {
+            "sender": await measure_sender(node_pool, payments, channels),
+            "recipient": await measure_recipient(node_pool, payments, channels),
+        }
+    finally:
+        tracemalloc.stop()
+
+
+def regressions(results: dict, baseline: dict) -> list[str]:
+    """Returns a description of each metric that grew past the tolerance"""
+    failures = []
+    for side, metrics in results.items():
+        for metric, value in metrics.items():
+            if metric not in baseline.get(side, {}):
+                continue
+            limit = baseline[side][metric] * (1 + TOLERANCE) + SLACK_BYTES
+            if value > limit:
+                failures.append(f"{side} {metric}: {value:.0f} B > {limit:.0f} B")
+    return failures
+
+
+def main() -> int:
+    """Entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=PAYMENTS)
+    parser.add_argument("--channels", type=int, default=CHANNELS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Store the results as baseline"
+    )
+    args = parser.parse_args()
+
+    # Log records would be measured and flood the output.
+    logging.disable(logging.INFO)
+    results = asyncio.run(measure(args.payments, args.channels))
+    for side, metrics in results.items():
+        for metric, value in metrics.items():
+            print(f"{side:<10} {metric:<22} {value:>10.0f} B")
+
+    if args.update_baseline:
+        args.baseline.write_text(
+            json.dumps({"python": platform.python_version()} | results, indent=4)
+            + "\n",
+            encoding="utf-8",
+        )
+        print(f"Baseline stored in {args.baseline}")
+        return 0
+
+    if not args.baseline.is_file():
+        print(f"No baseline in {args.baseline}. Run with --update-baseline first.")
+        return 1
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("python") != platform.python_version():
+        print(f"Baseline was recorded with Python {baseline.get('python')}.")
+
+    failures = regressions(results, baseline)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,45 +1,313 @@
 """
 We will measure and compare performances of pure L1 and L2 by letting a sequence of (confirmed) payments run for
 increasing time windows.
+In L1 mode, each payment is a PaymentTxn from sender to recipient that is submitted and waited for until confirmed.
+In L2 mode, each window opens and funds a new channel, then each payment is a pay() acknowledged by the recipient.
+For each mode and window, we report throughput, p50/p95/p99 latency and the fees paid on Layer-1.
+The L2 fees are read from the chain once the channel is settled: those of the funding, of the settlement and of the
+ rest of its group if the fee was pooled. The time to open the channel is reported apart.
+From these, we compute the break-even point: how many payments a channel must carry to be cheaper than L1.
+Results are printed and written to a JSON file.
+It needs the sandbox and a recipient (e.g. demos/honest_recipient.py) for the L2 mode.
+The recipient settles a channel a few rounds before its refund condition. With the sandbox in dev mode, --advance
+ makes the rounds up to it, as demos/block_loop.py does.
 """
+import argparse
 import asyncio
-import itertools
-import logging
+import json
+import math
 import time
-import timeit
-from asyncio import sleep
+from asyncio import get_running_loop, sleep
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
 
 import websockets
+from algosdk.transaction import PaymentTxn, wait_for_confirmation
 
-from algorandsmc.errors import SMCCannotBeRefunded
-from algorandsmc.sender import SENDER_ADDR, setup_channel, fund, pay, refund_channel
+from algorandsmc.channel_pool import CHANNEL_LIFETIME, REFUND_WINDOW, allocate_nonce
+from algorandsmc.nodes import default_node_pool
+from algorandsmc.recipient import RECIPIENT_ADDR
+from algorandsmc.sender import SENDER_ADDR, SENDER_PRIVATE_KEY, fund, pay, setup_channel
+
+# pylint: disable-next=no-name-in-module
 from algorandsmc.smc_pb2 import setupProposal
+from algorandsmc.templates import smc_msig
+from demos.block_loop import BlockDriver
+
+RECIPIENT_URI = "ws://localhost:55000"
+# Seconds of each time window.
+TIME_WINDOWS = [1.0, 2.0, 5.0, 10.0]
+RESULTS_PATH = "performance_results.json"
+# microalgos funding each channel of the L2 mode.
+CHANNEL_FUNDING = 10_000_000
+# microalgos of each L1 payment.
+L1_AMOUNT = 1
+# Seconds between two lookups of a channel that is not settled yet.
+SETTLEMENT_POLL = 2.0
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+async def run_window(
+    time_window: float, pay_once: Callable[[int], Awaitable[None]]
+) -> dict:
+    """
+    Makes payments one after the other until the time window is over.
+
+    :param time_window: Seconds of the window
+    :param pay_once: Makes a payment given its sequence number and returns when it is confirmed
+    :return: Throughput and latency of the payments
+    """
+    latencies = []
+    time_start = time.perf_counter()
+    while time.perf_counter() - time_start < time_window:
+        payment_start = time.perf_counter()
+        await pay_once(len(latencies) + 1)
+        latencies.append(time.perf_counter() - payment_start)
+    elapsed = time.perf_counter() - time_start
+
+    return {
+        "window": time_window,
+        "payments": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def sender_l1(time_window: float) -> dict:
+    """Performance of a sender paying directly on Layer-1"""
+    loop = get_running_loop()
+    node_algod = default_node_pool().algod
+    fees = 0
 
+    def pay_l1(_sequence: int) -> None:
+        nonlocal fees
+        txn = PaymentTxn(
+            SENDER_ADDR, node_algod.suggested_params(), RECIPIENT_ADDR, L1_AMOUNT
+        )
+        fees += txn.fee
+        wait_for_confirmation(
+            node_algod, node_algod.send_transaction(txn.sign(SENDER_PRIVATE_KEY))
+        )
 
-async def sender_smc(time_window: float):
-    """Performance of a sender"""
+    async def pay_once(sequence: int) -> None:
+        # Clients are blocking.
+        await loop.run_in_executor(None, pay_l1, sequence)
+
+    result = await run_window(time_window, pay_once)
+    return {"mode": "l1", "setup_s": 0.0, "fees": fees} | result
+
+
+async def sender_smc(time_window: float) -> dict:
+    """Performance of a sender paying on a new channel"""
+    loop = get_running_loop()
+    node_algod = default_node_pool().algod
+    # Clients are blocking.
+    sugg_params = await loop.run_in_executor(None, node_algod.suggested_params)
     setup_proposal = setupProposal(
-        # sender=SENDER_ADDR, nonce=1024, minRefundBlock=10_000, maxRefundBlock=10_500
-        sender=SENDER_ADDR, nonce=1024, minRefundBlock=7000, maxRefundBlock=7050
+        sender=SENDER_ADDR,
+        nonce=allocate_nonce(),
+        minRefundBlock=sugg_params.first + CHANNEL_LIFETIME,
+        maxRefundBlock=sugg_params.first + CHANNEL_LIFETIME + REFUND_WINDOW,
     )
 
     # pylint: disable-next=no-member
-    async with websockets.connect("ws://localhost:55000") as websocket:
-        setup_response = await setup_channel(websocket, setup_proposal)
-        await fund(setup_proposal, setup_response, 10_000_000)
+    async with websockets.connect(RECIPIENT_URI) as websocket:
+        setup_start = time.perf_counter()
+        setup_proposal, setup_response = await setup_channel(websocket, setup_proposal)
+        await fund(setup_proposal, setup_response, CHANNEL_FUNDING)
+        setup_time = time.perf_counter() - setup_start
 
-        time_start = time.perf_counter()
-
-        for amount in itertools.count(1):
+        async def pay_once(amount: int) -> None:
             await pay(websocket, setup_proposal, setup_response, amount)
-            if time.perf_counter() - time_start >= time_window:
+
+        result = await run_window(time_window, pay_once)
+
+    msig = await loop.run_in_executor(
+        None,
+        smc_msig,
+        SENDER_ADDR,
+        setup_response.recipient,
+        setup_proposal.nonce,
+        setup_proposal.minRefundBlock,
+        setup_proposal.maxRefundBlock,
+    )
+    # Fees are only known once the recipient settled the channel (see settled_fees).
+    return {
+        "mode": "l2",
+        "setup_s": setup_time,
+        "fees": None,
+        "msig": msig.address(),
+        "min_refund_block": setup_proposal.minRefundBlock,
+    } | result
+
+
+def channel_fees(node_indexer: Any, msig_address: str) -> Optional[int]:
+    """
+    Returns the fees paid on Layer-1 for a channel: its funding, the transaction that closed the msig and the rest
+     of the group of the latter (see fee_pooling). It is blocking because of the node calls.
+
+    :param node_indexer: Indexer client
+    :param msig_address: Address of the msig of the channel
+    :return: Fees in microalgos. None if the msig is not closed yet
+    """
+    txns = node_indexer.search_transactions_by_address(msig_address)["transactions"]
+    closing = [
+        txn
+        for txn in txns
+        if txn["sender"] == msig_address
+        and txn.get("payment-transaction", {}).get("close-remainder-to")
+    ]
+    if not closing:
+        return None
+
+    fees = sum(txn["fee"] for txn in txns)
+    group = closing[0].get("group")
+    if group:
+        block = node_indexer.block_info(closing[0]["confirmed-round"])
+        fees += sum(
+            txn["fee"]
+            for txn in block.get("transactions", [])
+            if txn.get("group") == group and txn["id"] != closing[0]["id"]
+        )
+    return fees
+
+
+async def settled_fees(results: list[dict], advance: bool, timeout: float) -> None:
+    """
+    Waits for the channels of the L2 results to be settled and records the fees read from the chain.
+    Fees of the channels not settled in time are left unknown.
+
+    :param results: Results of the windows, updated in place
+    :param advance: Whether to make the rounds up to the refund condition of the channels (sandbox in dev mode)
+    :param timeout: Seconds to wait for the settlements
+    """
+    loop = get_running_loop()
+    node_pool = default_node_pool()
+    l2_results = [result for result in results if result["mode"] == "l2"]
+    if not l2_results:
+        return
+
+    if advance:
+        await BlockDriver(node_pool.algod).advance_to(
+            max(result["min_refund_block"] for result in l2_results)
+        )
+    deadline = loop.time() + timeout
+    for result in l2_results:
+        while True:
+            # Clients are blocking.
+            result["fees"] = await loop.run_in_executor(
+                None, channel_fees, node_pool.indexer, result["msig"]
+            )
+            if result["fees"] is not None or loop.time() >= deadline:
                 break
+            await sleep(SETTLEMENT_POLL)
+        if result["fees"] is None:
+            print(f"Channel {result['msig']} was not settled in time.")
+
+
+def break_even(results: list[dict]) -> dict:
+    """
+    Returns after how many payments a channel is cheaper than L1 in fees, and in time including its setup.
+    Time is compared at the median latency of each mode.
+    """
+    l1_results = [result for result in results if result["mode"] == "l1"]
+    l2_results = [
+        result
+        for result in results
+        if result["mode"] == "l2" and result["fees"] is not None
+    ]
+    if not (l1_results and l2_results):
+        return {}
+
+    l1_fee = sum(result["fees"] for result in l1_results) / sum(
+        result["payments"] for result in l1_results
+    )
+    l2_fees = sum(result["fees"] for result in l2_results) / len(l2_results)
+    l1_latency = sum(result["p50_ms"] for result in l1_results) / len(l1_results)
+    l2_latency = sum(result["p50_ms"] for result in l2_results) / len(l2_results)
+    l2_setup = sum(result["setup_s"] for result in l2_results) / len(l2_results)
 
-        time_end = time.perf_counter()
+    return {
+        "payments_for_fees": math.ceil(l2_fees / l1_fee),
+        "payments_for_time": (
+            math.ceil(l2_setup * 1000 / (l1_latency - l2_latency))
+            if l1_latency > l2_latency
+            else None
+        ),
+    }
 
-        print(f'{time_end - time_start = }')
-        print(f'{amount = }')
+
+async def main(
+    modes: list[str],
+    time_windows: list[float],
+    output: Path,
+    advance: bool,
+    settlement_timeout: float,
+) -> None:
+    """Runs every mode over the same time windows and writes the results"""
+    senders = {"l1": sender_l1, "l2": sender_smc}
+    results = []
+    for time_window in time_windows:
+        for mode in modes:
+            result = await senders[mode](time_window)
+            results.append(result)
+            print(
+                f"{mode} {time_window:>5.1f} s: {result['payments']:>6} payments, "
+                f"{result['throughput']:>8.1f}/s, "
+                f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                f"p99 {result['p99_ms']:.1f} ms, setup {result['setup_s']:.2f} s"
+            )
+
+    await settled_fees(results, advance, settlement_timeout)
+    for result in results:
+        print(
+            f"{result['mode']} {result['window']:>5.1f} s: fees {result['fees']} microalgos"
+        )
+
+    summary = {"results": results, "break_even": break_even(results)}
+    if summary["break_even"]:
+        print(f"Break-even: {summary['break_even']}")
+    output.write_text(json.dumps(summary, indent=4) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
 
 
 if __name__ == "__main__":
-    asyncio.run(sender_smc(5))
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--mode", choices=["l1", "l2", "both"], default="both", help="Layer to measure"
+    )
+    parser.add_argument(
+        "--windows", type=float, nargs="+", default=TIME_WINDOWS, metavar="SECONDS"
+    )
+    parser.add_argument("--output", type=Path, default=Path(RESULTS_PATH))
+    parser.add_argument(
+        "--advance",
+        action="store_true",
+        help="Make rounds until the channels are settled (sandbox in dev mode)",
+    )
+    parser.add_argument(
+        "--settlement-timeout",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="Time to wait for the recipient to settle the channels",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(
+            ["l1", "l2"] if args.mode == "both" else [args.mode],
+            args.windows,
+            args.output,
+            args.advance,
+            args.settlement_timeout,
+        )
+    )
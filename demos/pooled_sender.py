@@ -0,0 +1,36 @@
+"""
+This file implements a demo for a sender that takes its channels from a pre-warmed pool.
+"""
+import asyncio
+import time
+
+import websockets
+
+from algorandsmc.channel_pool import ChannelPool
+from algorandsmc.sender import pay
+
+RECIPIENT_URI = "ws://localhost:55000"
+
+
+async def pooled_sender() -> None:
+    """Demo of a sender that starts paying on two channels without waiting for Layer-1"""
+    # pylint: disable-next=no-member
+    channel_pool = ChannelPool(websockets.connect, funding=10_000_000, size=2)
+    channel_pool.add_recipient(RECIPIENT_URI)
+    # Gives the pool the time to prepare its channels as a long-running sender would have.
+    await asyncio.sleep(30.0)
+
+    for _ in range(2):
+        time_start = time.perf_counter()
+        channel = await channel_pool.acquire(RECIPIENT_URI)
+        await pay(
+            channel.websocket, channel.setup_proposal, channel.setup_response, 1_000_000
+        )
+        print(f"First payment after {time.perf_counter() - time_start:.3f} s")
+
+    # Unused channels are refunded.
+    await channel_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(pooled_sender())
@@ -0,0 +1,51 @@
+"""
+This file implements a demo for a sender that resumes its channel after the connection drops.
+"""
+import asyncio
+import logging
+
+import websockets
+
+from algorandsmc.errors import SMCCannotBeRefunded
+from algorandsmc.sender import (
+    SENDER_ADDR,
+    fund,
+    pay,
+    refund_channel,
+    resume_channel,
+    setup_channel,
+)
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import setupProposal
+
+
+async def reconnecting_sender() -> None:
+    """Demo of a sender that loses its connection after the first payment"""
+    setup_proposal = setupProposal(
+        sender=SENDER_ADDR, nonce=3072, minRefundBlock=2150, maxRefundBlock=2200
+    )
+
+    # pylint: disable-next=no-member
+    async with websockets.connect("ws://localhost:55000") as websocket:
+        setup_proposal, setup_response = await setup_channel(websocket, setup_proposal)
+        await fund(setup_proposal, setup_response, 10_000_000)
+        await pay(websocket, setup_proposal, setup_response, 1_000_000)
+    # Leaving the context closes the websocket as a network failure would.
+
+    # pylint: disable-next=no-member
+    async with websockets.connect("ws://localhost:55000") as websocket:
+        last_amount = await resume_channel(
+            websocket, setup_proposal, setup_response, 1_000_000
+        )
+        await pay(websocket, setup_proposal, setup_response, last_amount + 1_000_000)
+
+        # pylint: disable-next=duplicate-code
+        try:
+            await refund_channel(setup_proposal, setup_response)
+        except SMCCannotBeRefunded:
+            logging.info("Recipient settled the channel.")
+
+
+if __name__ == "__main__":
+    asyncio.run(reconnecting_sender())
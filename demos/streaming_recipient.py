@@ -0,0 +1,86 @@
+"""
+This file implements a demo for a recipient that consumes a stream of payments.
+"""
+import asyncio
+import logging
+from asyncio import sleep
+
+import websockets
+
+from algorandsmc.admission import AdmissionControl
+from algorandsmc.errors import (
+    SMCBadFunding,
+    SMCBadPayment,
+    SMCBadSetup,
+    SMCBadSignature,
+    SMCRetryLater,
+)
+from algorandsmc.recipient import RECIPIENT_ADDR, PaymentStream, settle, setup_channel
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import SMCMethod, setupProposal
+from algorandsmc.utils import get_sandbox_algod
+
+# Limits shared by all connections.
+ADMISSION = AdmissionControl()
+# microalgos of each channel that can be accepted before being verified.
+RISK_BUDGET = 100_000
+
+
+async def close_before_refund(
+    payments: PaymentStream, accepted_setup: setupProposal
+) -> None:
+    """Closes the stream when there are 5 blocks left before the refund condition comes online"""
+    node_algod = get_sandbox_algod()
+
+    while node_algod.status()["last-round"] < accepted_setup.minRefundBlock - 5:
+        await sleep(2.0)
+    payments.close()
+
+
+async def streaming_recipient(websocket) -> None:
+    """
+    Demo of a recipient that hands over the payments of a channel to a downstream consumer.
+
+    :param websocket:
+    """
+    method = SMCMethod.FromString(await websocket.recv())
+    if not method.method == SMCMethod.SETUP_CHANNEL:
+        raise ValueError("Expected channel setup method.")
+
+    try:
+        accepted_setup = await setup_channel(websocket, admission=ADMISSION)
+    except (SMCBadSetup, SMCRetryLater) as err:
+        logging.error("%s", err)
+        return
+
+    payments = PaymentStream(
+        websocket, accepted_setup, admission=ADMISSION, risk_budget=RISK_BUDGET
+    )
+    deadline = asyncio.create_task(close_before_refund(payments, accepted_setup))
+    try:
+        async for payment in payments:
+            # This is where a billing pipeline would consume the payment.
+            logging.info("Payment consumed: %s", payment.cumulativeAmount)
+    except (SMCBadSignature, SMCBadFunding, SMCBadPayment) as err:
+        logging.error("Bad payment. %s", err)
+    finally:
+        deadline.cancel()
+
+    # Only verified payments can be settled.
+    await payments.wait_verified()
+    if payments.last_payment:
+        await settle(accepted_setup, payments.last_payment)
+
+
+async def main():
+    """Entry point for the async flow"""
+    logging.info("recipient: %s", RECIPIENT_ADDR)
+
+    # pylint: disable-next=no-member
+    async with websockets.serve(streaming_recipient, "localhost", 55_000):
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
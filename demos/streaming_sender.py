@@ -0,0 +1,45 @@
+"""
+This file implements a demo for a sender that streams payments at a target rate.
+"""
+import asyncio
+import logging
+
+import websockets
+
+from algorandsmc.errors import SMCCannotBeRefunded
+from algorandsmc.sender import (
+    SENDER_ADDR,
+    SenderChannel,
+    fund,
+    refund_channel,
+    setup_channel,
+    stream,
+)
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import setupProposal
+
+
+async def streaming_sender() -> None:
+    """Demo of a sender that pays 1_000 microalgos per tick at 100 ticks per second"""
+    setup_proposal = setupProposal(
+        sender=SENDER_ADDR, nonce=4096, minRefundBlock=2150, maxRefundBlock=2200
+    )
+
+    # pylint: disable-next=no-member
+    async with websockets.connect("ws://localhost:55000") as websocket:
+        setup_proposal, setup_response = await setup_channel(websocket, setup_proposal)
+        await fund(setup_proposal, setup_response, 10_000_000)
+
+        channel = SenderChannel(websocket, setup_proposal, setup_response)
+        await stream(channel, rate=100, increment=1_000, max_amount=5_000_000)
+
+        # pylint: disable-next=duplicate-code
+        try:
+            await refund_channel(setup_proposal, setup_response)
+        except SMCCannotBeRefunded:
+            logging.info("Recipient settled the channel.")
+
+
+if __name__ == "__main__":
+    asyncio.run(streaming_sender())
@@ -0,0 +1,116 @@
+"""
+Checks the rate of setups per sender and the priority of payments over setups.
+"""
+import asyncio
+
+import pytest
+
+from algorandsmc.admission import RETRY_AFTER, AdmissionControl, TokenBucket
+from algorandsmc.errors import SMCRetryLater
+
+
+async def hold_payment(admission: AdmissionControl, done: asyncio.Event) -> None:
+    """Processes a payment until it is done"""
+    async with admission.payment():
+        await done.wait()
+
+
+async def run_setup(admission: AdmissionControl, sender: str) -> None:
+    """Processes a setup that finishes right away"""
+    async with admission.setup(sender):
+        pass
+
+
+def test_token_bucket_refill():
+    """Tokens accrue at the rate up to the capacity"""
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert all(bucket.take() for _ in range(3))
+    assert not bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5, abs=0.01)
+
+    bucket.refill(bucket.updated_at + 0.5)
+    assert bucket.tokens == pytest.approx(1.0, abs=0.01)
+    bucket.refill(bucket.updated_at + 60.0)
+    assert bucket.tokens == 3
+    assert bucket.wait_time() == 0.0
+
+
+def test_setup_rate_per_sender():
+    """A sender over its burst of setups is told when to retry, other senders are not limited"""
+
+    async def scenario() -> None:
+        admission = AdmissionControl(setup_rate=0.5, setup_burst=2)
+        await run_setup(admission, "SENDER")
+        await run_setup(admission, "SENDER")
+        with pytest.raises(SMCRetryLater) as err:
+            await run_setup(admission, "SENDER")
+        assert err.value.retry_after == pytest.approx(2.0, abs=0.01)
+        await run_setup(admission, "OTHER")
+
+    asyncio.run(scenario())
+
+
+def test_payments_have_priority_over_setups():
+    """Past the reserved share, setups wait for the payments to finish"""
+
+    async def scenario() -> None:
+        admission = AdmissionControl(setup_wait=1.0, reserved_setups=1)
+        done = asyncio.Event()
+        paying = asyncio.create_task(hold_payment(admission, done))
+        await asyncio.sleep(0)
+        assert admission.payments == 1
+
+        # The reserved setup starts while the payment is being processed.
+        async with admission.setup("RESERVED"):
+            waiting = asyncio.create_task(run_setup(admission, "WAITING"))
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+            assert admission.waiting_setups == 1
+
+            done.set()
+            await paying
+            await asyncio.wait_for(waiting, 1.0)
+            assert admission.setups == 1
+
+    asyncio.run(scenario())
+
+
+def test_setups_are_rejected_when_they_would_wait_too_long():
+    """Setups that cannot start in time, or cannot even wait, are answered with RETRY_LATER"""
+
+    async def scenario() -> None:
+        admission = AdmissionControl(
+            setup_wait=0.05, reserved_setups=1, max_waiting_setups=1
+        )
+        done = asyncio.Event()
+        paying = asyncio.create_task(hold_payment(admission, done))
+        await asyncio.sleep(0)
+
+        async with admission.setup("RESERVED"):
+            waiting = asyncio.create_task(run_setup(admission, "WAITING"))
+            await asyncio.sleep(0)
+            with pytest.raises(SMCRetryLater):
+                await run_setup(admission, "QUEUE FULL")
+            with pytest.raises(SMCRetryLater) as err:
+                await waiting
+            assert err.value.retry_after == RETRY_AFTER
+            assert admission.waiting_setups == 0
+
+        done.set()
+        await paying
+
+    asyncio.run(scenario())
+
+
+def test_payments_over_the_limit_are_rejected():
+    """Payments never wait and are rejected right away over the limit"""
+
+    async def scenario() -> None:
+        admission = AdmissionControl(max_payments=1)
+        async with admission.payment():
+            with pytest.raises(SMCRetryLater):
+                async with admission.payment():
+                    pass
+        assert admission.payments == 0
+
+    asyncio.run(scenario())
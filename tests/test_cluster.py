@@ -0,0 +1,101 @@
+"""
+Checks the partitioning of channels among the nodes of a cluster and the registry they share.
+"""
+import pytest
+from algosdk.account import generate_account
+
+from algorandsmc.cluster import HashRing, SQLiteRegistry
+from algorandsmc.nodes import EndpointPool, NodePool
+from algorandsmc.recipient import RecipientChannel
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import Payment, setupProposal
+from demos.local_algod import LocalAlgod, LocalIndexer
+
+ADDRESSES = [f"CHANNEL{index:05}" for index in range(2_000)]
+
+
+@pytest.fixture(name="registry")
+def registry_fixture(tmp_path):
+    """Registry in a fresh database"""
+    registry = SQLiteRegistry(tmp_path / "registry.sqlite")
+    yield registry
+    registry.close()
+
+
+def owners(ring: HashRing) -> dict[str, str]:
+    """Owner of each channel"""
+    return {address: ring.owner(address) for address in ADDRESSES}
+
+
+def test_ring_join_only_moves_channels_to_the_new_node():
+    """A joining node takes some channels from the others, which keep all the rest"""
+    ring = HashRing(["a", "b", "c"])
+    before = owners(ring)
+    ring.add("d")
+    after = owners(ring)
+
+    moved = [address for address in ADDRESSES if before[address] != after[address]]
+    assert moved
+    assert all(after[address] == "d" for address in moved)
+    # About a quarter of the channels, far from a full reshuffle.
+    assert len(moved) < len(ADDRESSES) / 2
+
+
+def test_ring_leave_only_moves_channels_of_the_old_node():
+    """The channels of a leaving node are spread over the others, which keep their own"""
+    ring = HashRing(["a", "b", "c", "d"])
+    before = owners(ring)
+    ring.remove("d")
+    after = owners(ring)
+
+    for address in ADDRESSES:
+        if before[address] == "d":
+            assert after[address] in ("a", "b", "c")
+        else:
+            assert after[address] == before[address]
+    assert "d" not in ring
+    assert len(ring) == 3
+
+
+def test_ring_is_the_same_on_every_node():
+    """Nodes that see the same members agree on the owners, whatever the order they joined in"""
+    assert owners(HashRing(["a", "b", "c"])) == owners(HashRing(["c", "a", "b"]))
+    assert HashRing().owner(ADDRESSES[0]) is None
+
+
+def test_registry_claim_and_evict(registry):
+    """Channels are claimed once and forgotten once their refund window closed"""
+    assert registry.claim("EARLY", 100)
+    assert registry.claim("LATE", 300)
+    assert not registry.claim("EARLY", 100)
+
+    assert registry.evict(200) == 1
+    assert "EARLY" not in registry
+    assert "LATE" in registry
+    assert len(registry) == 1
+    # Channels that expire before the horizon count as known.
+    assert not registry.claim("EARLY", 100)
+    assert registry.evict(150) == 0
+
+
+def test_registry_take_channel(registry):
+    """A handed off channel is adopted by a single node and its state is kept"""
+    node_pool = NodePool(EndpointPool([LocalAlgod()]), EndpointPool([LocalIndexer()]))
+    accepted_setup = setupProposal(
+        sender=generate_account()[1],
+        nonce=1,
+        minRefundBlock=1_000,
+        maxRefundBlock=1_500,
+    )
+    channel = RecipientChannel(accepted_setup, node_pool)
+    channel.last_payment = Payment(cumulativeAmount=2_000, lsigSignature=b"s" * 64)
+    channel.resume_counter = 3
+    registry.store_channel(channel)
+
+    assert registry.take_channel(channel.msig_address) == (
+        accepted_setup,
+        channel.last_payment,
+        3,
+    )
+    assert registry.take_channel(channel.msig_address) is None
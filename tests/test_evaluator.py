@@ -0,0 +1,163 @@
+"""
+Runs the SMC logic signatures offline in the local evaluator.
+Each lsig must approve its honest transaction and reject the same transaction with any one condition broken.
+The programs of channels set up before versioning (v1) must not accept a zero fee.
+"""
+import pytest
+from algosdk.account import generate_account
+from algosdk.transaction import PaymentTxn, SuggestedParams
+
+from algorandsmc.errors import SMCLsigRejected
+from algorandsmc.templates import check_refund, check_settlement
+from algorandsmc.templates.artifacts import ARTIFACTS_VERSION, LEGACY_ARTIFACTS_VERSION
+from algorandsmc.templates.evaluator import MIN_TXN_FEE
+
+MIN_REFUND_BLOCK = 10_000
+MAX_REFUND_BLOCK = 10_500
+CUMULATIVE_AMOUNT = 2_000_000
+
+MSIG = generate_account()[1]
+SENDER = generate_account()[1]
+RECIPIENT = generate_account()[1]
+STRANGER = generate_account()[1]
+
+
+def params(first: int, last: int, fee: int = MIN_TXN_FEE) -> SuggestedParams:
+    """Suggested parameters with a flat fee"""
+    return SuggestedParams(
+        fee, first, last, "SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=", flat_fee=True
+    )
+
+
+def settlement(**overrides) -> PaymentTxn:
+    """Honest settlement with some arguments replaced"""
+    arguments = {
+        "sp": params(9_000, MIN_REFUND_BLOCK - 1),
+        "receiver": RECIPIENT,
+        "amt": CUMULATIVE_AMOUNT,
+        "close_remainder_to": SENDER,
+        "rekey_to": None,
+    } | overrides
+    return PaymentTxn(MSIG, **arguments)
+
+
+def refund(**overrides) -> PaymentTxn:
+    """Honest refund with some arguments replaced"""
+    arguments = {
+        "sp": params(MIN_REFUND_BLOCK, MAX_REFUND_BLOCK),
+        "receiver": SENDER,
+        "amt": 0,
+        "close_remainder_to": SENDER,
+        "rekey_to": None,
+    } | overrides
+    return PaymentTxn(MSIG, **arguments)
+
+
+@pytest.mark.parametrize(
+    "txn, version, approved",
+    [
+        pytest.param(settlement(), ARTIFACTS_VERSION, True, id="honest"),
+        pytest.param(
+            settlement(amt=CUMULATIVE_AMOUNT + 1), ARTIFACTS_VERSION, False, id="amount"
+        ),
+        pytest.param(
+            settlement(sp=params(9_000, 9_999, 2_000)),
+            ARTIFACTS_VERSION,
+            False,
+            id="fee",
+        ),
+        pytest.param(
+            settlement(sp=params(9_000, 9_999, 0)),
+            ARTIFACTS_VERSION,
+            True,
+            id="pooled fee",
+        ),
+        pytest.param(
+            settlement(receiver=STRANGER), ARTIFACTS_VERSION, False, id="receiver"
+        ),
+        pytest.param(
+            settlement(close_remainder_to=STRANGER),
+            ARTIFACTS_VERSION,
+            False,
+            id="close",
+        ),
+        pytest.param(
+            settlement(rekey_to=STRANGER), ARTIFACTS_VERSION, False, id="rekey"
+        ),
+        pytest.param(
+            settlement(sp=params(9_500, MIN_REFUND_BLOCK)),
+            ARTIFACTS_VERSION,
+            False,
+            id="last valid",
+        ),
+        pytest.param(settlement(), LEGACY_ARTIFACTS_VERSION, True, id="legacy"),
+        pytest.param(
+            settlement(sp=params(9_000, 9_999, 0)),
+            LEGACY_ARTIFACTS_VERSION,
+            False,
+            id="legacy pooled fee",
+        ),
+    ],
+)
+def test_settlement(txn: PaymentTxn, version: int, approved: bool) -> None:
+    """The settlement lsig approves exactly the honest settlements"""
+    if approved:
+        check_settlement(
+            txn, SENDER, RECIPIENT, CUMULATIVE_AMOUNT, MIN_REFUND_BLOCK, version
+        )
+    else:
+        with pytest.raises(SMCLsigRejected):
+            check_settlement(
+                txn, SENDER, RECIPIENT, CUMULATIVE_AMOUNT, MIN_REFUND_BLOCK, version
+            )
+
+
+@pytest.mark.parametrize(
+    "txn, version, approved",
+    [
+        pytest.param(refund(), ARTIFACTS_VERSION, True, id="honest"),
+        pytest.param(refund(amt=1), ARTIFACTS_VERSION, False, id="amount"),
+        pytest.param(
+            refund(sp=params(MIN_REFUND_BLOCK, MAX_REFUND_BLOCK, 2_000)),
+            ARTIFACTS_VERSION,
+            False,
+            id="fee",
+        ),
+        pytest.param(
+            refund(sp=params(MIN_REFUND_BLOCK, MAX_REFUND_BLOCK, 0)),
+            ARTIFACTS_VERSION,
+            True,
+            id="pooled fee",
+        ),
+        pytest.param(
+            refund(close_remainder_to=STRANGER), ARTIFACTS_VERSION, False, id="close"
+        ),
+        pytest.param(refund(rekey_to=STRANGER), ARTIFACTS_VERSION, False, id="rekey"),
+        pytest.param(
+            refund(sp=params(MIN_REFUND_BLOCK - 1, MAX_REFUND_BLOCK)),
+            ARTIFACTS_VERSION,
+            False,
+            id="first valid",
+        ),
+        pytest.param(
+            refund(sp=params(MIN_REFUND_BLOCK, MAX_REFUND_BLOCK + 1)),
+            ARTIFACTS_VERSION,
+            False,
+            id="last valid",
+        ),
+        pytest.param(refund(), LEGACY_ARTIFACTS_VERSION, True, id="legacy"),
+        pytest.param(
+            refund(sp=params(MIN_REFUND_BLOCK, MAX_REFUND_BLOCK, 0)),
+            LEGACY_ARTIFACTS_VERSION,
+            False,
+            id="legacy pooled fee",
+        ),
+    ],
+)
+def test_refund(txn: PaymentTxn, version: int, approved: bool) -> None:
+    """The refund lsig approves exactly the honest refunds"""
+    if approved:
+        check_refund(txn, SENDER, MIN_REFUND_BLOCK, MAX_REFUND_BLOCK, version)
+    else:
+        with pytest.raises(SMCLsigRejected):
+            check_refund(txn, SENDER, MIN_REFUND_BLOCK, MAX_REFUND_BLOCK, version)
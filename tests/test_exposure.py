@@ -0,0 +1,69 @@
+"""
+Checks the columns of the exposure book and the channels its sweep ranks first.
+"""
+from algorandsmc.exposure import ExposureBook
+
+
+def test_untrack_moves_the_last_channel_in_place():
+    """Removing a channel keeps the data of the others, including the one moved into its row"""
+    book = ExposureBook(capacity=2)
+    for index, address in enumerate(["FIRST", "MIDDLE", "LAST"]):
+        book.track(address, 1_000 + index)
+        book.update(address, accepted=(index + 1) * 100, balance=150)
+
+    book.untrack("FIRST")
+    book.untrack("UNKNOWN")
+    assert len(book) == 2
+    assert "FIRST" not in book
+    assert "LAST" in book and "MIDDLE" in book
+
+    report = book.sweep(900, margin=0)
+    assert report.total_exposure == 500
+    assert report.uncovered_exposure == 50 + 150
+    assert report.min_blocks_to_deadline == 101
+    assert report.settle_first == [("MIDDLE", 101, 200), ("LAST", 102, 300)]
+
+    # The moved channel is still updated and removed through its new row.
+    book.update("LAST", accepted=0)
+    book.untrack("MIDDLE")
+    assert book.sweep(900).settle_first == []
+    book.untrack("LAST")
+    assert len(book) == 0
+
+
+def test_sweep_ranks_the_closest_deadlines_first():
+    """Channels are ranked by deadline, then by larger amount, and the ones with nothing to settle are left out"""
+    book = ExposureBook()
+    channels = {
+        "LATE": (5_000, 100),
+        "SOON SMALL": (1_020, 10),
+        "SOON LARGE": (1_020, 90),
+        "SOONEST": (1_010, 50),
+        "IDLE": (1_005, 0),
+    }
+    for address, (min_refund_block, accepted) in channels.items():
+        book.track(address, min_refund_block)
+        book.update(address, accepted=accepted, balance=60)
+
+    report = book.sweep(1_000, margin=30)
+    assert report.at_risk == 3
+    assert report.undercollateralized == 2
+    assert report.min_blocks_to_deadline == 5
+    assert report.settle_first == [
+        ("SOONEST", 10, 50),
+        ("SOON LARGE", 20, 90),
+        ("SOON SMALL", 20, 10),
+        ("LATE", 4_000, 100),
+    ]
+    assert book.sweep(1_000, margin=30, top=2).settle_first == [
+        ("SOONEST", 10, 50),
+        ("SOON LARGE", 20, 90),
+    ]
+
+
+def test_sweep_without_channels():
+    """An empty book has no exposure and nothing to settle"""
+    report = ExposureBook().sweep(1_000)
+    assert report.total_exposure == 0
+    assert report.min_blocks_to_deadline is None
+    assert report.settle_first == []
@@ -0,0 +1,109 @@
+"""
+Writes payments to a journal in a temporary directory and reads them back.
+"""
+import asyncio
+
+from algosdk.account import generate_account
+from algosdk.encoding import decode_address
+
+from algorandsmc.journal import HEADER, RECORD, JournalReader, JournalWriter
+
+# pylint: disable-next=no-name-in-module
+from algorandsmc.smc_pb2 import Payment
+
+MSIG = generate_account()[1]
+OTHER_MSIG = generate_account()[1]
+
+
+def payment(cumulative_amount: int) -> Payment:
+    """Payment with a signature that tells it apart"""
+    return Payment(
+        cumulativeAmount=cumulative_amount,
+        lsigSignature=cumulative_amount.to_bytes(64, "little"),
+    )
+
+
+def write(path, records: list[tuple[str, int, int]]) -> None:
+    """Appends (msig address, cumulative amount, receive time) records to a journal and closes it"""
+
+    async def append_all() -> None:
+        writer = JournalWriter(path)
+        await asyncio.gather(
+            *(
+                writer.append(msig_address, payment(amount), received_ns)
+                for msig_address, amount, received_ns in records
+            )
+        )
+        await writer.close()
+
+    asyncio.run(append_all())
+
+
+def test_round_trip(tmp_path):
+    """Records are read back in order and as they were written"""
+    path = tmp_path / "journal"
+    write(path, [(MSIG, 1_000, 10), (OTHER_MSIG, 5_000, 20), (MSIG, 2_000, 30)])
+
+    with JournalReader(path) as reader:
+        assert len(reader) == 3
+        assert reader.record(1) == (
+            decode_address(OTHER_MSIG),
+            5_000,
+            20,
+            payment(5_000).lsigSignature,
+        )
+        assert [record[1] for record in reader.scan()] == [1_000, 5_000, 2_000]
+        assert [record[1] for record in reader.scan(1, 2)] == [5_000]
+
+
+def test_received_times_never_decrease(tmp_path):
+    """An earlier receive time is stored as the latest one, so that the journal stays sorted"""
+    path = tmp_path / "journal"
+    write(path, [(MSIG, 1_000, 30), (MSIG, 2_000, 10)])
+
+    with JournalReader(path) as reader:
+        assert [record[2] for record in reader.scan()] == [30, 30]
+
+
+def test_bisect_received(tmp_path):
+    """The first record received at or after a time is found"""
+    path = tmp_path / "journal"
+    write(path, [(MSIG, amount, amount) for amount in range(10, 110, 10)])
+
+    with JournalReader(path) as reader:
+        assert reader.bisect_received(0) == 0
+        assert reader.bisect_received(10) == 0
+        assert reader.bisect_received(55) == 5
+        assert reader.bisect_received(60) == 5
+        assert reader.bisect_received(101) == len(reader)
+
+
+def test_last_payment(tmp_path):
+    """The latest payment of each channel is found, and none for an unknown channel"""
+    path = tmp_path / "journal"
+    write(
+        path,
+        [(MSIG, 1_000, 10), (MSIG, 2_000, 20), (OTHER_MSIG, 7_000, 30)],
+    )
+
+    with JournalReader(path) as reader:
+        assert reader.last_payment(MSIG)[1] == 2_000
+        assert reader.last_payment(OTHER_MSIG)[1] == 7_000
+        assert reader.last_payment(generate_account()[1]) is None
+
+
+def test_torn_record(tmp_path):
+    """A partial record at the end is ignored by readers and dropped by the next writer"""
+    path = tmp_path / "journal"
+    write(path, [(MSIG, 1_000, 10)])
+    with open(path, "ab") as journal_file:
+        journal_file.write(RECORD.pack(decode_address(MSIG), 2_000, 20, bytes(64))[:50])
+
+    with JournalReader(path) as reader:
+        assert len(reader) == 1
+        assert reader.last_payment(MSIG)[1] == 1_000
+
+    write(path, [(MSIG, 3_000, 30)])
+    assert path.stat().st_size == HEADER.size + 2 * RECORD.size
+    with JournalReader(path) as reader:
+        assert [record[1] for record in reader.scan()] == [1_000, 3_000]
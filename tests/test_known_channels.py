@@ -0,0 +1,41 @@
+"""
+Checks the known-channel set and its eviction by the end of the refund window.
+"""
+from algorandsmc.known_channels import KnownChannels
+
+
+def test_reclaimed_channel_is_rejected():
+    """A channel can only be claimed once"""
+    known_channels = KnownChannels()
+
+    assert known_channels.claim("MSIG", 1_000)
+    assert not known_channels.claim("MSIG", 1_000)
+    assert "MSIG" in known_channels
+    assert len(known_channels) == 1
+
+
+def test_eviction_by_horizon():
+    """Channels whose refund window closed before the round are forgotten, the others are kept"""
+    known_channels = KnownChannels()
+    known_channels.claim("EARLY", 100)
+    known_channels.claim("EDGE", 200)
+    known_channels.claim("LATE", 300)
+
+    assert known_channels.evict(200) == 1
+    assert "EARLY" not in known_channels
+    assert "EDGE" in known_channels and "LATE" in known_channels
+    # The horizon never goes back.
+    assert known_channels.evict(150) == 0
+    assert known_channels.horizon == 200
+
+
+def test_evicted_channel_stays_rejected():
+    """An evicted channel or any channel expiring before the horizon cannot be claimed"""
+    known_channels = KnownChannels()
+    known_channels.claim("MSIG", 100)
+    known_channels.evict(101)
+
+    assert "MSIG" not in known_channels
+    assert not known_channels.claim("MSIG", 100)
+    assert not known_channels.claim("NEW", 100)
+    assert known_channels.claim("NEW", 101)